@@ -0,0 +1,55 @@
+# 분석 결과 공용 도구 (현장 사진 분석 앱과 작업 위험성 가이드 앱이 함께 사용)
+#
+# 마크다운 표 변환, 프롬프트 토큰 추정, API 응답의 토큰 사용량 추출과 모델 단가 기준 비용 계산을 제공합니다.
+
+import math
+
+import pandas as pd
+
+# 모델별 토큰 단가 (USD / 100만 토큰: 입력, 캐시된 입력, 출력)
+MODEL_PRICING = {
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+}
+
+def escape_table_cell(value) -> str:
+    """마크다운 표 셀에 들어갈 값의 파이프/줄바꿈을 이스케이프하는 함수"""
+    return str(value).replace('|', '\\|').replace('\n', ' ')
+
+def dataframe_to_markdown_table(df: pd.DataFrame) -> str:
+    """DataFrame을 마크다운 표 문자열로 변환하는 함수 (셀의 파이프/줄바꿈은 이스케이프)"""
+    lines = [
+        "| " + " | ".join(df.columns) + " |",
+        "|" + "|".join("------" for _ in df.columns) + "|",
+    ]
+    for row in df.itertuples(index=False):
+        lines.append("| " + " | ".join(escape_table_cell(value) for value in row) + " |")
+    return '\n'.join(lines)
+
+def estimate_text_tokens(text: str) -> int:
+    """프롬프트 텍스트의 토큰 수를 대략 추정하는 함수 (한글 등 비ASCII는 글자당 1토큰, ASCII는 4글자당 1토큰)"""
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+def extract_usage(usage) -> dict:
+    """API 응답의 usage에서 입력/출력/캐시된 입력 토큰 수를 꺼내는 함수 (usage가 없으면 None)"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+    }
+
+def estimate_cost_usd(usage: dict, model: str):
+    """토큰 사용량과 모델 단가로 비용(USD)을 계산하는 함수 (단가를 모르는 모델이면 None)"""
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None:
+        return None
+    uncached_tokens = usage["prompt_tokens"] - usage.get("cached_tokens", 0)
+    cost = (uncached_tokens * pricing["input"]
+            + usage.get("cached_tokens", 0) * pricing["cached_input"]
+            + usage.get("completion_tokens", 0) * pricing["output"])
+    return round(cost / 1_000_000, 6)
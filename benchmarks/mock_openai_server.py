@@ -0,0 +1,263 @@
+# 벤치마크용 로컬 OpenAI chat-completions 대체 서버 (녹화된 응답을 지연/스트리밍 속도를 조절하여 재생)
+
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECORDED_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded")
+
+# 요청 종류별 녹화 응답 파일 (이미지가 포함된 요청은 비전 보고서, 그 외는 텍스트 위험성 가이드,
+# JSON 스키마 이름과 같은 종류가 있으면 해당 구조화 응답)
+RECORDED_RESPONSES = {
+    "vision": "vision_report.md",
+    "text": "risk_guide.md",
+    "scene_triage": "scene_triage.json",
+    "photo_findings": "photo_findings.json",
+    "integrated_risk_summary": "integrated_risk_summary.json",
+    "work_risk_reference": "work_risk_reference.json",
+}
+
+# 스트리밍 시 토큰 1개로 간주할 글자 수 (한국어 기준 대략값)
+CHARS_PER_TOKEN = 2
+
+# 이미지 1장당 입력 토큰 (짧은 변 768px 기준 high detail 4타일: 85 + 170 * 4)
+IMAGE_PROMPT_TOKENS = 765
+
+# 프롬프트 캐시 동작 (1024 토큰 이상인 접두부가 이전 요청과 같으면 128 토큰 단위로 캐시 적용)
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK_TOKENS = 128
+
+def load_recorded_responses(folder: str = RECORDED_FOLDER) -> dict:
+    """녹화된 응답 파일들을 읽어 요청 종류별 텍스트로 반환하는 함수"""
+    responses = {}
+    for kind, file_name in RECORDED_RESPONSES.items():
+        with open(os.path.join(folder, file_name), "r", encoding="utf-8") as f:
+            responses[kind] = f.read()
+    return responses
+
+def detect_request_kind(body: dict) -> str:
+    """응답 JSON 스키마 이름 또는 요청 메시지에 이미지가 포함되어 있는지로 요청 종류를 판별하는 함수"""
+    schema_name = (body.get("response_format") or {}).get("json_schema", {}).get("name")
+    if schema_name in RECORDED_RESPONSES:
+        return schema_name
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+            return "vision"
+    return "text"
+
+def estimate_prompt_tokens(body: dict) -> int:
+    """요청 메시지의 텍스트 길이와 이미지 수로 입력 토큰 수를 대략 추정하는 함수"""
+    tokens = 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_PROMPT_TOKENS
+            else:
+                tokens += len(part.get("text", "")) // CHARS_PER_TOKEN
+    return tokens
+
+def extract_cacheable_prefix(body: dict) -> str:
+    """요청 앞부분의 system 메시지들을 캐시 가능한 정적 접두부로 보고 이어 붙여 반환하는 함수"""
+    prefix = []
+    for message in body.get("messages", []):
+        if message.get("role") != "system":
+            break
+        prefix.append(message.get("content") or "")
+    return "\n".join(prefix)
+
+def estimate_cached_tokens(prefix_tokens: int) -> int:
+    """캐시된 접두부 토큰 수를 API와 같은 규칙(최소 길이, 블록 단위)으로 계산하는 함수"""
+    if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+        return 0
+    return prefix_tokens // PROMPT_CACHE_BLOCK_TOKENS * PROMPT_CACHE_BLOCK_TOKENS
+
+class MockOpenAIServer:
+    """녹화된 응답을 재생하는 chat-completions 서버
+
+    latency: 첫 응답까지의 지연(초), stream_rate: 스트리밍 시 초당 토큰 수 (0이면 지연 없이 전송)
+    error_rate: 요청을 429(한도 초과)로 거절할 확률, retry_after: 거절 시 알려줄 재시도 대기 시간(초)
+    handshake_latency: 새 연결마다 추가할 지연(초, 실제 API의 TCP/TLS 연결 설정 시간 재현)
+    generation_rate: 스트리밍이 아닌 응답의 초당 생성 토큰 수 (출력 토큰 수만큼 응답을 늦춤, 0이면 지연 없음)
+    """
+
+    def __init__(self, latency: float = 0.0, stream_rate: float = 0.0, responses: dict = None,
+                 host: str = "127.0.0.1", port: int = 0, error_rate: float = 0.0, retry_after: float = 0.2,
+                 handshake_latency: float = 0.0, generation_rate: float = 0.0):
+        self.latency = latency
+        self.generation_rate = generation_rate
+        self.handshake_latency = handshake_latency
+        self.connections = 0
+        self.stream_rate = stream_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rejected = 0
+        self.responses = responses or load_recorded_responses()
+        self.request_log = []
+        self.seen_prefixes = set()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def lookup_prompt_cache(self, body: dict) -> int:
+        """정적 접두부가 이전 요청에서 나온 적이 있으면 캐시된 토큰 수를 반환하고, 처음이면 기록하는 함수"""
+        prefix = extract_cacheable_prefix(body)
+        if not prefix:
+            return 0
+        with self._lock:
+            hit = prefix in self.seen_prefixes
+            self.seen_prefixes.add(prefix)
+        return estimate_cached_tokens(len(prefix) // CHARS_PER_TOKEN) if hit else 0
+
+    def record_request(self, kind: str, stream: bool, prompt_tokens: int, cached_tokens: int = 0):
+        with self._lock:
+            self.request_log.append({"kind": kind, "stream": stream, "prompt_tokens": prompt_tokens,
+                                     "cached_tokens": cached_tokens})
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # keep-alive 연결에서 헤더와 본문을 따로 보낼 때 Nagle 지연(약 40ms)이 생기지 않도록 함
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                time.sleep(server.handshake_latency)
+
+            def do_GET(self):
+                # 클라이언트 warm-up용 모델 목록 조회
+                if not self.path.rstrip("/").endswith("/models"):
+                    self.send_error(404)
+                    return
+                payload = json.dumps({"object": "list", "data": []}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if server.error_rate and random.random() < server.error_rate:
+                    with server._lock:
+                        server.rejected += 1
+                    self.send_rate_limited()
+                    return
+                kind = detect_request_kind(body)
+                stream = bool(body.get("stream"))
+                prompt_tokens = estimate_prompt_tokens(body)
+                cached_tokens = server.lookup_prompt_cache(body)
+                server.record_request(kind, stream, prompt_tokens, cached_tokens)
+
+                text = server.responses[kind]
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(text) // CHARS_PER_TOKEN,
+                    "total_tokens": prompt_tokens + len(text) // CHARS_PER_TOKEN,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                }
+                time.sleep(server.latency)
+                if stream:
+                    self.send_stream(body, text, usage)
+                else:
+                    if server.generation_rate:
+                        time.sleep(usage["completion_tokens"] / server.generation_rate)
+                    self.send_completion(body, text, usage)
+
+            def send_rate_limited(self):
+                payload = json.dumps({"error": {
+                    "message": "Rate limit reached (benchmark)", "type": "requests", "code": "rate_limit_exceeded"
+                }}).encode("utf-8")
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("retry-after-ms", str(int(server.retry_after * 1000)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_completion(self, body: dict, text: str, usage: dict):
+                payload = json.dumps({
+                    "id": "chatcmpl-benchmark",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", ""),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                }, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_stream(self, body: dict, text: str, usage: dict):
+                # chunked 전송으로 스트리밍 후에도 연결을 유지 (keep-alive)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send_chunk(data: bytes):
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+
+                def send_event(data: dict):
+                    send_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+                base = {"id": "chatcmpl-benchmark", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": body.get("model", "")}
+                interval = 1.0 / server.stream_rate if server.stream_rate else 0.0
+                for start in range(0, len(text), CHARS_PER_TOKEN):
+                    send_event({**base, "choices": [{
+                        "index": 0, "delta": {"content": text[start:start + CHARS_PER_TOKEN]}, "finish_reason": None
+                    }]})
+                    if interval:
+                        time.sleep(interval)
+                send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if body.get("stream_options", {}).get("include_usage"):
+                    send_event({**base, "choices": [], "usage": usage})
+                send_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
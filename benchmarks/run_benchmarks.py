@@ -0,0 +1,331 @@
+# 오프라인 성능 벤치마크 (로컬 모의 OpenAI 서버 + 저장소의 샘플 사진/참조 파일 사용)
+#
+# 사용 예:
+#   python benchmarks/run_benchmarks.py --latency 0.5 --stream-rate 200 --output before.json
+#   python benchmarks/run_benchmarks.py --compare before.json
+#   python benchmarks/run_benchmarks.py --only client --handshake-latency 0.1   # 연결 재사용 효과
+#   python benchmarks/run_benchmarks.py --only text --generation-rate 100      # 출력 토큰 수에 따른 생성 시간
+
+import argparse
+import glob
+import importlib.util
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_FOLDER)
+sys.path.insert(0, BENCHMARK_FOLDER)
+sys.path.insert(0, REPO_ROOT)  # 앱이 불러오는 공용 모듈(openai_scheduler 등)
+
+from mock_openai_server import MockOpenAIServer
+
+VISION_APP_FILE = "streamlit_safety_tool_0731_F.py"
+TEXT_APP_FILE = "text_risk_assessment_app_0723_v0.1.py"
+SAMPLE_WORK_DESCRIPTION = "전주 하단에서 통신 케이블과 광접속함 점검 및 교체 작업"
+# 작업명 추천 벤치마크: 전체 참조 양식(모든 시트)에서 '고소작업 철탑'을 입력하는 동안의 키 입력별 검색어 (조합 중인 글자 포함)
+SUGGESTION_REFERENCE_FILE = "참조-SKONS위험성평가양식.xlsx"
+SAMPLE_SUGGESTION_KEYSTROKES = ["ㄱ", "고", "곳", "고소", "고솢", "고소자", "고소작", "고소작어", "고소작업",
+                                "고소작업 ㅊ", "고소작업 처", "고소작업 철", "고소작업 철ㅌ", "고소작업 철타", "고소작업 철탑"]
+
+def load_app(file_name: str, module_name: str):
+    """Streamlit 앱 파일을 모듈로 불러오는 함수 (bare 모드로 실행되어 화면 출력은 무시됨)"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def measure(func, setup=None, repeat: int = 3, trace_memory: bool = True) -> dict:
+    """단계 함수의 실행 시간(반복 측정)과 최대 메모리 사용량(별도 1회 측정)을 반환하는 함수"""
+    durations = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started_at = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started_at)
+
+    peak_bytes = None
+    if trace_memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        func()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(durations) * 1000,
+        "min_ms": min(durations) * 1000,
+        "peak_kb": peak_bytes / 1024 if peak_bytes is not None else None,
+    }
+
+def build_client_stages(base_url: str) -> list:
+    """요청마다 새 클라이언트를 만드는 경우와 공용(예열된) 클라이언트의 연결을 재사용하는 경우를 비교하는 벤치마크 목록"""
+    from openai import OpenAI
+    import openai_client
+
+    request_args = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 16}
+    shared_client = openai_client.get_openai_client("sk-benchmark", base_url, warm_up=False)
+    openai_client.warm_up_client(shared_client)
+
+    def new_client_request():
+        with OpenAI(api_key="sk-benchmark", base_url=base_url, max_retries=0) as client:
+            client.chat.completions.create(**request_args)
+
+    def pooled_request():
+        shared_client.chat.completions.create(**request_args)
+
+    return [
+        ("client.new_per_request", new_client_request, None),
+        ("client.pooled_request", pooled_request, None),
+    ]
+
+def build_vision_stages(v, image_paths: list) -> list:
+    """비전 앱(현장 사진 분석)의 단계별 벤치마크 목록을 구성하는 함수"""
+    from PIL import Image
+
+    state = {}
+    image_names = [os.path.basename(path) for path in image_paths]
+    image_bytes = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            image_bytes.append(f.read())
+
+    def open_images():
+        return [Image.open(io.BytesIO(data)) for data in image_bytes]
+
+    def load_checklist():
+        state["checklist"] = v.load_predefined_checklist()
+
+    def switch_checklists():
+        # 등록된 모든 체크리스트 원본(SGR, SKONS 사업 부문별)을 차례로 선택
+        for source_key in v.get_checklist_sources():
+            v.get_checklist_artifact(source_key)
+
+    def prepare():
+        v.prepare_images(open_images(), original_bytes=[len(data) for data in image_bytes])
+
+    def preview_full():
+        # 이전 미리보기: 매 실행마다 원본 전체를 디코딩하고 원본 크기로 다시 인코딩하여 브라우저로 전송
+        for image in open_images():
+            image.convert("RGB").save(io.BytesIO(), format="JPEG")
+
+    def preview_thumbnails():
+        for data in image_bytes:
+            v.create_thumbnail(v.compute_image_hash(data), data)
+
+    def clear_image_caches():
+        v.get_decoded_image_cache.clear()
+        v.create_thumbnail.clear()
+
+    def analyze():
+        state["result"] = v.analyze_multiple_images_comprehensive(
+            open_images(), state["checklist"], image_names,
+            original_bytes=[len(data) for data in image_bytes]
+        )
+
+    def analyze_stream():
+        v.analyze_multiple_images_comprehensive(
+            open_images(), state["checklist"], image_names,
+            original_bytes=[len(data) for data in image_bytes],
+            on_progress=lambda parser: None
+        )
+
+    def analyze_triage():
+        v.run_analysis_with_cache(open_images(), state["checklist"], image_names, image_bytes,
+                                  force_refresh=True, triage=True)
+
+    def analyze_mapreduce(reduce_mode: str):
+        v.analyze_multiple_images_mapreduce(
+            open_images(), state["checklist"], image_names,
+            original_bytes=[len(data) for data in image_bytes],
+            map_options={"reduce": reduce_mode}
+        )
+
+    def parse_tables():
+        sections = state["result"]["sections"]
+        state["checklist_df"] = v.parse_sgr_checklist_to_dataframe(sections["sgr_checklist"])
+        state["risk_df"] = v.parse_risk_analysis_to_dataframe(sections["risk_analysis"])
+
+    def export_csv():
+        state["checklist_df"].to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
+        state["risk_df"].to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
+
+    def export_zip():
+        result = state["result"]
+        v.create_zip_download(result["sections"], result["timestamp"], state["risk_df"], state["checklist_df"])
+
+    return [
+        ("vision.checklist_load", load_checklist, v.load_checklist_artifact.clear),
+        ("vision.checklist_cold", switch_checklists, v.load_checklist_artifact.clear),
+        ("vision.checklist_switch", switch_checklists, None),
+        ("vision.prepare_images", prepare, None),
+        ("vision.preview_full", preview_full, None),
+        ("vision.preview_thumbs_cold", preview_thumbnails, clear_image_caches),
+        ("vision.preview_thumbs", preview_thumbnails, None),
+        ("vision.analyze", analyze, None),
+        ("vision.analyze_stream", analyze_stream, None),
+        ("vision.analyze_triage", analyze_triage, None),
+        ("vision.mapreduce", lambda: analyze_mapreduce("model"), None),
+        ("vision.mapreduce_local", lambda: analyze_mapreduce("local"), None),
+        ("vision.parse_sections", lambda: v.parse_analysis_sections(state["result"]["full_report"]), None),
+        ("vision.parse_tables", parse_tables, None),
+        ("vision.export_csv", export_csv, None),
+        ("vision.export_zip", export_zip, None),
+    ]
+
+def build_text_stages(t) -> list:
+    """텍스트 앱(작업 위험성 가이드)의 단계별 벤치마크 목록을 구성하는 함수"""
+    import streamlit as st
+
+    state = {}
+    snapshot_folder = t.REFERENCE_SNAPSHOT_FOLDER
+    reference_path = os.path.join(t.REFERENCE_FILES_FOLDER, t.DEFAULT_REFERENCE_FILE)
+    suggestion_path = os.path.join(t.REFERENCE_FILES_FOLDER, SUGGESTION_REFERENCE_FILE)
+
+    def clear_snapshot_cache(remove_disk: bool):
+        t.load_reference_snapshot.clear()
+        if remove_disk:
+            for file_path in glob.glob(os.path.join(snapshot_folder, "*")):
+                os.remove(file_path)
+
+    def load_references():
+        st.session_state['reference_files'] = t.load_reference_files_from_folder()
+        state["file_info"] = st.session_state['reference_files'][t.DEFAULT_REFERENCE_FILE]
+
+    def analyze():
+        state["result"] = t.analyze_work_risk(SAMPLE_WORK_DESCRIPTION, [t.DEFAULT_REFERENCE_FILE])
+
+    def analyze_reference_ids():
+        t.analyze_work_risk(SAMPLE_WORK_DESCRIPTION, [t.DEFAULT_REFERENCE_FILE], output_format="reference_ids")
+
+    def suggest_typing():
+        suggestion_index = t.get_suggestion_index(suggestion_path)
+        for query in SAMPLE_SUGGESTION_KEYSTROKES:
+            t.search_suggestion_index(suggestion_index, query)
+
+    def export():
+        result = state["result"]
+        section_files = t.create_section_files(result["sections"], result["timestamp"], result["work_description"])
+        risk_df = t.get_risk_table_dataframe(result)
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for file_name, content in section_files.items():
+                zip_file.writestr(file_name, content.encode("utf-8"))
+            zip_file.writestr("위험성평가표.csv", risk_df.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig"))
+
+    return [
+        ("text.snapshot_cold", lambda: t.get_reference_snapshot(reference_path), lambda: clear_snapshot_cache(True)),
+        ("text.snapshot_disk", lambda: t.get_reference_snapshot(reference_path), lambda: clear_snapshot_cache(False)),
+        ("text.load_references", load_references, None),
+        ("text.index_build", lambda: t.get_reference_index(reference_path), t.build_reference_index.clear),
+        ("text.select_rows", lambda: t.select_reference_rows(state["file_info"], SAMPLE_WORK_DESCRIPTION, t.REFERENCE_TOP_K), None),
+        ("text.analyze", analyze, None),
+        ("text.analyze_ids", analyze_reference_ids, None),
+        ("text.fast_path", lambda: t.build_fast_risk_guide(SAMPLE_WORK_DESCRIPTION, [t.DEFAULT_REFERENCE_FILE]), None),
+        ("text.suggest_build", lambda: t.get_suggestion_index(suggestion_path), t.build_suggestion_index.clear),
+        ("text.suggest_typing", suggest_typing, None),  # 키 입력 15회 전체
+        ("text.parse_sections", lambda: t.parse_analysis_sections(state["result"]["full_report"]), None),
+        ("text.parse_table", lambda: t.parse_risk_table_from_markdown(state["result"]["sections"]["risk_table"]), None),
+        ("text.export", export, None),
+    ]
+
+def print_report(results: dict, baseline: dict = None):
+    """단계별 결과 표를 출력하는 함수 (기준 결과가 있으면 중앙값 변화율 포함)"""
+    header = f"{'stage':<24}{'median ms':>12}{'min ms':>12}{'peak KB':>12}"
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        peak = f"{stats['peak_kb']:.1f}" if stats["peak_kb"] is not None else "-"
+        line = f"{name:<24}{stats['median_ms']:>12.2f}{stats['min_ms']:>12.2f}{peak:>12}"
+        if baseline:
+            base = baseline.get(name)
+            if base and base["median_ms"]:
+                line += f"{(stats['median_ms'] / base['median_ms'] - 1) * 100:>+9.1f}%"
+            else:
+                line += f"{'-':>10}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="위험성 평가 앱 오프라인 벤치마크")
+    parser.add_argument("--latency", type=float, default=0.0, help="모의 서버의 첫 응답 지연(초)")
+    parser.add_argument("--stream-rate", type=float, default=0.0, help="스트리밍 초당 토큰 수 (0이면 지연 없음)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="모의 서버가 429로 거절할 확률 (재시도 동작 확인용)")
+    parser.add_argument("--tpm-limit", type=int, default=10_000_000,
+                        help="앱 스케줄러의 분당 토큰 한도 (기본값은 한도 대기 없이 단계 시간만 측정)")
+    parser.add_argument("--repeat", type=int, default=3, help="단계별 반복 측정 횟수")
+    parser.add_argument("--images", type=int, default=0, help="사용할 샘플 사진 수 (0이면 전체)")
+    parser.add_argument("--handshake-latency", type=float, default=0.0,
+                        help="모의 서버의 새 연결마다 추가할 지연(초, TCP/TLS 연결 설정 시간 재현)")
+    parser.add_argument("--generation-rate", type=float, default=0.0,
+                        help="모의 서버의 스트리밍이 아닌 응답 초당 생성 토큰 수 (0이면 지연 없음)")
+    parser.add_argument("--only", choices=["vision", "text", "client"], help="한쪽 앱 또는 클라이언트 연결만 측정")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc 메모리 측정 생략")
+    parser.add_argument("--output", help="결과를 저장할 JSON 파일 경로")
+    parser.add_argument("--compare", help="비교할 기준 결과 JSON 파일 경로")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.chdir(REPO_ROOT)
+
+    image_paths = sorted(glob.glob(os.path.join(REPO_ROOT, "*.jpg")))
+    if args.images:
+        image_paths = image_paths[:args.images]
+
+    with MockOpenAIServer(latency=args.latency, stream_rate=args.stream_rate, error_rate=args.error_rate,
+                          handshake_latency=args.handshake_latency, generation_rate=args.generation_rate) as server, \
+            tempfile.TemporaryDirectory(prefix="benchmark-cache-") as cache_folder:
+        # 앱의 OpenAI 클라이언트가 모의 서버를 사용하고, 모의 응답으로 만든 분석 캐시/작업 DB/로그/참조 스냅샷이
+        # 실제 앱의 .cache 폴더에 섞이지 않도록 앱을 불러오기 전에 환경변수 설정
+        os.environ["APP_CACHE_FOLDER"] = cache_folder
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+        os.environ["OPENAI_TPM_LIMIT"] = str(args.tpm_limit)
+
+        stages = []
+        if args.only in (None, "client"):
+            stages += build_client_stages(server.base_url)
+        if args.only in (None, "vision"):
+            stages += build_vision_stages(load_app(VISION_APP_FILE, "vision_app"), image_paths)
+        if args.only in (None, "text"):
+            stages += build_text_stages(load_app(TEXT_APP_FILE, "text_app"))
+
+        results = {}
+        for name, func, setup in stages:
+            results[name] = measure(func, setup, repeat=args.repeat, trace_memory=not args.no_memory)
+
+    prompt_tokens = sum(request["prompt_tokens"] for request in server.request_log)
+    cached_tokens = sum(request["cached_tokens"] for request in server.request_log)
+    cached_ratio = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+    print(f"images={len(image_paths)} latency={args.latency}s stream_rate={args.stream_rate}/s "
+          f"repeat={args.repeat} requests={len(server.request_log)} rejected={server.rejected} "
+          f"connections={server.connections} "
+          f"prompt_cache={cached_ratio:.1%}")
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                "images": [os.path.basename(path) for path in image_paths],
+                "prompt_cache": {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens},
+                "stages": results,
+            }, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# OpenAI 공용 클라이언트 팩토리 (현장 사진 분석 앱과 작업 위험성 가이드 앱이 함께 사용)
+#
+# 프로세스 안에서 API 키/주소별로 클라이언트를 하나만 만들어 모든 세션과 재실행이 연결 풀을 공유합니다.
+# keep-alive 연결을 재사용하므로 TCP/TLS 연결 설정은 처음 한 번만 일어나고,
+# 서버 시작 시 warm-up 요청으로 연결을 미리 열어 두면 첫 분석 요청에서도 연결 설정 시간이 빠집니다.
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import DefaultHttpxClient, OpenAI, Timeout
+
+try:
+    import httpx
+except ImportError:  # httpx2를 전송 계층으로 사용하는 openai 배포판
+    import httpx2 as httpx
+
+# 타임아웃 설정 (초) - 연결, 응답 읽기(스트리밍은 청크 사이 간격), 요청 전송, 풀에서 연결 대기
+CONNECT_TIMEOUT_SECONDS = 5.0
+READ_TIMEOUT_SECONDS = 300.0
+WRITE_TIMEOUT_SECONDS = 30.0
+POOL_TIMEOUT_SECONDS = 30.0
+
+# 연결 풀 설정 (최대 동시 연결 수, 유지할 keep-alive 연결 수, 유휴 연결 유지 시간)
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY_SECONDS = 120.0
+
+# warm-up 설정 (미리 열어 둘 연결 수, 환경변수 OPENAI_WARMUP=0이면 사용 안 함)
+WARMUP_CONNECTIONS = 2
+
+_clients = {}
+_warmups = {}
+_clients_lock = threading.Lock()
+
+def create_http_client() -> httpx.Client:
+    """연결 풀/keep-alive/타임아웃을 조정한 HTTP 클라이언트를 생성하는 함수"""
+    return DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=Timeout(
+            connect=CONNECT_TIMEOUT_SECONDS,
+            read=READ_TIMEOUT_SECONDS,
+            write=WRITE_TIMEOUT_SECONDS,
+            pool=POOL_TIMEOUT_SECONDS,
+        ),
+    )
+
+def get_openai_client(api_key: str, base_url: str = None, warm_up: bool = None) -> OpenAI:
+    """API 키/주소별 공용 OpenAI 클라이언트를 반환하는 함수 (처음 생성할 때 백그라운드 warm-up 시작)
+
+    재시도는 공용 요청 스케줄러가 담당하므로 SDK 자체 재시도는 끕니다.
+    """
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+    if warm_up is None:
+        warm_up = os.environ.get("OPENAI_WARMUP", "1") != "0"
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=create_http_client())
+            _clients[key] = client
+            if warm_up:
+                _warmups[key] = start_warm_up(client)
+    return client
+
+def warm_up_client(client: OpenAI, connections: int = WARMUP_CONNECTIONS) -> dict:
+    """모델 목록 조회를 동시에 보내 keep-alive 연결을 미리 열어 두는 함수 (토큰을 사용하지 않음)
+
+    응답 코드와 관계없이 연결만 열리면 목적을 달성하므로, 실패는 결과에 기록만 합니다.
+    """
+    def ping(_):
+        started_at = time.perf_counter()
+        try:
+            client.get("/models", cast_to=object, options={"timeout": CONNECT_TIMEOUT_SECONDS * 2})
+            error = None
+        except Exception as e:
+            error = str(e)
+        return time.perf_counter() - started_at, error
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        results = list(executor.map(ping, range(connections)))
+    return {
+        "connections": connections,
+        "elapsed_seconds": round(max(elapsed for elapsed, _ in results), 3),
+        "errors": [error for _, error in results if error],
+    }
+
+def start_warm_up(client: OpenAI) -> dict:
+    """warm-up을 백그라운드 스레드에서 실행하고 완료되면 결과가 채워지는 상태 dict를 반환하는 함수"""
+    status = {"done": False}
+
+    def run():
+        status.update(warm_up_client(client))
+        status["done"] = True
+
+    threading.Thread(target=run, name="openai-warmup", daemon=True).start()
+    return status
+
+def get_warm_up_status(client: OpenAI):
+    """공용 클라이언트의 warm-up 상태를 반환하는 함수 (warm-up을 하지 않았으면 None)"""
+    with _clients_lock:
+        for key, cached_client in _clients.items():
+            if cached_client is client:
+                return _warmups.get(key)
+    return None
@@ -0,0 +1,351 @@
+# OpenAI API 공용 요청 스케줄러 (현장 사진 분석 앱과 작업 위험성 가이드 앱이 함께 사용)
+#
+# 같은 API 키를 여러 사용자가 동시에 쓸 때 분당 요청 수(RPM)/분당 토큰 수(TPM) 한도를 넘지 않도록
+# 토큰 버킷으로 요청을 대기시키고, 일시적인 오류(429, 5xx, 연결 오류)는 지수 백오프(지터 포함)로 재시도합니다.
+# 요청 전에는 입력 추정치 + max_tokens만큼 토큰을 예약하고, 응답의 실제 사용량이 오면 쓰지 않은 만큼 돌려받습니다.
+# 한도는 응답의 x-ratelimit-limit-* 헤더로 실제 계정 한도에 맞춥니다 (환경변수로 지정한 한도는 그대로 유지).
+# 스케줄러는 모델별로 프로세스 안에서 하나씩 만들어 모든 세션이 공유합니다.
+
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import openai
+
+# 모델별 기본 한도 (분당 요청 수, 분당 토큰 수, 사용량 등급 Tier 2 기준) - 첫 응답의 x-ratelimit-limit-* 헤더로 갱신되며,
+# 환경변수 OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT로 고정할 수 있음
+DEFAULT_RATE_LIMITS = {
+    "gpt-4.1": {"rpm": 5000, "tpm": 450000},
+    "gpt-4.1-mini": {"rpm": 5000, "tpm": 2000000},
+    "gpt-4o-mini": {"rpm": 5000, "tpm": 2000000},
+}
+FALLBACK_RATE_LIMIT = {"rpm": 5000, "tpm": 450000}
+
+# 실제 한도를 알려주는 응답 헤더 (스케줄러 한도 이름: 헤더 이름)
+RATE_LIMIT_HEADERS = {"rpm": "x-ratelimit-limit-requests", "tpm": "x-ratelimit-limit-tokens"}
+
+# 재시도 설정 (최대 재시도 횟수, 첫 대기 시간, 최대 대기 시간)
+MAX_RETRIES = 5
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+# 재시도할 HTTP 상태 코드 (요청 시간 초과, 충돌, 한도 초과, 서버 오류)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# 대기 시간 통계에 사용할 최근 요청 수
+WAIT_HISTORY_SIZE = 200
+
+class TokenBucket:
+    """분당 한도를 초 단위로 나누어 채우는 토큰 버킷 (잠금은 호출하는 쪽에서 관리)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """amount만큼 꺼낼 수 있을 때까지 남은 시간(초)을 반환하는 함수 (한도보다 큰 요청은 한도만큼으로 계산)"""
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_per_second
+
+    def consume(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """예약했지만 쓰지 않은 amount만큼 되돌리는 함수"""
+        self.available = min(self.capacity, self.available + max(0.0, amount))
+
+    def resize(self, per_minute: float):
+        """분당 한도를 바꾸는 함수 (늘어난 만큼은 바로 사용 가능, 줄어들면 남은 양도 새 한도 이하로)"""
+        self.available = min(float(per_minute), self.available + max(0.0, per_minute - self.capacity))
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+
+class ScheduledStream:
+    """스트리밍 응답을 끝까지 읽거나 닫을 때까지 스케줄러의 실행 슬롯을 유지하는 래퍼
+
+    마지막 청크의 사용량(stream_options.include_usage)이 있으면 슬롯을 반납할 때 쓰지 않은 예약 토큰을 돌려줍니다.
+    """
+
+    def __init__(self, stream, scheduler, reserved_tokens: int):
+        self._stream = stream
+        self._scheduler = scheduler
+        self._reserved_tokens = reserved_tokens
+        self._used_tokens = None
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                used_tokens = get_total_tokens(chunk)
+                if used_tokens is not None:
+                    self._used_tokens = used_tokens
+                yield chunk
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """응답 연결을 닫고 스케줄러 슬롯을 반납하는 함수 (여러 번 불러도 한 번만 반납)"""
+        if getattr(self, "_closed", True):
+            return
+        self._closed = True
+        try:
+            close_stream = getattr(self._stream, "close", None)
+            if close_stream is not None:
+                close_stream()
+        finally:
+            unused = self._reserved_tokens - self._used_tokens if self._used_tokens is not None else 0
+            self._scheduler.release(unused)
+
+class RequestScheduler:
+    """RPM/TPM 토큰 버킷으로 요청 순서를 관리하고 일시적 오류를 재시도하는 스케줄러
+
+    요청은 도착 순서대로(FIFO) 한도가 허용될 때 실행되며, 대기열 길이와 대기 시간 통계를 제공합니다.
+    fixed_limits에 있는 한도("rpm", "tpm")는 응답 헤더로 갱신하지 않습니다.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, max_retries: int = MAX_RETRIES,
+                 retry_base_seconds: float = RETRY_BASE_SECONDS, retry_max_seconds: float = RETRY_MAX_SECONDS,
+                 fixed_limits: tuple = ()):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.fixed_limits = set(fixed_limits)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._request_bucket = TokenBucket(rpm)
+        self._token_bucket = TokenBucket(tpm)
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._cooldown_until = 0.0
+        self._in_flight = 0
+        self._wait_history = deque(maxlen=WAIT_HISTORY_SIZE)
+        self._counters = {"requests": 0, "throttled": 0, "retries": 0, "failures": 0, "refunded_tokens": 0}
+
+    def acquire(self, tokens: int) -> float:
+        """한도 안에서 요청 1건과 tokens만큼의 토큰을 확보할 때까지 순서대로 대기하고 대기 시간(초)을 반환하는 함수"""
+        ticket = object()
+        started_at = time.monotonic()
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._request_bucket.refill(now)
+                    self._token_bucket.refill(now)
+                    wait = max(self._cooldown_until - now,
+                               self._request_bucket.time_until(1),
+                               self._token_bucket.time_until(tokens))
+                    if self._waiting[0] is ticket and wait <= 0:
+                        self._request_bucket.consume(1)
+                        self._token_bucket.consume(tokens)
+                        break
+                    # 앞선 요청이 있으면 그 요청이 끝날 때 깨어나고, 한도 때문이면 채워질 시간만큼 대기
+                    self._condition.wait(timeout=wait if self._waiting[0] is ticket else None)
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+            waited = time.monotonic() - started_at
+            self._in_flight += 1
+            self._counters["requests"] += 1
+            if waited > 0.01:
+                self._counters["throttled"] += 1
+            self._wait_history.append(waited)
+        return waited
+
+    def concurrency_limit(self, tokens_per_request: int) -> int:
+        """요청마다 tokens_per_request만큼 예약할 때 한도 안에서 동시에 시작할 수 있는 요청 수를 반환하는 함수 (최소 1)"""
+        with self._condition:
+            return max(1, int(min(self.rpm, self.tpm // max(1, tokens_per_request))))
+
+    def release(self, unused_tokens: int = 0):
+        """실행 슬롯을 반납하고, 예약했지만 쓰지 않은 토큰을 되돌려 대기 중인 요청을 깨우는 함수"""
+        with self._condition:
+            self._in_flight -= 1
+            if unused_tokens > 0:
+                self._token_bucket.refund(unused_tokens)
+                self._counters["refunded_tokens"] += unused_tokens
+            self._condition.notify_all()
+
+    def update_limits(self, headers):
+        """응답 헤더(x-ratelimit-limit-requests/tokens)의 실제 한도로 버킷 크기를 맞추는 함수"""
+        if not headers:
+            return
+        with self._condition:
+            for limit_name, header_name in RATE_LIMIT_HEADERS.items():
+                value = headers.get(header_name)
+                if limit_name in self.fixed_limits or not value:
+                    continue
+                try:
+                    value = int(value)
+                except ValueError:
+                    continue
+                if value > 0 and value != getattr(self, limit_name):
+                    setattr(self, limit_name, value)
+                    bucket = self._request_bucket if limit_name == "rpm" else self._token_bucket
+                    bucket.resize(value)
+                    self._condition.notify_all()
+
+    def compute_retry_delay(self, attempt: int, error: Exception) -> float:
+        """재시도 대기 시간을 계산하는 함수 (서버의 Retry-After가 있으면 그 이상, 없으면 지수 백오프 + 전체 지터)"""
+        delay = random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        retry_after = headers.get("retry-after-ms")
+        if retry_after is not None:
+            retry_after = float(retry_after) / 1000
+        else:
+            retry_after = headers.get("retry-after")
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_max_seconds))
+        return delay
+
+    def call(self, func, tokens: int, request_id: str = None, stats: dict = None, stream: bool = False):
+        """한도를 지키며 func(request_id)를 실행하고, 일시적 오류는 같은 request_id로 재시도하는 함수
+
+        request_id는 재시도마다 같은 값을 사용하므로 서버 측 중복 처리 방지(Idempotency-Key)에 사용할 수 있습니다.
+        stats가 주어지면 대기 시간(초), 시도 횟수, request_id를 기록합니다.
+        응답에 사용량(usage.total_tokens)이 있으면 예약한 tokens 중 쓰지 않은 만큼을 돌려받습니다.
+        stream이면 ScheduledStream으로 감싸 반환하며, 슬롯은 스트림을 끝까지 읽거나 닫을 때 반납됩니다.
+        """
+        request_id = request_id or uuid.uuid4().hex
+        stats = stats if stats is not None else {}
+        stats.update({"request_id": request_id, "wait_seconds": 0.0, "attempts": 0})
+        for attempt in range(self.max_retries + 1):
+            stats["wait_seconds"] += self.acquire(tokens)
+            stats["attempts"] += 1
+            try:
+                result = func(request_id)
+            except Exception as e:
+                error = e
+                self.release()
+                self.update_limits(getattr(getattr(e, "response", None), "headers", None))
+            else:
+                if stream:
+                    return ScheduledStream(result, self, tokens)
+                used_tokens = get_total_tokens(result)
+                self.release(tokens - used_tokens if used_tokens is not None else 0)
+                return result
+            
+            if not is_retryable_error(error) or attempt == self.max_retries:
+                with self._condition:
+                    self._counters["failures"] += 1
+                if is_retryable_error(error):
+                    raise Exception(f"API 요청이 일시적 오류로 {stats['attempts']}회 시도 후에도 실패했습니다. "
+                                    f"잠시 후 다시 시도해주세요. ({str(error)})") from error
+                raise error
+            delay = self.compute_retry_delay(attempt, error)
+            with self._condition:
+                self._counters["retries"] += 1
+                # 한도 초과 응답이면 대기 시간을 공유하여 다른 요청들도 함께 쉬도록 함
+                # (이 요청도 다음 acquire에서 같은 시간만큼 대기)
+                if getattr(error, "status_code", None) == 429:
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                    continue
+            time.sleep(delay)
+            stats["wait_seconds"] += delay
+
+    def create_completion(self, client, request_args: dict, tokens: int, stats: dict = None):
+        """chat.completions.create를 스케줄러를 거쳐 호출하는 함수 (재시도는 스케줄러가 담당하므로 SDK 재시도는 끔)
+
+        request_args에 stream이 켜져 있으면 ScheduledStream을 반환하므로 끝까지 읽거나 with 문으로 닫아야 합니다.
+        """
+        no_retry_client = client.with_options(max_retries=0)
+
+        def send(request_id):
+            raw_response = no_retry_client.chat.completions.with_raw_response.create(
+                **request_args, extra_headers={"Idempotency-Key": request_id}
+            )
+            self.update_limits(raw_response.headers)
+            return raw_response.parse()
+
+        return self.call(send, tokens, stats=stats, stream=bool(request_args.get("stream")))
+
+    def snapshot(self) -> dict:
+        """현재 대기열 길이, 실행 중인 요청 수, 최근 대기 시간 통계와 누적 카운터를 반환하는 함수"""
+        with self._condition:
+            now = time.monotonic()
+            self._request_bucket.refill(now)
+            self._token_bucket.refill(now)
+            waits = sorted(self._wait_history)
+            return {
+                "name": self.name,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "queue_depth": len(self._waiting),
+                "in_flight": self._in_flight,
+                "available_requests": int(self._request_bucket.available),
+                "available_tokens": int(self._token_bucket.available),
+                "cooldown_seconds": round(max(0.0, self._cooldown_until - now), 1),
+                "avg_wait_seconds": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                "p95_wait_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0.0,
+                **self._counters,
+            }
+
+def get_total_tokens(response):
+    """응답(또는 스트리밍 마지막 청크)의 usage.total_tokens를 반환하는 함수 (없으면 None)"""
+    total_tokens = getattr(getattr(response, "usage", None), "total_tokens", None)
+    return total_tokens if isinstance(total_tokens, int) else None
+
+def is_retryable_error(error: Exception) -> bool:
+    """재시도하면 성공할 수 있는 일시적 오류인지 판별하는 함수 (사용 한도 소진은 재시도하지 않음)"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        if getattr(error, "code", None) == "insufficient_quota":
+            return False
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def get_rate_limit(model: str) -> dict:
+    """모델의 RPM/TPM 한도와 환경변수로 고정한 한도 이름(fixed_limits)을 반환하는 함수 (환경변수가 있으면 우선)"""
+    limit = dict(DEFAULT_RATE_LIMITS.get(model, FALLBACK_RATE_LIMIT))
+    fixed_limits = []
+    if os.environ.get("OPENAI_RPM_LIMIT"):
+        limit["rpm"] = int(os.environ["OPENAI_RPM_LIMIT"])
+        fixed_limits.append("rpm")
+    if os.environ.get("OPENAI_TPM_LIMIT"):
+        limit["tpm"] = int(os.environ["OPENAI_TPM_LIMIT"])
+        fixed_limits.append("tpm")
+    limit["fixed_limits"] = tuple(fixed_limits)
+    return limit
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_request_scheduler(model: str) -> RequestScheduler:
+    """모델별 공용 스케줄러를 반환하는 함수 (프로세스 안의 모든 세션과 앱이 공유)"""
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = RequestScheduler(model, **get_rate_limit(model))
+        return _schedulers[model]
+
+def get_scheduler_snapshots() -> list:
+    """생성된 모든 스케줄러의 현재 상태를 반환하는 함수"""
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return [scheduler.snapshot() for scheduler in schedulers]
@@ -1,11 +1,12 @@
 # 7/31, 체크리스트의 대분류와 소분류의 내용으로 세분화하여 결과를 보여주도록 수정함
 
 import streamlit as st
-from PIL import Image
-from openai import OpenAI
+from PIL import Image, ImageOps
 import pandas as pd
+import numpy as np
 import json
 import os
+import glob
 import base64
 import io
 from datetime import datetime
@@ -13,6 +14,24 @@ from dotenv import load_dotenv
 import locale
 import zipfile
 import re
+import math
+import hashlib
+import sqlite3
+import time
+import uuid
+import threading
+import contextvars
+import logging
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import NamedTuple
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from analysis_utils import (dataframe_to_markdown_table, escape_table_cell, estimate_cost_usd, estimate_text_tokens,
+                            extract_usage)
+from openai_client import get_openai_client, get_warm_up_status
+from openai_scheduler import get_request_scheduler, get_scheduler_snapshots
 
 # 페이지 설정 (가장 먼저 실행되어야 함)
 st.set_page_config(
@@ -31,6 +50,247 @@ except:
 # .env 파일 로드
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 이미지 전처리 기본 설정 (긴 변 최대 픽셀, 짧은 변 최대 픽셀, 인코딩 형식, 품질)
+IMAGE_MAX_EDGE = 1536
+IMAGE_MAX_SHORT_EDGE = 768  # OpenAI 비전 입력은 짧은 변 768px로 축소되므로 그 이상은 전송량만 늘어남
+IMAGE_FORMAT = "JPEG"
+IMAGE_QUALITY = 85
+IMAGE_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+IMAGE_MAX_EDGE_LIMIT = 2048  # 사이드바에서 고를 수 있는 긴 변 최대값
+
+# 업로드 이미지 디코딩 캐시 (원본을 한 번만 디코딩하여 EXIF 회전 보정 후 전송 가능한 최대 크기로 줄여 두고,
+# 미리보기 썸네일, 품질 점검, 분석 전처리가 모두 재사용 / 내용 해시로 구분)
+DECODED_IMAGE_CACHE_ENTRIES = 32  # 장당 최대 약 4.7MB (768x2048 RGB)
+THUMBNAIL_EDGE = 360
+THUMBNAIL_QUALITY = 80
+PREVIEW_PAGE_SIZE = 9  # 미리보기 한 페이지에 표시할 사진 수 (3열 x 3행)
+
+# 분석 모델 및 프롬프트 템플릿 버전 (프롬프트 수정 시 버전을 올려 캐시를 무효화)
+ANALYSIS_MODEL = "gpt-4.1"
+PROMPT_VERSION = "2025-07-31.3"
+
+# 분석 1회 입력 토큰 예산 (초과 시 경고 또는 아래 순서로 이미지 긴 변을 줄여 예산에 맞춤)
+PROMPT_TOKEN_BUDGET = 30000
+DOWNSCALE_MAX_EDGES = [1024, 768, 512]
+
+# 캐시/작업 상태/로그 파일을 저장할 폴더 (환경변수 APP_CACHE_FOLDER로 변경, 벤치마크와 테스트는 임시 폴더 사용)
+CACHE_FOLDER = os.environ.get("APP_CACHE_FOLDER", ".cache")
+
+# 분석 결과 캐시 설정 (SQLite, 유효기간, 최대 용량)
+ANALYSIS_CACHE_PATH = os.path.join(CACHE_FOLDER, "analysis_cache.sqlite3")
+ANALYSIS_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+ANALYSIS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# SGR 체크리스트 파일과 항목 판별 규칙 (B열이 '1)'~'19)'로 시작하거나 키워드가 포함된 행이 체크리스트 항목)
+CHECKLIST_FILE_PATH = "SGR현장 체크리스트_변환2_수정.xlsx"
+CHECKLIST_ITEM_KEYWORDS = ['MSDS', '중량물이동', '화기 작업', '추락 예방', '건설 기계장비', '혼재 작업', '충돌 방지']
+CHECKLIST_ITEM_PATTERN = re.compile(
+    r"^(?:(?:1[0-9]|[1-9])\)(?P<numbered>.*)|(?P<keyword>.*(?:"
+    + "|".join(re.escape(keyword) for keyword in CHECKLIST_ITEM_KEYWORDS) + r").*))$",
+    re.DOTALL
+)
+
+# 체크리스트 원본 등록 (탐색 위치의 Excel에서 SGR 체크리스트와 SKONS 위험성평가 양식의 사업 부문별 시트를 찾음)
+# 각 원본은 처음 사용할 때 컴파일하여 프로세스 전체에서 공유하고, 자동 감지는 사진 파일 이름/현장 설명의 키워드로 판단
+CHECKLIST_SEARCH_FOLDERS = [".", "reference_files"]
+DEFAULT_CHECKLIST_SOURCE = "sgr"
+DEFAULT_CHECKLIST_NAME = "SGR 체크리스트"  # 프롬프트/보고서/탭에 표시할 이름 (기본 체크리스트와 원본 정보가 없는 결과에 사용)
+CHECKLIST_AUTO_DETECT = "auto"
+CHECKLIST_CACHE_ENTRIES = 8  # 컴파일된 체크리스트를 보관할 최대 개수 (원본 수 x 파일 버전)
+SKONS_CHECKLIST_VARIANTS = {
+    "access": {
+        "label": "SKONS Access망", "sheet_keyword": "Access",
+        "keywords": ["access", "액세스", "기지국", "중계기", "인빌딩", "철탑", "지하철", "터널", "승강장"],
+    },
+    "transmission": {
+        "label": "SKONS 전송망", "sheet_keyword": "전송망",
+        "keywords": ["전송", "선로", "광케이블", "광접속", "맨홀", "관로", "전주", "통신주", "가공"],
+    },
+    "infra": {
+        "label": "SKONS Infra 설비", "sheet_keyword": "Infra",
+        "keywords": ["infra", "인프라", "통합국", "사옥", "수변전", "변전", "ups", "축전지", "정류기", "발전기", "공조", "전기실"],
+    },
+}
+SKONS_MAX_CATEGORIES = 10  # SKONS 양식에서 체크리스트 대분류로 쓸 재해유형 수 (위험요인 행이 많은 순)
+SKONS_MAX_ITEMS_PER_CATEGORY = 4  # 재해유형별로 체크리스트 항목으로 쓸 위험성 감소 대책 수 (자주 나오는 순)
+SKONS_HEADER_SEARCH_ROWS = 10  # 머리글 행을 찾을 시트 앞부분 행 수
+
+# 이미지 품질 사전 점검 (축소한 흑백 이미지로 흐림/노출/중복을 검사하여 분석 전에 표시하거나 제외)
+QUALITY_CHECK_EDGE = 512
+BLUR_VARIANCE_THRESHOLD = 100.0  # 라플라시안 분산이 이보다 작으면 흐린 사진 (선명한 현장 사진은 보통 1000 이상)
+DARK_MEAN_THRESHOLD = 40  # 평균 밝기(0~255)가 이보다 낮으면 어두운 사진
+BRIGHT_MEAN_THRESHOLD = 220  # 평균 밝기가 이보다 높으면 과노출 사진
+CLIPPED_PIXEL_RATIO = 0.6  # 밝기 16 이하 또는 240 이상인 픽셀 비율이 이보다 크면 노출 불량
+DUPLICATE_HASH_DISTANCE = 6  # 64비트 지각 해시(pHash)의 해밍 거리가 이 이하이면 거의 같은 사진
+QUALITY_ISSUES = {
+    "blur": "흐림",
+    "dark": "어두움",
+    "bright": "과노출",
+    "duplicate": "중복",
+}
+
+# 분석 실행 모드 (단일 요청 / 대분류별 병렬 요청)
+ANALYSIS_MODES = {
+    "single": "단일 요청 (비용 우선)",
+    "sharded": "대분류 병렬 (속도 우선)",
+    "mapreduce": "사진 묶음별 분석 후 통합 (대량 사진)",
+}
+SHARD_MAX_WORKERS = 16  # 병렬 모드 동시 요청 상한 (실제 수는 샤드 수와 API 한도 안에서 동시에 시작할 수 있는 요청 수로 결정)
+
+# 사진 묶음별 분석 후 통합(map-reduce) 설정: 사진을 묶음으로 나누어 동시에 관찰 결과(JSON)를 받고,
+# 체크리스트는 로컬 규칙으로, 작업 환경/위험요인/권장사항은 텍스트 전용 통합 요청 또는 로컬 규칙으로 합침
+MAP_GROUP_SIZE = 2
+MAP_MAX_WORKERS = 4
+MAP_MAX_TOKENS = 2500
+MAP_FINDINGS_TOKENS = 600  # 묶음 1개의 관찰 결과가 통합 요청 입력에서 차지하는 토큰 추정치
+REDUCE_MAX_TOKENS = 4000
+REDUCE_MODES = {
+    "model": "통합 요청 (텍스트 전용 1회)",
+    "local": "로컬 병합 규칙 (추가 요청 없음)",
+}
+# 묶음별 판정을 현장 전체 판정으로 합칠 때의 우선순위 (한 묶음이라도 미준수면 미준수)
+CHECKLIST_STATUS_PRIORITY = ["X", "O", "해당없음", "알수없음"]
+
+# 백그라운드 분석 작업 설정 (작업 상태 DB, 동시 실행 워커 수, 화면 갱신 주기, 진행 내용 저장 주기, 보관 기간)
+ANALYSIS_JOB_DB_PATH = os.path.join(CACHE_FOLDER, "analysis_jobs.sqlite3")
+ANALYSIS_JOB_MAX_WORKERS = 2
+ANALYSIS_JOB_POLL_SECONDS = 1.0
+ANALYSIS_JOB_PROGRESS_INTERVAL = 0.5
+ANALYSIS_JOB_RETENTION_SECONDS = 24 * 60 * 60
+ANALYSIS_JOB_STATUSES = {
+    "queued": "⏳ 대기 중",
+    "running": "🤖 분석 중",
+    "done": "✅ 완료",
+    "failed": "❌ 실패",
+}
+
+# 실행 구간 계측 로그 (구간별 소요 시간을 JSONL로 누적하여 일자별 p50/p95 계산에 사용)
+TRACE_LOG_PATH = os.path.join(CACHE_FOLDER, "trace_log.jsonl")
+LOG_WRITE_LOCK = threading.Lock()
+# JSONL 로그 크기 상한 (넘으면 기존 파일을 .1, .2 ...로 밀어내고 새 파일에 기록, 가장 오래된 백업은 삭제)
+JSONL_LOG_MAX_BYTES = 10 * 1024 * 1024
+JSONL_LOG_BACKUP_COUNT = 2
+CURRENT_TRACE = contextvars.ContextVar("current_trace", default=None)
+
+# 사전 분류(트리아지) 설정: 저가 모델이 축소 이미지로 현장 유형을 먼저 분류하고, 해당 가능성이 있는 대분류만 상세 분석
+# (제외된 대분류 항목은 '해당없음'으로 채우고, 분류 결과와 절감 추정치를 JSONL 로그에 기록)
+TRIAGE_MODEL = "gpt-4.1-mini"
+TRIAGE_IMAGE_OPTIONS = {"max_edge": 512, "quality": 70}
+TRIAGE_MAX_TOKENS = 800
+TRIAGE_ALWAYS_CATEGORIES = ["SGR 준수"]  # 현장 유형과 무관하게 항상 상세 분석할 대분류
+TRIAGE_OUTPUT_TOKENS_PER_ITEM = 120  # 체크리스트 1개 항목 판정에 드는 출력 토큰 추정치
+TRIAGE_LOG_PATH = os.path.join(CACHE_FOLDER, "triage_log.jsonl")
+
+# 출력 형식 (마크다운 표 / JSON 스키마 기반 구조화 출력)
+OUTPUT_FORMATS = {
+    "markdown": "마크다운 표",
+    "json": "구조화 JSON (스키마 검증)",
+}
+CHECKLIST_STATUSES = ["O", "X", "해당없음", "알수없음"]
+CIRCLED_NUMBERS = "①②③④⑤⑥⑦⑧⑨⑩"
+
+# 구조화 출력용 JSON 스키마
+ANALYSIS_REPORT_SCHEMA = {
+    "name": "integrated_risk_assessment",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "work_environment": {"type": "string"},
+            "risks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "number": {"type": "integer"},
+                        "hazard": {"type": "string"},
+                        "description": {"type": "string"},
+                        "countermeasures": {"type": "array", "items": {"type": "string"}}
+                    },
+                    "required": ["number", "hazard", "description", "countermeasures"],
+                    "additionalProperties": False
+                }
+            },
+            "checklist": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "number": {"type": "integer"},
+                        "status": {"type": "string", "enum": CHECKLIST_STATUSES},
+                        "details": {"type": "string"}
+                    },
+                    "required": ["number", "status", "details"],
+                    "additionalProperties": False
+                }
+            },
+            "recommendations": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["work_environment", "risks", "checklist", "recommendations"],
+        "additionalProperties": False
+    }
+}
+
+# 사전 분류 응답용 JSON 스키마
+TRIAGE_SCHEMA = {
+    "name": "scene_triage",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "scene": {"type": "string"},
+            "categories": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "category": {"type": "string"},
+                        "applicable": {"type": "boolean"},
+                        "reason": {"type": "string"}
+                    },
+                    "required": ["category", "applicable", "reason"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["scene", "categories"],
+        "additionalProperties": False
+    }
+}
+
+# 사진 묶음별 관찰 결과 응답용 JSON 스키마 (근거가 보이는 체크리스트 항목만 작성)
+PHOTO_FINDINGS_SCHEMA = {
+    "name": "photo_findings",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "scene": {"type": "string"},
+            "hazards": ANALYSIS_REPORT_SCHEMA["schema"]["properties"]["risks"],
+            "checklist": ANALYSIS_REPORT_SCHEMA["schema"]["properties"]["checklist"]
+        },
+        "required": ["scene", "hazards", "checklist"],
+        "additionalProperties": False
+    }
+}
+
+# 통합 요청 응답용 JSON 스키마 (체크리스트는 로컬 규칙으로 합치므로 제외)
+RISK_SUMMARY_SCHEMA = {
+    "name": "integrated_risk_summary",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            key: ANALYSIS_REPORT_SCHEMA["schema"]["properties"][key]
+            for key in ("work_environment", "risks", "recommendations")
+        },
+        "required": ["work_environment", "risks", "recommendations"],
+        "additionalProperties": False
+    }
+}
+
 # CSS 스타일 추가
 def add_custom_css():
     """체크리스트 스타일링을 위한 CSS 추가"""
@@ -107,17 +367,18 @@ def initialize_app():
         st.session_state['analysis_result'] = None
     if 'analysis_completed' not in st.session_state:
         st.session_state['analysis_completed'] = False
+    attach_analysis_job()
 
 # OpenAI API 키 및 클라이언트 설정
 @st.cache_resource
 def initialize_openai_client():
-    """OpenAI 클라이언트 초기화"""
+    """OpenAI 클라이언트 초기화 (프로세스 공용 클라이언트를 사용하여 연결 풀을 모든 세션이 공유)"""
     try:
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
             st.error("❌ OPENAI_API_KEY 환경변수가 설정되어 있지 않습니다.")
             return None
-        return OpenAI(api_key=api_key)
+        return get_openai_client(api_key)
     except Exception as e:
         st.error(f"❌ OpenAI 클라이언트 초기화 실패: {str(e)}")
         return None
@@ -179,139 +440,634 @@ def create_default_checklist():
     return pd.DataFrame(checklist_data)
 
 # Excel 파일에서 체크리스트 로드
-@st.cache_data
-def load_predefined_checklist(file_path="SGR현장 체크리스트_변환2_수정.xlsx"):
-    """Excel 파일의 A열(대분류)과 B열(소분류)에서 체크리스트를 로드합니다."""
+class CompiledChecklist(NamedTuple):
+    """체크리스트 DataFrame, 프롬프트 표 조각, 내용 해시를 묶은 불변 산출물 (파일 버전마다 한 번 생성하여 공유)
+
+    checklist는 여러 세션이 공유하므로 수정하지 말고, 수정이 필요하면 load_predefined_checklist의 복사본을 사용합니다.
+    notice는 로드 결과 안내 메시지 (표시 함수 이름, 내용)이고, name은 프롬프트/보고서에 표시할 체크리스트 이름입니다.
+    """
+    checklist: pd.DataFrame
+    prompt_table: str
+    content_hash: str
+    source: str
+    notice: tuple
+    name: str = DEFAULT_CHECKLIST_NAME
+
+def compile_checklist(checklist: pd.DataFrame, source: str, notice: tuple,
+                      name: str = DEFAULT_CHECKLIST_NAME) -> CompiledChecklist:
+    """체크리스트로부터 프롬프트 표 조각과 내용 해시를 한 번 계산하여 산출물로 묶는 함수
+
+    체크리스트 이름은 DataFrame의 attrs에도 기록하여, 체크리스트를 받는 프롬프트/보고서 함수가 get_checklist_name으로 사용합니다.
+    """
+    checklist.attrs["checklist_name"] = name
+    prompt_table = generate_checklist_prompt(checklist)
+    return CompiledChecklist(
+        checklist=checklist,
+        prompt_table=prompt_table,
+        content_hash=hashlib.sha256(prompt_table.encode('utf-8')).hexdigest(),
+        source=source,
+        notice=notice,
+        name=name,
+    )
+
+def get_checklist_name(checklist: pd.DataFrame) -> str:
+    """체크리스트의 표시 이름을 반환하는 함수 (원본 정보가 없으면 SGR 체크리스트)"""
+    return checklist.attrs.get("checklist_name", DEFAULT_CHECKLIST_NAME)
+
+def parse_checklist_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """Excel 시트의 A열(대분류)과 B열(소분류)을 열 단위 연산으로 체크리스트 항목으로 변환하는 함수
+
+    A열은 값이 있는 행에서 대분류가 바뀌므로 아래로 채우고(ffill), B열은 '1)'~'19)'로 시작하는 항목(번호 제거)이나
+    CHECKLIST_ITEM_KEYWORDS가 포함된 항목만 하나의 정규식으로 골라냅니다.
+    """
+    category_column = df.iloc[:, 0].fillna("").astype(str).str.strip()
+    item_column = df.iloc[:, 1].fillna("").astype(str).str.strip()
+    
+    # 대분류는 줄바꿈을 공백으로 바꾸고, 머리글('구분')이나 빈 칸은 이전 대분류를 이어받음
+    categories = (category_column.mask(category_column.isin(["", "구분", "nan"]))
+                  .str.replace('\n', ' ').str.replace('\r', ' ').str.strip().ffill())
+    matches = item_column.str.extract(CHECKLIST_ITEM_PATTERN)
+    selected = categories.notna() & (item_column != "") & (matches["numbered"].notna() | matches["keyword"].notna())
+    
+    items = matches["numbered"].str.strip().fillna(item_column)[selected]
+    return pd.DataFrame({
+        "번호": range(1, len(items) + 1),
+        "대분류": categories[selected].tolist(),
+        "소분류": items.tolist(),
+    })
+
+def parse_skons_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """SKONS 위험성평가 양식 시트를 재해유형(대분류)별 위험성 감소 대책(소분류) 체크리스트로 변환하는 함수
+
+    머리글은 2줄로 병합된 시트도 있으므로 '위험성 감소 대책'이 있는 행을 찾아 열 이름으로 쓰고(반복되는 머리글 행은 제외),
+    감소 대책은 줄 단위로 나누어 앞의 기호를 뗀 뒤
+    위험요인 행이 많은 재해유형부터 자주 나오는 대책 순으로 골라 중복 없이 항목으로 만듭니다.
+    """
+    cells = df.head(SKONS_HEADER_SEARCH_ROWS).astype(str).apply(lambda column: column.str.replace(r"\s+", "", regex=True))
+    header_rows = cells.index[cells.eq("위험성감소대책").any(axis=1)]
+    if len(header_rows) == 0:
+        return pd.DataFrame(columns=["번호", "대분류", "소분류"])
+    table = df.iloc[header_rows[-1] + 1:].copy()
+    table.columns = cells.loc[header_rows[-1]]
+    if "재해유형" not in table.columns:
+        return pd.DataFrame(columns=["번호", "대분류", "소분류"])
+    
+    pairs = pd.DataFrame({
+        "대분류": table["재해유형"].astype(str).str.strip(),
+        "소분류": table["위험성감소대책"].astype(str).str.split("\n"),
+    }).explode("소분류")
+    pairs["소분류"] = pairs["소분류"].str.strip().str.replace(r"^(?:[-·•○*]|o(?=\s))\s*", "", regex=True).str.strip()
+    pairs = pairs[(pairs["대분류"].str.len() > 0) & ~pairs["대분류"].isin(["nan", "None"])
+                  & (pairs["소분류"].str.len() >= 4) & (pairs["소분류"] != "nan")]
+    
+    category_order = pairs["대분류"].value_counts().index[:SKONS_MAX_CATEGORIES]
+    counts = pairs[pairs["대분류"].isin(category_order)].groupby(["대분류", "소분류"], sort=False).size().rename("빈도")
+    counts = counts.reset_index()
+    counts["순위"] = counts["대분류"].map({category: rank for rank, category in enumerate(category_order)})
+    items = (counts.sort_values(["순위", "빈도"], ascending=[True, False], kind="stable")
+             .drop_duplicates("소분류")
+             .groupby("대분류", sort=False).head(SKONS_MAX_ITEMS_PER_CATEGORY))
+    return pd.DataFrame({
+        "번호": range(1, len(items) + 1),
+        "대분류": items["대분류"].tolist(),
+        "소분류": items["소분류"].tolist(),
+    })
+
+@st.cache_resource(show_spinner=False, max_entries=CHECKLIST_CACHE_ENTRIES)
+def load_checklist_artifact(file_path: str, size: int, mtime_ns: int, sheet=0, kind: str = "sgr",
+                            name: str = DEFAULT_CHECKLIST_NAME) -> CompiledChecklist:
+    """원본(파일, 시트) 버전(크기, 수정 시각)마다 한 번 체크리스트를 로드하여 산출물로 만드는 함수 (실패하면 기본 체크리스트)
+
+    처음 사용하는 원본만 읽어 컴파일하고, 최근 사용한 CHECKLIST_CACHE_ENTRIES개를 프로세스 전체에서 공유합니다.
+    """
     try:
-        if os.path.exists(file_path):
-            # pandas로 Excel 파일 읽기
-            df = pd.read_excel(file_path, sheet_name=0)
-            
-            if len(df.columns) >= 2:
-                checklist_items = []
-                current_category = ""
-                item_number = 1
-                
-                for idx, row in df.iterrows():
-                    a_value = str(row.iloc[0]).strip() if pd.notna(row.iloc[0]) else ""
-                    b_value = str(row.iloc[1]).strip() if pd.notna(row.iloc[1]) else ""
-                    
-                    # A열에 값이 있으면 대분류 업데이트
-                    if a_value and a_value not in ["구분", "nan"]:
-                        # 줄바꿈 문자 제거
-                        current_category = a_value.replace('\n', ' ').replace('\r', ' ').strip()
-                    
-                    # B열 값이 체크리스트 항목인지 확인
-                    if b_value and current_category and current_category != "구분":
-                        # 번호가 포함된 항목들 처리
-                        if any(b_value.startswith(f"{i})") for i in range(1, 20)):
-                            # 번호 제거
-                            clean_item = b_value.split(')', 1)[1].strip() if ')' in b_value else b_value
-                            checklist_items.append({
-                                "번호": item_number,
-                                "대분류": current_category,
-                                "소분류": clean_item
-                            })
-                            item_number += 1
-                        # 특정 키워드가 포함된 항목들도 포함
-                        elif any(keyword in b_value for keyword in ['MSDS', '중량물이동', '화기 작업', '추락 예방', '건설 기계장비', '혼재 작업', '충돌 방지']):
-                            checklist_items.append({
-                                "번호": item_number,
-                                "대분류": current_category,
-                                "소분류": b_value
-                            })
-                            item_number += 1
-                
-                if checklist_items:
-                    checklist_df = pd.DataFrame(checklist_items)
-                    st.success(f"✅ Excel 파일에서 {len(checklist_items)}개의 체크리스트 항목을 로드했습니다.")
-                    return checklist_df
-                else:
-                    st.warning("⚠️ Excel 파일에서 체크리스트 항목을 찾을 수 없습니다. 기본 체크리스트를 사용합니다.")
-                    return create_default_checklist()
-            else:
-                st.warning("⚠️ Excel 파일에 A열, B열 데이터가 부족합니다. 기본 체크리스트를 사용합니다.")
-                return create_default_checklist()
-                
-        else:
-            st.info(f"ℹ️ 체크리스트 파일 '{file_path}'을 찾을 수 없습니다. 기본 체크리스트를 사용합니다.")
-            return create_default_checklist()
-            
+        if not os.path.exists(file_path):
+            return compile_checklist(create_default_checklist(), "default", (
+                "info", f"ℹ️ 체크리스트 파일 '{file_path}'을 찾을 수 없습니다. 기본 체크리스트를 사용합니다."))
+        
+        # pandas로 Excel 파일 읽기 (SKONS 양식은 머리글 위치가 시트마다 달라 머리글 없이 읽음)
+        df = pd.read_excel(file_path, sheet_name=sheet, header=None if kind == "skons" else 0)
+        if len(df.columns) < 2:
+            return compile_checklist(create_default_checklist(), "default", (
+                "warning", "⚠️ Excel 파일에 A열, B열 데이터가 부족합니다. 기본 체크리스트를 사용합니다."))
+        
+        checklist_df = parse_skons_sheet(df) if kind == "skons" else parse_checklist_sheet(df)
+        if checklist_df.empty:
+            return compile_checklist(create_default_checklist(), "default", (
+                "warning", "⚠️ Excel 파일에서 체크리스트 항목을 찾을 수 없습니다. 기본 체크리스트를 사용합니다."))
+        sheet_label = f" '{sheet}' 시트" if kind == "skons" else ""
+        return compile_checklist(checklist_df, file_path, (
+            "success", f"✅ Excel 파일{sheet_label}에서 {len(checklist_df)}개의 체크리스트 항목을 로드했습니다."), name)
     except Exception as e:
-        st.warning(f"⚠️ 체크리스트 파일 로드 중 오류: {str(e)}. 기본 체크리스트를 사용합니다.")
-        return create_default_checklist()
+        return compile_checklist(create_default_checklist(), "default", (
+            "warning", f"⚠️ 체크리스트 파일 로드 중 오류: {str(e)}. 기본 체크리스트를 사용합니다."))
+
+def get_checklist_source_files() -> tuple:
+    """체크리스트 탐색 위치의 Excel 파일과 버전(크기, 수정 시각) 목록을 반환하는 함수 (Office 임시 파일 제외)"""
+    source_files = []
+    for folder in CHECKLIST_SEARCH_FOLDERS:
+        for file_path in sorted(glob.glob(os.path.join(folder, "*.xlsx"))):
+            if os.path.basename(file_path).startswith("~$"):
+                continue
+            stat = os.stat(file_path)
+            source_files.append((os.path.normpath(file_path), stat.st_size, stat.st_mtime_ns))
+    return tuple(source_files)
+
+@st.cache_data(show_spinner=False)
+def discover_checklist_sources(source_files: tuple) -> dict:
+    """Excel 파일 목록에서 체크리스트 원본을 찾아 {원본 키: 정보} 형태로 등록하는 함수
+
+    SGR 체크리스트는 항상 기본 원본으로 등록하고, SKONS 양식은 시트 이름으로 사업 부문을 구분합니다.
+    같은 양식이 여러 위치에 있으면 먼저 찾은 파일을 사용하며, 이 단계에서는 시트 이름만 읽습니다.
+    """
+    sources = {DEFAULT_CHECKLIST_SOURCE: {
+        "label": "SGR 현장 체크리스트", "name": DEFAULT_CHECKLIST_NAME, "path": CHECKLIST_FILE_PATH, "sheet": 0,
+        "kind": "sgr", "keywords": [],
+    }}
+    for file_path, _, _ in source_files:
+        if "SKONS" not in os.path.basename(file_path):
+            continue
+        try:
+            with pd.ExcelFile(file_path) as workbook:
+                sheet_names = workbook.sheet_names
+        except Exception:
+            continue
+        for key, variant in SKONS_CHECKLIST_VARIANTS.items():
+            sheet = next((name for name in sheet_names if variant["sheet_keyword"] in name), None)
+            if key not in sources and sheet:
+                sources[key] = {"label": variant["label"], "name": f"{variant['label']} 체크리스트", "path": file_path,
+                                "sheet": sheet, "kind": "skons", "keywords": variant["keywords"]}
+    return sources
+
+def get_checklist_sources() -> dict:
+    """현재 파일 목록 기준으로 등록된 체크리스트 원본을 반환하는 함수 (파일이 추가/변경되면 다시 탐색)"""
+    return discover_checklist_sources(get_checklist_source_files())
+
+def get_checklist_artifact(source_key: str = DEFAULT_CHECKLIST_SOURCE) -> CompiledChecklist:
+    """원본의 현재 파일 버전 체크리스트 산출물을 반환하는 함수 (처음 사용하거나 파일이 바뀌면 새로 로드)"""
+    sources = get_checklist_sources()
+    source = sources.get(source_key, sources[DEFAULT_CHECKLIST_SOURCE])
+    try:
+        stat = os.stat(source["path"])
+        version = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        version = (0, 0)
+    return load_checklist_artifact(source["path"], *version, sheet=source["sheet"], kind=source["kind"],
+                                   name=source["name"])
+
+@st.cache_resource(show_spinner=False)
+def prewarm_checklist_sources(source_files: tuple) -> dict:
+    """등록된 모든 원본을 백그라운드에서 미리 컴파일하는 함수 (파일 목록마다 한 번 실행, 원본 전환 시 대기 없음)
+
+    캐시 함수를 호출하므로 실행한 세션의 스크립트 실행 컨텍스트를 스레드에 붙이고, 실패한 원본은 로그와 상태에 남깁니다.
+    """
+    status = {"done": False, "compiled": 0, "failed": []}
+    
+    def run():
+        try:
+            for source_key in discover_checklist_sources(source_files):
+                try:
+                    get_checklist_artifact(source_key)
+                    status["compiled"] += 1
+                except Exception as e:
+                    status["failed"].append(source_key)
+                    logger.warning("체크리스트 원본 '%s' 미리 준비 실패: %s", source_key, e)
+        except Exception as e:
+            logger.warning("체크리스트 원본 탐색 실패: %s", e)
+        finally:
+            status["done"] = True
+    
+    thread = threading.Thread(target=run, name="checklist-prewarm", daemon=True)
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+    return status
+
+def detect_checklist_source(texts: list, sources: dict) -> tuple:
+    """사진 파일 이름과 현장 설명에 나온 사업 부문 키워드가 가장 많은 원본을 고르는 함수
+
+    반환: (원본 키, 일치한 키워드 목록) - 일치하는 키워드가 없으면 기본 원본(SGR)
+    """
+    text = " ".join(texts).lower()
+    best_key, best_matches = DEFAULT_CHECKLIST_SOURCE, []
+    for source_key, source in sources.items():
+        matches = [keyword for keyword in source["keywords"] if keyword.lower() in text]
+        if len(matches) > len(best_matches):
+            best_key, best_matches = source_key, matches
+    return best_key, best_matches
+
+def resolve_checklist_source() -> tuple:
+    """사이드바 선택(자동 감지 포함)에 따라 사용할 원본 키와 선택 근거를 반환하는 함수"""
+    sources = get_checklist_sources()
+    selected = st.session_state.get("checklist_source", CHECKLIST_AUTO_DETECT)
+    if selected in sources:
+        return selected, "직접 선택"
+    texts = [image_file.name for image_file in st.session_state.get("image_uploader") or []]
+    texts.append(st.session_state.get("site_description", ""))
+    source_key, matches = detect_checklist_source(texts, sources)
+    if matches:
+        return source_key, f"자동 감지 ({', '.join(matches)})"
+    return source_key, "자동 감지 (일치하는 키워드 없음, 기본값)"
+
+def load_predefined_checklist(source_key: str = DEFAULT_CHECKLIST_SOURCE):
+    """등록된 원본에서 체크리스트(대분류, 소분류)를 로드합니다."""
+    artifact = get_checklist_artifact(source_key)
+    level, message = artifact.notice
+    getattr(st, level)(message)
+    return artifact.checklist.copy()
+
+# 실행 구간 계측 (분석 1회 단위로 구간별 시작/소요 시간과 바이트/토큰 수를 기록)
+class RunTrace:
+    """분석 1회의 구간(span) 기록을 모으는 클래스 (여러 스레드에서 동시에 기록 가능)
+
+    offset_ms는 분석 이후 화면 렌더링처럼 이어지는 단계를 같은 타임라인에 붙일 때 사용합니다.
+    """
+
+    def __init__(self, trace_id: str = None, phase: str = "analysis", offset_ms: float = 0.0):
+        self.trace_id = trace_id or uuid.uuid4().hex[:12]
+        self.phase = phase
+        self.offset_ms = offset_ms
+        self.started_at = time.perf_counter()
+        self.spans = []
+        self._flushed = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, start: float, end: float, **attrs):
+        span = {
+            "stage": stage,
+            "phase": self.phase,
+            "start_ms": round(self.offset_ms + (start - self.started_at) * 1000, 2),
+            "duration_ms": round((end - start) * 1000, 2),
+            **attrs,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {"trace_id": self.trace_id, "spans": spans}
+
+    def flush(self):
+        """아직 로그에 쓰지 않은 구간들을 JSONL 로그 파일에 추가하는 함수"""
+        with self._lock:
+            pending = self.spans[self._flushed:]
+            self._flushed = len(self.spans)
+        if not pending:
+            return
+        append_jsonl_log(TRACE_LOG_PATH, [{"trace_id": self.trace_id, **span} for span in pending])
+
+def rotate_jsonl_log(log_path: str):
+    """로그 파일을 log_path.1로, 기존 백업은 번호를 하나씩 밀어내는 함수 (JSONL_LOG_BACKUP_COUNT를 넘는 백업은 삭제)"""
+    for index in range(JSONL_LOG_BACKUP_COUNT - 1, 0, -1):
+        backup_path = f"{log_path}.{index}"
+        if os.path.exists(backup_path):
+            os.replace(backup_path, f"{log_path}.{index + 1}")
+    if JSONL_LOG_BACKUP_COUNT > 0:
+        os.replace(log_path, f"{log_path}.1")
+    else:
+        os.remove(log_path)
+
+def append_jsonl_log(log_path: str, records: list):
+    """기록 시각을 붙여 레코드들을 JSONL 로그 파일에 추가하는 함수 (파일이 JSONL_LOG_MAX_BYTES를 넘게 되면 먼저 회전)"""
+    logged_at = datetime.now().isoformat(timespec="seconds")
+    lines = [json.dumps({"logged_at": logged_at, **record}, ensure_ascii=False) for record in records]
+    data = "\n".join(lines) + "\n"
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with LOG_WRITE_LOCK:
+        try:
+            current_size = os.path.getsize(log_path)
+        except OSError:
+            current_size = 0
+        if current_size and current_size + len(data.encode("utf-8")) > JSONL_LOG_MAX_BYTES:
+            rotate_jsonl_log(log_path)
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+@contextmanager
+def activate_trace(trace: RunTrace):
+    """with 블록 안에서 실행되는 구간들이 지정한 trace에 기록되도록 하는 컨텍스트"""
+    token = CURRENT_TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        CURRENT_TRACE.reset(token)
+
+@contextmanager
+def trace_span(stage: str, **attrs):
+    """현재 trace에 구간을 기록하는 컨텍스트 (trace가 없으면 시간만 재고 버림)
+
+    yield된 dict에 값을 넣으면 바이트/토큰 수 등의 속성으로 함께 기록됩니다.
+    """
+    trace = CURRENT_TRACE.get()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        if trace is not None:
+            trace.add_span(stage, start, time.perf_counter(), **attrs)
+
+# 이미지 토큰 추정 함수
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """OpenAI 비전 입력 규칙(2048px 맞춤 → 짧은 변 768px → 512px 타일)으로 이미지 토큰 수를 추정하는 함수"""
+    if detail == "low":
+        return 85
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+def compute_prepared_size(size: tuple, max_edge: int = IMAGE_MAX_EDGE) -> tuple:
+    """prepare_image와 같은 규칙(긴 변 max_edge, 짧은 변 IMAGE_MAX_SHORT_EDGE 이하)으로 축소 후 해상도를 계산하는 함수"""
+    width, height = size
+    scale = min(1.0, max_edge / max(width, height), IMAGE_MAX_SHORT_EDGE / min(width, height))
+    if scale >= 1.0:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+# 이미지 전처리 함수
+def prepare_image(image: Image, max_edge: int = IMAGE_MAX_EDGE, image_format: str = IMAGE_FORMAT,
+                  quality: int = IMAGE_QUALITY, original_bytes: int = None) -> dict:
+    """EXIF 회전 보정, 해상도 축소, JPEG/WebP 재인코딩 후 base64와 전후 용량/토큰 정보를 반환하는 함수"""
+    image_format = image_format.upper()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"지원하지 않는 이미지 형식입니다: {image_format}")
+
+    # 작업용 이미지(load_working_image)는 원본 해상도를 info에 보관
+    original_width, original_height = image.info.get("original_size", image.size)
+    with trace_span("image.decode", bytes=original_bytes):
+        image.load()
+        prepared = ImageOps.exif_transpose(image)
+
+    # 긴 변은 max_edge, 짧은 변은 IMAGE_MAX_SHORT_EDGE를 넘지 않도록 비율 유지 축소
+    with trace_span("image.resize"):
+        new_size = compute_prepared_size(prepared.size, max_edge)
+        if new_size != prepared.size:
+            prepared = prepared.resize(new_size, Image.LANCZOS)
+
+        if prepared.mode not in ("RGB", "L"):
+            prepared = prepared.convert("RGB")
+
+    with trace_span("image.encode") as span:
+        buffer = io.BytesIO()
+        if image_format == "JPEG":
+            prepared.save(buffer, format="JPEG", quality=quality, optimize=True)
+        else:
+            prepared.save(buffer, format="WEBP", quality=quality, method=4)
+        image_bytes = buffer.getvalue()
+        span["bytes"] = len(image_bytes)
+    with trace_span("image.base64") as span:
+        encoded = base64.b64encode(image_bytes).decode('utf-8')
+        span["bytes"] = len(encoded)
+
+    return {
+        "base64": encoded,
+        "mime_type": IMAGE_FORMATS[image_format],
+        "original_size": (original_width, original_height),
+        "prepared_size": prepared.size,
+        "original_bytes": original_bytes,
+        "prepared_bytes": len(image_bytes),
+        "payload_bytes": len(encoded),
+        "original_tokens": estimate_image_tokens(original_width, original_height),
+        "prepared_tokens": estimate_image_tokens(*prepared.size),
+    }
 
 # 이미지 인코딩 함수
-def encode_image(image: Image) -> str:
-    """PIL Image를 base64로 인코딩하는 함수"""
-    buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
-    image_bytes = buffer.getvalue()
-    return base64.b64encode(image_bytes).decode('utf-8')
+def encode_image(image: Image, **options) -> str:
+    """PIL Image를 축소/재인코딩하여 base64로 인코딩하는 함수"""
+    return prepare_image(image, **options)["base64"]
+
+def summarize_image_stats(image_stats: list) -> dict:
+    """이미지별 전처리 결과를 전후 용량/토큰 합계로 요약하는 함수"""
+    original_bytes = sum(stat["original_bytes"] or 0 for stat in image_stats)
+    payload_bytes = sum(stat["payload_bytes"] for stat in image_stats)
+    return {
+        "original_bytes": original_bytes,
+        "payload_bytes": payload_bytes,
+        "saved_bytes": max(original_bytes - payload_bytes, 0),
+        "original_tokens": sum(stat["original_tokens"] for stat in image_stats),
+        "prepared_tokens": sum(stat["prepared_tokens"] for stat in image_stats),
+    }
 
-# 분석 결과 파싱 함수들
-def parse_analysis_sections(analysis_text: str) -> dict:
-    """GPT 분석 결과를 섹션으로 구분하여 파싱하는 함수"""
-    sections = {
-        "work_environment": "",
-        "risk_analysis": "",
-        "sgr_checklist": "",
-        "recommendations": ""
+# 업로드 이미지 디코딩/썸네일 캐시 함수들
+def compute_image_hash(image_bytes: bytes) -> str:
+    """이미지 원본 내용의 해시를 계산하는 함수 (디코딩/썸네일/품질 점검 캐시의 키)"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def get_upload_hash(image_file) -> str:
+    """업로드 파일의 내용 해시를 반환하는 함수 (같은 업로드는 세션에 저장해 둔 값을 재사용)"""
+    upload_hashes = st.session_state.setdefault("upload_hashes", {})
+    if image_file.file_id not in upload_hashes:
+        upload_hashes[image_file.file_id] = compute_image_hash(image_file.getvalue())
+    return upload_hashes[image_file.file_id]
+
+@st.cache_resource
+def get_decoded_image_cache() -> dict:
+    """서버 프로세스 전체에서 공유하는 디코딩 이미지 LRU 캐시를 생성하는 함수"""
+    return {"lock": threading.Lock(), "images": OrderedDict()}
+
+def decode_working_image(image_bytes: bytes) -> Image:
+    """원본을 디코딩하여 EXIF 회전을 보정하고, 어떤 전송 설정에서도 더 필요 없는 해상도는 줄인 작업용 이미지를 만드는 함수
+
+    JPEG은 디코딩 단계에서 필요한 크기 이상으로만 축소(draft)하여 디코딩 시간을 줄이고, 원본 해상도는 info에 보관합니다.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+    image.draft("RGB", compute_prepared_size(original_size, IMAGE_MAX_EDGE_LIMIT))
+    working = ImageOps.exif_transpose(image)
+    working_size = compute_prepared_size(working.size, IMAGE_MAX_EDGE_LIMIT)
+    if working_size != working.size:
+        working = working.resize(working_size, Image.LANCZOS)
+    if working.mode not in ("RGB", "L"):
+        working = working.convert("RGB")
+    working.info = {"original_size": original_size}
+    return working
+
+def load_working_image(image_bytes: bytes, image_hash: str = None) -> Image:
+    """작업용 이미지를 캐시에서 가져오거나 디코딩하여 캐시에 저장하는 함수 (반환된 이미지는 수정하지 말 것)"""
+    image_hash = image_hash or compute_image_hash(image_bytes)
+    cache = get_decoded_image_cache()
+    with cache["lock"]:
+        image = cache["images"].get(image_hash)
+        if image is not None:
+            cache["images"].move_to_end(image_hash)
+            return image
+    image = decode_working_image(image_bytes)
+    with cache["lock"]:
+        cache["images"][image_hash] = image
+        while len(cache["images"]) > DECODED_IMAGE_CACHE_ENTRIES:
+            cache["images"].popitem(last=False)
+    return image
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def create_thumbnail(image_hash: str, _image_bytes: bytes) -> bytes:
+    """미리보기용 JPEG 썸네일을 생성하는 함수 (내용 해시로 캐시하므로 원본 바이트는 해시하지 않음)"""
+    thumbnail = load_working_image(_image_bytes, image_hash).copy()
+    thumbnail.thumbnail((THUMBNAIL_EDGE, THUMBNAIL_EDGE))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+# 이미지 품질 사전 점검 함수들
+def compute_blur_score(gray: np.ndarray) -> float:
+    """4방향 라플라시안 응답의 분산으로 선명도를 계산하는 함수 (값이 작을수록 흐림)"""
+    gray = gray.astype(np.float32)
+    laplacian = gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1]
+    return float(laplacian.var())
+
+def compute_exposure_stats(gray: np.ndarray) -> dict:
+    """밝기 히스토그램으로 평균 밝기와 어두운/밝은 끝단 픽셀 비율을 계산하는 함수"""
+    histogram = np.bincount(gray.ravel(), minlength=256) / gray.size
+    return {
+        "mean": float(np.dot(np.arange(256), histogram)),
+        "dark_ratio": float(histogram[:17].sum()),
+        "bright_ratio": float(histogram[240:].sum()),
     }
+
+def compute_perceptual_hash(image: Image) -> str:
+    """32x32로 줄인 이미지의 2차원 DCT 저주파 8x8 계수를 중앙값과 비교한 64비트 지각 해시(16진수)를 계산하는 함수"""
+    pixels = np.asarray(image.resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    n = np.arange(32)
+    dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64)
+    low_freq = (dct_matrix @ pixels @ dct_matrix.T)[:8, :8].ravel()
+    bits = low_freq[1:] > np.median(low_freq[1:])  # 전체 밝기인 DC 성분은 제외
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+def hash_distance(hash_a: str, hash_b: str) -> int:
+    """두 지각 해시의 해밍 거리를 계산하는 함수"""
+    return (int(hash_a, 16) ^ int(hash_b, 16)).bit_count()
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def assess_image_quality(image_hash: str, _image_bytes: bytes) -> dict:
+    """작업용 이미지를 축소한 흑백 이미지로 선명도, 노출, 지각 해시와 품질 문제 목록을 계산하는 함수"""
+    image = load_working_image(_image_bytes, image_hash)
+    gray_image = image.convert("L")
+    gray_image.thumbnail((QUALITY_CHECK_EDGE, QUALITY_CHECK_EDGE))
+    gray = np.asarray(gray_image)
     
-    lines = analysis_text.split('\n')
-    current_section = None
-    current_content = []
-    section_started = False
-    
-    for line in lines:
-        line_stripped = line.strip()
+    blur_score = compute_blur_score(gray)
+    exposure = compute_exposure_stats(gray)
+    issues = []
+    if blur_score < BLUR_VARIANCE_THRESHOLD:
+        issues.append("blur")
+    if exposure["mean"] < DARK_MEAN_THRESHOLD or exposure["dark_ratio"] > CLIPPED_PIXEL_RATIO:
+        issues.append("dark")
+    elif exposure["mean"] > BRIGHT_MEAN_THRESHOLD or exposure["bright_ratio"] > CLIPPED_PIXEL_RATIO:
+        issues.append("bright")
+    return {
+        "size": image.size,
+        "bytes": len(_image_bytes),
+        "blur_score": round(blur_score, 1),
+        "brightness": round(exposure["mean"], 1),
+        "phash": compute_perceptual_hash(gray_image),
+        "issues": issues,
+    }
 
-        # 섹션 감지
-        if "통합 작업 환경 설명" in line_stripped:
-            if current_section and current_content:
-                sections[current_section] = '\n'.join(current_content).strip()
-            current_section = "work_environment"
-            current_content = []
-            section_started = True
-            continue
+def screen_images(image_hashes: list, image_bytes: list) -> list:
+    """이미지별 품질 점검 결과에 거의 같은 사진(중복) 정보를 더해 반환하는 함수
+
+    중복 묶음에서는 가장 선명한 사진 하나를 남기고 나머지를 중복으로 표시합니다.
+    """
+    screening = [dict(assess_image_quality(image_hash, data), duplicate_of=None)
+                 for image_hash, data in zip(image_hashes, image_bytes)]
+    kept = []
+    for idx in sorted(range(len(screening)), key=lambda idx: -screening[idx]["blur_score"]):
+        original = next((kept_idx for kept_idx in kept
+                         if hash_distance(screening[idx]["phash"], screening[kept_idx]["phash"]) <= DUPLICATE_HASH_DISTANCE), None)
+        if original is None:
+            kept.append(idx)
+        else:
+            screening[idx]["duplicate_of"] = original
+            screening[idx]["issues"] = screening[idx]["issues"] + ["duplicate"]
+    return screening
 
-        elif "1. 현장 전체 잠재 위험요인 분석" in line_stripped or "잠재 위험요인 분석" in line_stripped:
-            if current_section and current_content:
-                sections[current_section] = '\n'.join(current_content).strip()
-            current_section = "risk_analysis"
-            current_content = []
-            section_started = True
-            continue
+def select_images_to_analyze(screening: list) -> list:
+    """자동 제외 후 분석할 이미지 인덱스를 반환하는 함수
 
-        elif "2. SGR 체크리스트" in line_stripped or "체크리스트 항목별" in line_stripped:
-            if current_section and current_content:
-                sections[current_section] = '\n'.join(current_content).strip()
-            current_section = "sgr_checklist"
-            current_content = []
-            section_started = True
-            continue
-
-        elif "3. 현장 전체" in line_stripped and "추가 권장사항" in line_stripped:
-            if current_section and current_content:
-                sections[current_section] = '\n'.join(current_content).strip()
-            current_section = "recommendations"
-            current_content = []
-            section_started = True
-            continue
+    중복 사진은 항상 제외하고, 흐림/노출 불량 사진은 남는 사진이 있을 때만 제외합니다.
+    """
+    unique = [idx for idx, quality in enumerate(screening) if quality["duplicate_of"] is None]
+    good = [idx for idx in unique if not screening[idx]["issues"]]
+    return good or unique
 
+# 분석 결과 파싱 함수들
+def detect_section_header(line_stripped: str):
+    """줄 내용이 섹션 제목이면 해당 섹션 키를, 아니면 None을 반환하는 함수"""
+    if "통합 작업 환경 설명" in line_stripped:
+        return "work_environment"
+    if "1. 현장 전체 잠재 위험요인 분석" in line_stripped or "잠재 위험요인 분석" in line_stripped:
+        return "risk_analysis"
+    if ("2." in line_stripped and "체크리스트" in line_stripped) or "체크리스트 항목별" in line_stripped:
+        return "sgr_checklist"
+    if "3. 현장 전체" in line_stripped and "추가 권장사항" in line_stripped:
+        return "recommendations"
+    return None
+
+class IncrementalSectionParser:
+    """스트리밍으로 도착하는 GPT 분석 결과를 줄 단위로 받아 섹션을 점진적으로 구성하는 파서"""
+
+    def __init__(self):
+        self.text = ""
+        self._buffer = ""
+        self._sections = {
+            "work_environment": "",
+            "risk_analysis": "",
+            "sgr_checklist": "",
+            "recommendations": ""
+        }
+        self.current_section = None
+        self._current_content = []
+
+    def feed(self, chunk: str) -> int:
+        """텍스트 조각을 추가하고 새로 완성된 줄 수를 반환"""
+        self.text += chunk
+        self._buffer += chunk
+        *complete_lines, self._buffer = self._buffer.split('\n')
+        for line in complete_lines:
+            self._process_line(line)
+        return len(complete_lines)
+
+    def finish(self):
+        """남은 버퍼(마지막 줄)를 처리"""
+        if self._buffer:
+            self._process_line(self._buffer)
+            self._buffer = ""
+
+    def _process_line(self, line: str):
+        section = detect_section_header(line.strip())
+        if section:
+            self._save_current()
+            self.current_section = section
+            self._current_content = []
+            return
         # 본문 내용 수집
-        if current_section and section_started:
-            current_content.append(line)
+        if self.current_section:
+            self._current_content.append(line)
 
-    # 마지막 섹션 저장
-    if current_section and current_content:
-        sections[current_section] = '\n'.join(current_content).strip()
+    def _save_current(self):
+        if self.current_section and self._current_content:
+            self._sections[self.current_section] = '\n'.join(self._current_content).strip()
 
-    return sections
+    def get_sections(self) -> dict:
+        """현재까지 완성된 줄 기준의 섹션 dict를 반환"""
+        sections = dict(self._sections)
+        if self.current_section and self._current_content:
+            sections[self.current_section] = '\n'.join(self._current_content).strip()
+        return sections
+
+def parse_analysis_sections(analysis_text: str) -> dict:
+    """GPT 분석 결과를 섹션으로 구분하여 파싱하는 함수"""
+    with trace_span("parse.sections", chars=len(analysis_text)):
+        parser = IncrementalSectionParser()
+        parser.feed(analysis_text)
+        parser.finish()
+        return parser.get_sections()
 
 def parse_sgr_checklist_to_dataframe(checklist_text: str) -> pd.DataFrame:
-    """SGR 체크리스트 마크다운 텍스트를 DataFrame으로 변환하는 함수"""
+    """체크리스트 마크다운 텍스트를 DataFrame으로 변환하는 함수"""
     if not checklist_text or checklist_text.strip() == "":
         return pd.DataFrame(columns=["번호", "대분류", "소분류", "준수여부", "세부내용"])
     
@@ -409,8 +1165,118 @@ def parse_risk_analysis_to_dataframe(risk_text: str) -> pd.DataFrame:
     
     return df
 
+# 구조화(JSON) 출력 처리 함수들
+def validate_structured_report(data: dict, checklist: pd.DataFrame) -> tuple:
+    """구조화 응답의 형식을 검증하고, 누락된 체크리스트 항목은 '알수없음'으로 채워 (정리된 데이터, 경고 목록)을 반환하는 함수"""
+    if not isinstance(data, dict):
+        raise ValueError("구조화 응답이 JSON 객체가 아닙니다.")
+    for key in ("work_environment", "risks", "checklist", "recommendations"):
+        if key not in data:
+            raise ValueError(f"구조화 응답에 '{key}' 항목이 없습니다.")
+
+    warnings = []
+    risks = []
+    for idx, risk in enumerate(data["risks"], start=1):
+        if not isinstance(risk, dict) or not str(risk.get("hazard", "")).strip():
+            warnings.append(f"위험요인 {idx}번 항목이 비어 있어 제외했습니다.")
+            continue
+        countermeasures = [str(item).strip() for item in risk.get("countermeasures", []) if str(item).strip()]
+        risks.append({
+            "number": len(risks) + 1,
+            "hazard": str(risk["hazard"]).strip(),
+            "description": str(risk.get("description", "")).strip(),
+            "countermeasures": countermeasures,
+        })
+
+    valid_numbers = set(int(number) for number in checklist['번호'])
+    checklist_items = {}
+    for item in data["checklist"]:
+        number = item.get("number") if isinstance(item, dict) else None
+        if number not in valid_numbers:
+            warnings.append(f"체크리스트에 없는 번호({number})의 응답을 제외했습니다.")
+            continue
+        status = item.get("status")
+        if status not in CHECKLIST_STATUSES:
+            warnings.append(f"체크리스트 {number}번의 준수여부 값('{status}')이 올바르지 않아 '알수없음'으로 처리했습니다.")
+            status = "알수없음"
+        checklist_items[number] = {"number": number, "status": status, "details": str(item.get("details", "")).strip()}
+
+    for number in sorted(valid_numbers - set(checklist_items)):
+        warnings.append(f"체크리스트 {number}번 응답이 누락되어 '알수없음'으로 채웠습니다.")
+        checklist_items[number] = {"number": number, "status": "알수없음", "details": "응답 누락"}
+
+    cleaned = {
+        "work_environment": str(data["work_environment"]).strip(),
+        "risks": risks,
+        "checklist": [checklist_items[number] for number in sorted(checklist_items)],
+        "recommendations": [str(item).strip() for item in data["recommendations"] if str(item).strip()],
+    }
+    return cleaned, warnings
+
+def structured_to_risk_dataframe(data: dict) -> pd.DataFrame:
+    """구조화 응답의 위험요인 목록을 DataFrame으로 변환하는 함수"""
+    rows = [
+        [str(risk["number"]), risk["hazard"], risk["description"], format_countermeasures(risk["countermeasures"])]
+        for risk in data["risks"]
+    ]
+    return pd.DataFrame(rows, columns=["번호", "잠재 위험요인", "잠재 위험요인 설명", "위험성 감소대책"])
+
+def structured_to_checklist_dataframe(data: dict, checklist: pd.DataFrame) -> pd.DataFrame:
+    """구조화 응답의 체크리스트 판정을 원본 체크리스트(대분류/소분류)와 결합하여 DataFrame으로 변환하는 함수"""
+    items = checklist.set_index(checklist['번호'].astype(int))
+    rows = [
+        [str(item["number"]), items.at[item["number"], '대분류'], items.at[item["number"], '소분류'],
+         item["status"], item["details"]]
+        for item in data["checklist"]
+    ]
+    return pd.DataFrame(rows, columns=["번호", "대분류", "소분류", "준수여부", "세부내용"])
+
+def format_countermeasures(countermeasures: list) -> str:
+    """감소대책 목록을 '① 대책 ② 대책' 형식의 문자열로 변환하는 함수"""
+    return ' '.join(
+        f"{CIRCLED_NUMBERS[idx] if idx < len(CIRCLED_NUMBERS) else f'({idx + 1})'} {item}"
+        for idx, item in enumerate(countermeasures)
+    )
+
+def render_structured_sections(data: dict, checklist: pd.DataFrame) -> dict:
+    """구조화 응답을 기존 보고서와 같은 형식의 마크다운 섹션으로 변환하는 함수"""
+    checklist_df = structured_to_checklist_dataframe(data, checklist).rename(columns={"세부내용": "세부 내용"})
+    return {
+        "work_environment": data["work_environment"],
+        "risk_analysis": dataframe_to_markdown_table(structured_to_risk_dataframe(data)),
+        "sgr_checklist": dataframe_to_markdown_table(checklist_df),
+        "recommendations": '\n'.join(f"- {item}" for item in data["recommendations"]),
+    }
+
+def get_result_dataframes(result: dict, checklist: pd.DataFrame = None) -> tuple:
+    """분석 결과에서 (위험요인 DataFrame, 체크리스트 DataFrame)을 얻는 함수 (구조화 결과가 있으면 직접 변환)"""
+    sections = result.get('sections', {})
+    if result.get("structured") and result.get("checklist_items"):
+        checklist = pd.DataFrame(result["checklist_items"])
+        risk_df = structured_to_risk_dataframe(result["structured"])
+        checklist_df = structured_to_checklist_dataframe(result["structured"], checklist)
+    else:
+        with trace_span("parse.risk_table"):
+            risk_df = parse_risk_analysis_to_dataframe(sections["risk_analysis"]) if sections.get("risk_analysis") else None
+        with trace_span("parse.checklist_table"):
+            checklist_df = parse_sgr_checklist_to_dataframe(sections["sgr_checklist"]) if sections.get("sgr_checklist") else None
+    
+    # 사전 분류로 제외되어 '해당없음'으로 채운 항목 표시
+    if result.get("triage") and checklist_df is not None and not checklist_df.empty:
+        triaged = checklist_df['번호'].astype(int).isin(result["triage"].get("triaged_numbers", []))
+        checklist_df["사전분류"] = triaged.map({True: "제외", False: "상세 분석"})
+    return risk_df, checklist_df
+
+def build_result_dataframes(result: dict) -> tuple:
+    """결과 화면용 (위험요인 DataFrame, 체크리스트 DataFrame, 오류 메시지)를 만드는 함수 (응답 형식이 깨져 파싱에 실패하면 표 없이 오류만 반환)"""
+    try:
+        risk_df, checklist_df = get_result_dataframes(result)
+    except Exception as e:
+        return None, None, str(e)
+    return risk_df, checklist_df, None
+
 def format_checklist_content(content: str) -> str:
-    """SGR 체크리스트 내용에서 준수여부에 따라 스타일을 적용하는 함수"""
+    """체크리스트 내용에서 준수여부에 따라 스타일을 적용하는 함수"""
     if not content:
         return content
     
@@ -458,49 +1324,46 @@ def format_checklist_content(content: str) -> str:
 # 체크리스트를 대분류, 소분류 별도 컬럼으로 프롬프트 생성
 def generate_checklist_prompt(checklist_df: pd.DataFrame) -> str:
     """체크리스트를 대분류, 소분류 별도 컬럼으로 프롬프트 생성"""
-    prompt_lines = []
-    
-    # 번호 순으로 정렬
+    # 번호 순으로 정렬한 뒤 열 단위로 표 행을 만듦
     sorted_checklist = checklist_df.sort_values('번호')
-    
-    for _, item in sorted_checklist.iterrows():
-        prompt_lines.append(f"| {item['번호']} | {item['대분류']} | {item['소분류']} | [O 또는 X 또는 해당없음 또는 알수없음] | [현장 사진들에서 확인된 구체적 상황] |")
-    
+    prompt_lines = ("| " + sorted_checklist['번호'].astype(str) + " | " + sorted_checklist['대분류'].astype(str)
+                    + " | " + sorted_checklist['소분류'].astype(str)
+                    + " | [O 또는 X 또는 해당없음 또는 알수없음] | [현장 사진들에서 확인된 구체적 상황] |")
     return '\n'.join(prompt_lines)
 
-# 메인 분석 함수
-def analyze_multiple_images_comprehensive(images: list, checklist: pd.DataFrame, image_names: list) -> dict:
-    """여러 이미지를 통합하여 종합적인 안전 위험성 평가를 수행합니다."""
-    client = initialize_openai_client()
-    if client is None:
-        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
-    
-    # 모든 이미지를 base64로 인코딩
-    base64_images = []
-    for image in images:
-        base64_images.append(encode_image(image))
-    
+# 분석 프롬프트 생성 함수들
+# (요청마다 같은 정적 접두부(역할, 출력 형식, 제약사항, 체크리스트 표)를 먼저 두고
+#  이미지 수/이름 등 요청별로 달라지는 내용은 뒤에 붙여 API의 프롬프트 캐시가 적용되도록 구성)
+def build_prompt_suffix(image_count: int, image_names: list, request_text: str) -> str:
+    """요청마다 달라지는 프롬프트 접미부(이미지 수, 이미지 이름, 작성 요청)를 생성하는 함수"""
+    return f"""
+분석 대상 이미지 ({image_count}장): {', '.join(image_names)}
+
+첨부된 {image_count}장의 이미지를 모두 종합적으로 분석하여 위 지침에 따라 {request_text}
+"""
+
+def build_comprehensive_prompt(image_count: int, image_names: list, checklist: pd.DataFrame) -> tuple:
+    """단일 요청(마크다운) 통합 분석 프롬프트를 (정적 접두부, 요청별 접미부)로 생성하는 함수"""
     # 체크리스트 프롬프트 생성
     checklist_prompt = generate_checklist_prompt(checklist)
+    checklist_name = get_checklist_name(checklist)
     
     # 통합 분석을 위한 프롬프트
-    prompt = f"""
+    prefix = f"""
 Role(역할지정): 산업안전 위험성 평가 전문가로서 동일한 공사현장의 여러 사진을 종합적으로 분석하여 통합된 작업전 위험성 평가서를 작성합니다.
 
-목표: 첨부된 {len(images)}장의 현장 사진들을 종합적으로 분석하여 다음과 같은 통합 위험성 평가서를 작성하세요:
+목표: 첨부된 현장 사진들을 종합적으로 분석하여 다음과 같은 통합 위험성 평가서를 작성하세요:
 
 **중요사항**: 
-- 제공된 {len(images)}장의 사진은 모두 동일한 공사현장의 서로 다른 각도/영역을 촬영한 것입니다.
+- 제공된 사진은 모두 동일한 공사현장의 서로 다른 각도/영역을 촬영한 것입니다.
 - 모든 사진을 종합적으로 분석하여 현장 전체의 통합된 위험성 평가를 수행해주세요.
 - 각 사진별로 개별 분석하지 말고, 전체 현장의 종합적인 관점에서 분석해주세요.
 
-분석 대상 이미지: {', '.join(image_names)}
-
 출력 형식:
 다음과 같은 마크다운 형식으로 출력해주세요:
 
 ## 통합 작업 환경 설명
-[제공된 {len(images)}장의 현장 사진을 종합적으로 분석하여 작업 환경, 작업 내용, 주요 장비 및 시설물, 현장 레이아웃 등에 대한 통합적이고 상세한 설명을 작성]
+[제공된 현장 사진들을 종합적으로 분석하여 작업 환경, 작업 내용, 주요 장비 및 시설물, 현장 레이아웃 등에 대한 통합적이고 상세한 설명을 작성]
 
 ## 1. 현장 전체 잠재 위험요인 분석 및 위험성 감소대책
 
@@ -510,7 +1373,7 @@ Role(역할지정): 산업안전 위험성 평가 전문가로서 동일한 공
 | 2    | [위험요인2]  | [현장 전체 관점에서의 상세 설명] | ① [대책1] ② [대책2] ③ [대책3] ④ [대책4] |
 [현장 전체에서 식별된 모든 주요 위험요인들...]
 
-## 2. SGR 체크리스트 항목별 통합 체크 결과
+## 2. {checklist_name} 항목별 통합 체크 결과
 
 | 번호 | 대분류 | 소분류 | 준수여부 | 세부 내용 |
 |------|--------|--------|----------|-----------|
@@ -528,46 +1391,1279 @@ Role(역할지정): 산업안전 위험성 평가 전문가로서 동일한 공
 - 실무에서 바로 활용 가능한 수준의 상세한 내용 포함
 - 개별 사진 분석이 아닌 현장 전체의 통합적 관점에서 분석
 - 체크리스트는 번호 순서대로 연속적으로 작성 (대분류 구분 없이 하나의 테이블로 작성)
+"""
+    return prefix, build_prompt_suffix(image_count, image_names, "통합된 위험성 평가서를 작성해주세요.")
 
-첨부된 {len(images)}장의 이미지를 모두 종합적으로 분석하여 위 지침에 따라 통합된 위험성 평가서를 작성해주세요.
+
+def build_structured_prompt(image_count: int, image_names: list, checklist: pd.DataFrame) -> tuple:
+    """구조화(JSON) 출력 통합 분석 프롬프트를 (정적 접두부, 요청별 접미부)로 생성하는 함수"""
+    checklist_lines = '\n'.join(
+        f"- {item['번호']}. [{item['대분류']}] {item['소분류']}"
+        for _, item in checklist.sort_values('번호').iterrows()
+    )
+    checklist_name = get_checklist_name(checklist)
+    
+    prefix = f"""
+Role(역할지정): 산업안전 위험성 평가 전문가로서 동일한 공사현장의 여러 사진을 종합적으로 분석하여 통합된 작업전 위험성 평가서를 작성합니다.
+
+목표: 첨부된 현장 사진들을 종합적으로 분석하여 통합 위험성 평가 결과를 지정된 JSON 스키마로 출력하세요.
+
+**중요사항**: 
+- 제공된 사진은 모두 동일한 공사현장의 서로 다른 각도/영역을 촬영한 것입니다.
+- 각 사진별로 개별 분석하지 말고, 전체 현장의 종합적인 관점에서 분석해주세요.
+
+출력 항목:
+- work_environment: 작업 환경, 작업 내용, 주요 장비 및 시설물, 현장 레이아웃 등에 대한 통합적이고 상세한 설명
+- risks: 현장 전체에서 식별된 모든 주요 잠재 위험요인 (number, hazard: 위험요인, description: 현장 전체 관점의 상세 설명, countermeasures: 4개 이상의 구체적인 위험성 감소대책)
+- checklist: 아래 {checklist_name}의 모든 번호에 대한 판정 (number, status, details: 사진들에서 확인된 구체적 상황)
+  status - O: 사진에서 준수가 명확히 확인됨, X: 사진에서 명확히 미준수가 확인됨, 해당없음: 준수가 필요 없는 항목임, 알수없음: 이미지의 내용으로 확인 불가한 경우
+- recommendations: 현장 전체 특성에 맞는 종합적이고 구체적인 추가 안전 권장사항 목록
+
+{checklist_name}:
+{checklist_lines}
+
+제약사항:
+- 모든 내용은 실제 산업안전보건 기준에 부합하도록 구체적이고 실무적인 수준으로 작성
+- 모든 출력은 한국어로 작성
 """
+    return prefix, build_prompt_suffix(image_count, image_names, "통합 위험성 평가 결과를 JSON 스키마로 출력해주세요.")
+
+def compute_prompt_prefix_hash(prefix: str) -> str:
+    """정적 프롬프트 접두부의 해시를 계산하는 함수 (프롬프트 캐시 라우팅 키와 결과 메타데이터에 사용)"""
+    return hashlib.sha256(f"{ANALYSIS_MODEL}:{PROMPT_VERSION}:{prefix}".encode("utf-8")).hexdigest()[:16]
+
+# 토큰 사용량/비용 집계 함수들
+def summarize_usage(usage_log: list, model: str = ANALYSIS_MODEL) -> dict:
+    """호출별 사용량을 합산하고 비용을 계산하는 함수"""
+    usage = {
+        "calls": len(usage_log),
+        "prompt_tokens": sum(item["prompt_tokens"] for item in usage_log),
+        "completion_tokens": sum(item["completion_tokens"] for item in usage_log),
+        "cached_tokens": sum(item["cached_tokens"] for item in usage_log),
+    }
+    usage["cached_ratio"] = round(usage["cached_tokens"] / usage["prompt_tokens"], 3) if usage["prompt_tokens"] else 0.0
+    usage["cost_usd"] = estimate_cost_usd(usage, model)
+    return usage
+
+def estimate_analysis_tokens(image_sizes: list, checklist: pd.DataFrame, image_names: list,
+                             image_options: dict = None, execution_mode: str = "single",
+                             output_format: str = "markdown", map_options: dict = None) -> dict:
+    """전송 전에 프롬프트 텍스트와 각 이미지 해상도로 입력 토큰을 추정하는 함수
+
+    병렬 모드는 요청마다 모든 이미지가 전송되고, 묶음별 분석 모드는 각 이미지가 한 번씩만 전송됩니다.
+    """
+    max_edge = (image_options or {}).get("max_edge", IMAGE_MAX_EDGE)
+    image_tokens_per_request = sum(estimate_image_tokens(*compute_prepared_size(size, max_edge)) for size in image_sizes)
+    if execution_mode == "mapreduce":
+        map_options = resolve_map_options(map_options)
+        groups = build_image_groups(len(image_sizes), map_options["group_size"])
+        prompts = [build_map_prompt(len(group), [image_names[idx] for idx in group], checklist) for group in groups]
+        image_tokens = image_tokens_per_request
+        if map_options["reduce"] == "model":
+            prompts.append((build_reduce_prompt(), ""))
+    else:
+        if execution_mode == "sharded":
+            prompts = [build_shard_prompt(shard, len(image_sizes), image_names) for shard in build_analysis_shards(checklist)]
+        elif output_format == "json":
+            prompts = [build_structured_prompt(len(image_sizes), image_names, checklist)]
+        else:
+            prompts = [build_comprehensive_prompt(len(image_sizes), image_names, checklist)]
+        image_tokens = image_tokens_per_request * len(prompts)
     
-    # 이미지 메시지 구성
+    text_tokens = sum(estimate_text_tokens(prefix) + estimate_text_tokens(suffix) for prefix, suffix in prompts)
+    if execution_mode == "mapreduce" and map_options["reduce"] == "model":
+        text_tokens += MAP_FINDINGS_TOKENS * len(groups)
+    return {
+        "requests": len(prompts),
+        "text_tokens": text_tokens,
+        "image_tokens": image_tokens,
+        "prompt_tokens": text_tokens + image_tokens,
+        "max_edge": max_edge,
+    }
+
+def fit_image_options_to_budget(image_sizes: list, checklist: pd.DataFrame, image_names: list, image_options: dict,
+                                budget: int, execution_mode: str = "single", output_format: str = "markdown",
+                                map_options: dict = None) -> tuple:
+    """예상 입력 토큰이 예산을 넘으면 이미지 긴 변을 단계적으로 줄여 예산에 맞추는 함수 (이미지 옵션, 추정치 반환)"""
+    fitted_options = dict(image_options or {})
+    estimate = estimate_analysis_tokens(image_sizes, checklist, image_names, fitted_options, execution_mode, output_format,
+                                        map_options)
+    for max_edge in DOWNSCALE_MAX_EDGES:
+        if estimate["prompt_tokens"] <= budget:
+            break
+        if max_edge >= estimate["max_edge"]:
+            continue
+        fitted_options["max_edge"] = max_edge
+        estimate = estimate_analysis_tokens(image_sizes, checklist, image_names, fitted_options, execution_mode, output_format,
+                                            map_options)
+    return fitted_options, estimate
+
+# 분석 요청 공통 함수들
+def prepare_images(images: list, image_options: dict = None, original_bytes: list = None) -> list:
+    """모든 이미지를 축소/재인코딩하여 전송용 데이터로 변환하는 함수"""
+    image_options = image_options or {}
+    original_bytes = original_bytes or [None] * len(images)
+    return [
+        prepare_image(image, original_bytes=size, **image_options)
+        for image, size in zip(images, original_bytes)
+    ]
+
+def build_image_message(prompt: str, prepared_images: list, detail: str = None) -> list:
+    """프롬프트와 전처리된 이미지들로 OpenAI 메시지 content를 구성하는 함수 (detail이 주어지면 이미지 해석 수준 지정)"""
     message_content = [{"type": "text", "text": prompt}]
     
     # 모든 이미지를 메시지에 추가
-    for idx, base64_image in enumerate(base64_images):
-        message_content.append({
-            "type": "image_url",
-            "image_url": {
-                "url": f"data:image/png;base64,{base64_image}"
-            }
-        })
+    for prepared in prepared_images:
+        image_url = {"url": f"data:{prepared['mime_type']};base64,{prepared['base64']}"}
+        if detail is not None:
+            image_url["detail"] = detail
+        message_content.append({"type": "image_url", "image_url": image_url})
+    return message_content
+
+def request_completion(client, message_content: list, max_tokens: int = 4000, on_progress=None,
+                       response_format: dict = None, usage_log: list = None, system_prompt: str = None,
+                       model: str = ANALYSIS_MODEL, image_tokens: int = 0) -> str:
+    """OpenAI API를 호출하여 응답 텍스트를 반환하는 함수
+
+    on_progress가 주어지면 스트리밍 모드로 호출하고, 줄이 완성될 때마다 IncrementalSectionParser를 전달합니다.
+    response_format이 주어지면 구조화 출력으로 호출합니다 (스트리밍 미사용).
+    usage_log가 주어지면 응답의 토큰 사용량을 추가합니다.
+    system_prompt(정적 접두부)가 주어지면 첫 메시지로 보내고, 같은 접두부끼리 프롬프트 캐시를 공유하도록 캐시 키를 지정합니다.
+    모든 호출은 모델별 공용 스케줄러를 거치며, 분당 토큰 한도 계산에는 텍스트 추정치 + image_tokens + max_tokens를 예약하고
+    응답의 실제 사용량으로 남는 예약분을 돌려받습니다.
+    """
+    messages = [
+        {
+            "role": "user",
+            "content": message_content
+        }
+    ]
+    request_args = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens
+    }
+    if system_prompt is not None:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+        request_args["prompt_cache_key"] = compute_prompt_prefix_hash(system_prompt)
+    if response_format is not None:
+        request_args["response_format"] = response_format
     
-    # OpenAI API 호출
-    response = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[
-            {
-                "role": "user",
-                "content": message_content
-            }
-        ],
-        max_tokens=4000
-    )
+    request_bytes = len(system_prompt or "") + sum(len(part.get("text", "")) + len(part.get("image_url", {}).get("url", ""))
+                                                   for part in message_content)
+    scheduler = get_request_scheduler(model)
+    scheduled_tokens = (estimate_text_tokens(system_prompt or "") + image_tokens + max_tokens
+                        + sum(estimate_text_tokens(part.get("text", "")) for part in message_content))
+    schedule_stats = {}
+    
+    if on_progress is None or response_format is not None:
+        with trace_span("api.request", bytes=request_bytes) as span:
+            response = scheduler.create_completion(client, request_args, scheduled_tokens, schedule_stats)
+            span.update(queue_wait_ms=round(schedule_stats["wait_seconds"] * 1000, 1), attempts=schedule_stats["attempts"])
+            text = response.choices[0].message.content
+            span["chars"] = len(text or "")
+            usage = extract_usage(getattr(response, "usage", None))
+            if usage:
+                span.update(usage)
+                if usage_log is not None:
+                    usage_log.append(usage)
+        return text
     
-    # GPT의 분석 결과를 가져오기
-    analysis_result = response.choices[0].message.content
+    # 스트리밍 모드: 줄 단위로 섹션을 갱신하며 진행 상황 전달
+    # (첫 토큰까지의 대기 시간과 이후 생성 시간을 나누어 기록)
+    parser = IncrementalSectionParser()
+    request_started_at = time.perf_counter()
+    first_token_at = None
+    usage = None
+    # 스케줄러 슬롯은 스트림을 끝까지 읽거나 닫을 때 반납되므로, 진행 표시 중 오류가 나도 with 문으로 닫음
+    with scheduler.create_completion(
+        client, {**request_args, "stream": True, "stream_options": {"include_usage": True}}, scheduled_tokens, schedule_stats
+    ) as stream:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = extract_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta and first_token_at is None:
+                first_token_at = time.perf_counter()
+            if delta and parser.feed(delta):
+                on_progress(parser)
+    finished_at = time.perf_counter()
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        first_token_at = first_token_at or finished_at
+        trace.add_span("api.first_token", request_started_at, first_token_at, bytes=request_bytes,
+                       queue_wait_ms=round(schedule_stats["wait_seconds"] * 1000, 1), attempts=schedule_stats["attempts"])
+        trace.add_span("api.generation", first_token_at, finished_at, chars=len(parser.text), **(usage or {}))
+    if usage and usage_log is not None:
+        usage_log.append(usage)
+    parser.finish()
+    on_progress(parser)
+    return parser.text
+
+def get_prepared_image_tokens(prepared_images: list) -> int:
+    """전처리된 이미지들의 추정 입력 토큰 합계를 반환하는 함수"""
+    return sum(prepared["prepared_tokens"] for prepared in prepared_images)
+
+def get_image_stats(prepared_images: list) -> list:
+    """전처리된 이미지 정보에서 base64 데이터를 제외한 통계만 반환하는 함수"""
+    return [
+        {key: value for key, value in prepared.items() if key != "base64"}
+        for prepared in prepared_images
+    ]
+
+# 메인 분석 함수
+def analyze_multiple_images_comprehensive(images: list, checklist: pd.DataFrame, image_names: list,
+                                          image_options: dict = None, original_bytes: list = None,
+                                          on_progress=None) -> dict:
+    """여러 이미지를 통합하여 종합적인 안전 위험성 평가를 수행합니다.
+
+    on_progress가 주어지면 스트리밍 모드로 호출하고, 줄이 완성될 때마다 IncrementalSectionParser를 전달합니다.
+    """
+    client = initialize_openai_client()
+    if client is None:
+        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
+    
+    started_at = time.perf_counter()
+    
+    # 모든 이미지를 축소/재인코딩하여 base64로 변환
+    prepared_images = prepare_images(images, image_options, original_bytes)
+    
+    # 통합 분석을 위한 프롬프트 (정적 접두부 + 요청별 접미부)
+    prefix, suffix = build_comprehensive_prompt(len(images), image_names, checklist)
+    
+    # 이미지 메시지 구성 및 OpenAI API 호출
+    message_content = build_image_message(suffix, prepared_images)
+    usage_log = []
+    analysis_result = request_completion(client, message_content, on_progress=on_progress, usage_log=usage_log,
+                                         system_prompt=prefix, image_tokens=get_prepared_image_tokens(prepared_images))
     
     return {
         "image_names": image_names,
         "image_count": len(images),
         "full_report": analysis_result,
         "sections": parse_analysis_sections(analysis_result),
+        "model": ANALYSIS_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "prompt_prefix_hash": compute_prompt_prefix_hash(prefix),
+        "execution_mode": "single",
+        "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+        "usage": summarize_usage(usage_log),
+        "image_stats": get_image_stats(prepared_images),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+# 대분류 병렬 분석 함수들
+def build_shard_prompt(shard: dict, image_count: int, image_names: list) -> tuple:
+    """병렬 분석 샤드별로 담당 섹션만 작성하도록 하는 프롬프트를 (정적 접두부, 요청별 접미부)로 생성하는 함수"""
+    if shard["kind"] == "risk":
+        output_format = """## 통합 작업 환경 설명
+[제공된 현장 사진들을 종합적으로 분석하여 작업 환경, 작업 내용, 주요 장비 및 시설물, 현장 레이아웃 등에 대한 통합적이고 상세한 설명을 작성]
+
+## 1. 현장 전체 잠재 위험요인 분석 및 위험성 감소대책
+
+| 번호  | 잠재 위험요인 | 잠재 위험요인 설명             | 위험성 감소대책                        |
+|------|-------------|-----------------------------|--------------------------------------|
+| 1    | [위험요인1]  | [현장 전체 관점에서의 상세 설명] | ① [대책1] ② [대책2] ③ [대책3] ④ [대책4] |
+| 2    | [위험요인2]  | [현장 전체 관점에서의 상세 설명] | ① [대책1] ② [대책2] ③ [대책3] ④ [대책4] |
+[현장 전체에서 식별된 모든 주요 위험요인들...]"""
+        constraints = "- 위험성 감소대책은 각각 4개 이상의 구체적인 조치로 구성"
+    elif shard["kind"] == "checklist":
+        output_format = f"""## 2. {get_checklist_name(shard["checklist"])} 항목별 통합 체크 결과
+
+| 번호 | 대분류 | 소분류 | 준수여부 | 세부 내용 |
+|------|--------|--------|----------|-----------|
+{generate_checklist_prompt(shard["checklist"])}"""
+        constraints = """- 체크리스트는 현장 전체 상황에 맞게 O, X , 해당없음 , 알수없음 중 하나로 표시하고 구체적인 확인 내용도 포함
+  O: 사진에서 준수가 명확히 확인됨, X: 사진에서 명확히 미준수가 확인됨, 해당없음: 준수가 필요 없는 항목임, 알수없음: 이미지의 내용으로 확인 불가한 경우
+- 제시된 번호의 항목만 번호 순서대로 빠짐없이 작성"""
+    else:
+        output_format = """## 3. 현장 전체 통합 추가 권장사항
+[현장 전체 특성에 맞는 종합적이고 구체적인 안전 권장사항을 작성]"""
+        constraints = "- 현장 전체 특성에 맞는 종합적이고 구체적인 권장사항 위주로 작성"
+
+    prefix = f"""
+Role(역할지정): 산업안전 위험성 평가 전문가로서 동일한 공사현장의 여러 사진을 종합적으로 분석하여 통합된 작업전 위험성 평가서를 작성합니다.
+
+목표: 첨부된 현장 사진들을 종합적으로 분석하여 통합 위험성 평가서 중 '{shard["name"]}' 부분만 작성하세요. 다른 섹션은 출력하지 마세요.
+
+**중요사항**: 
+- 제공된 사진은 모두 동일한 공사현장의 서로 다른 각도/영역을 촬영한 것입니다.
+- 각 사진별로 개별 분석하지 말고, 전체 현장의 종합적인 관점에서 분석해주세요.
+
+출력 형식:
+다음과 같은 마크다운 형식으로 출력해주세요:
+
+{output_format}
+
+제약사항:
+- 모든 내용은 실제 산업안전보건 기준에 부합하도록 구체적이고 실무적인 수준으로 작성
+{constraints}
+- 모든 출력은 한국어로 작성
+"""
+    return prefix, build_prompt_suffix(image_count, image_names, f"'{shard['name']}' 부분만 작성해주세요.")
+
+def build_analysis_shards(checklist: pd.DataFrame) -> list:
+    """위험요인 분석, 대분류별 체크리스트, 추가 권장사항으로 분석 샤드를 구성하는 함수"""
+    shards = [{"name": "통합 작업 환경 설명 및 잠재 위험요인 분석", "kind": "risk", "max_tokens": 2500}]
+    for category in checklist['대분류'].unique():
+        category_items = checklist[checklist['대분류'] == category]
+        shards.append({
+            "name": f"{get_checklist_name(checklist)} - {category}",
+            "kind": "checklist",
+            "checklist": category_items,
+            "max_tokens": 300 + 120 * len(category_items)
+        })
+    shards.append({"name": "현장 전체 통합 추가 권장사항", "kind": "recommendations", "max_tokens": 1500})
+    return shards
+
+def extract_numbered_table_rows(table_text: str) -> list:
+    """마크다운 표에서 첫 컬럼이 번호인 데이터 행을 (번호, 행) 목록으로 추출하는 함수"""
+    rows = []
+    for line in table_text.split('\n'):
+        parts = [x.strip() for x in line.strip().strip('|').split('|')]
+        if len(parts) >= 4 and parts[0].isdigit():
+            rows.append((int(parts[0]), line.strip()))
+    return rows
+
+def merge_shard_sections(shard_sections: list) -> dict:
+    """샤드별 파싱 결과를 하나의 sections dict로 병합하는 함수"""
+    merged = {
+        "work_environment": "",
+        "risk_analysis": "",
+        "sgr_checklist": "",
+        "recommendations": ""
+    }
+    checklist_rows = []
+    for sections in shard_sections:
+        for key in ("work_environment", "risk_analysis", "recommendations"):
+            if sections.get(key) and not merged[key]:
+                merged[key] = sections[key]
+        checklist_rows.extend(extract_numbered_table_rows(sections.get("sgr_checklist", "")))
+
+    if checklist_rows:
+        merged["sgr_checklist"] = build_checklist_table(checklist_rows)
+    return merged
+
+def build_checklist_table(checklist_rows: list) -> str:
+    """(번호, 행) 목록을 번호 순으로 정렬하여 체크리스트 마크다운 표로 만드는 함수"""
+    return '\n'.join(
+        ["| 번호 | 대분류 | 소분류 | 준수여부 | 세부 내용 |",
+         "|------|--------|--------|----------|-----------|"]
+        + [line for _, line in sorted(checklist_rows, key=lambda row: row[0])]
+    )
+
+def build_report_from_sections(sections: dict, checklist_name: str = DEFAULT_CHECKLIST_NAME) -> str:
+    """sections dict를 표준 마크다운 보고서 형식으로 결합하는 함수"""
+    headers = {
+        "work_environment": "## 통합 작업 환경 설명",
+        "risk_analysis": "## 1. 현장 전체 잠재 위험요인 분석 및 위험성 감소대책",
+        "sgr_checklist": f"## 2. {checklist_name} 항목별 통합 체크 결과",
+        "recommendations": "## 3. 현장 전체 통합 추가 권장사항",
+    }
+    return '\n\n'.join(f"{header}\n\n{sections[key]}" for key, header in headers.items() if sections.get(key))
+
+def analyze_multiple_images_sharded(images: list, checklist: pd.DataFrame, image_names: list,
+                                    image_options: dict = None, original_bytes: list = None,
+                                    on_progress=None, max_workers: int = None) -> dict:
+    """체크리스트를 대분류별로 나누고 위험요인/권장사항 샤드와 함께 병렬로 분석하는 함수
+
+    동시 요청 수는 max_workers(기본 SHARD_MAX_WORKERS) 안에서 샤드 수와 스케줄러 한도가 허용하는 수 중 작은 값입니다.
+    on_progress가 주어지면 샤드가 완료될 때마다 병합된 결과를 IncrementalSectionParser로 전달합니다.
+    샤드 하나가 실패하면 아직 시작하지 않은 샤드는 취소하고 오류를 전달합니다.
+    """
+    client = initialize_openai_client()
+    if client is None:
+        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
+    
+    started_at = time.perf_counter()
+    prepared_images = prepare_images(images, image_options, original_bytes)
+    shards = build_analysis_shards(checklist)
+    usage_log = []
+
+    def run_shard(shard):
+        shard_started_at = time.perf_counter()
+        prefix, suffix = build_shard_prompt(shard, len(images), image_names)
+        with trace_span("api.shard", item=shard["name"]):
+            text = request_completion(client, build_image_message(suffix, prepared_images), max_tokens=shard["max_tokens"],
+                                      usage_log=usage_log, system_prompt=prefix,
+                                      image_tokens=get_prepared_image_tokens(prepared_images))
+        return text, round(time.perf_counter() - shard_started_at, 2)
+
+    # 샤드마다 한 번에 요청하되, 스케줄러가 토큰 한도 안에서 동시에 시작시킬 수 있는 수를 넘지 않음
+    shard_tokens = get_prepared_image_tokens(prepared_images) + max(shard["max_tokens"] for shard in shards)
+    max_workers = min(len(shards), max_workers or SHARD_MAX_WORKERS,
+                      get_request_scheduler(ANALYSIS_MODEL).concurrency_limit(shard_tokens))
+
+    shard_sections = []
+    shard_stats = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 샤드 스레드에서도 현재 trace에 구간이 기록되도록 컨텍스트를 복사하여 실행
+        futures = {executor.submit(contextvars.copy_context().run, run_shard, shard): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                text, elapsed = future.result()
+            except Exception as e:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise Exception(f"'{shard['name']}' 분석 중 오류: {str(e)}")
+            shard_sections.append(parse_analysis_sections(text))
+            shard_stats.append({"name": shard["name"], "elapsed_seconds": elapsed, "characters": len(text)})
+
+            if on_progress is not None:
+                parser = IncrementalSectionParser()
+                parser.feed(build_report_from_sections(merge_shard_sections(shard_sections), get_checklist_name(checklist)))
+                parser.finish()
+                on_progress(parser)
+
+    sections = merge_shard_sections(shard_sections)
+    return {
+        "image_names": image_names,
+        "image_count": len(images),
+        "full_report": build_report_from_sections(sections, get_checklist_name(checklist)),
+        "sections": sections,
+        "model": ANALYSIS_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "execution_mode": "sharded",
+        "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+        "shard_stats": sorted(shard_stats, key=lambda stat: -stat["elapsed_seconds"]),
+        "usage": summarize_usage(usage_log),
+        "image_stats": get_image_stats(prepared_images),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+# 구조화(JSON) 출력 분석 함수
+def analyze_multiple_images_structured(images: list, checklist: pd.DataFrame, image_names: list,
+                                       image_options: dict = None, original_bytes: list = None,
+                                       on_progress=None) -> dict:
+    """JSON 스키마 기반 구조화 출력으로 통합 위험성 평가를 수행하고, 검증된 객체로부터 표와 마크다운을 생성합니다."""
+    client = initialize_openai_client()
+    if client is None:
+        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
+    
+    started_at = time.perf_counter()
+    prepared_images = prepare_images(images, image_options, original_bytes)
+    prefix, suffix = build_structured_prompt(len(images), image_names, checklist)
+    
+    usage_log = []
+    response_text = request_completion(
+        client, build_image_message(suffix, prepared_images),
+        response_format={"type": "json_schema", "json_schema": ANALYSIS_REPORT_SCHEMA},
+        usage_log=usage_log, system_prompt=prefix, image_tokens=get_prepared_image_tokens(prepared_images)
+    )
+    try:
+        structured, validation_warnings = validate_structured_report(json.loads(response_text), checklist)
+    except json.JSONDecodeError as e:
+        raise Exception(f"구조화 응답을 JSON으로 해석할 수 없습니다: {str(e)}")
+    
+    sections = render_structured_sections(structured, checklist)
+    return {
+        "image_names": image_names,
+        "image_count": len(images),
+        "full_report": build_report_from_sections(sections, get_checklist_name(checklist)),
+        "sections": sections,
+        "structured": structured,
+        "checklist_items": checklist[['번호', '대분류', '소분류']].to_dict('records'),
+        "validation_warnings": validation_warnings,
+        "model": ANALYSIS_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "prompt_prefix_hash": compute_prompt_prefix_hash(prefix),
+        "execution_mode": "single",
+        "output_format": "json",
+        "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+        "usage": summarize_usage(usage_log),
+        "image_stats": get_image_stats(prepared_images),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+# 사진 묶음별 분석 후 통합(map-reduce) 함수들
+def resolve_map_options(map_options: dict = None) -> dict:
+    """묶음별 분석 옵션에 기본값을 채워 반환하는 함수"""
+    return {"group_size": MAP_GROUP_SIZE, "max_workers": MAP_MAX_WORKERS, "reduce": "model", **(map_options or {})}
+
+def build_image_groups(image_count: int, group_size: int) -> list:
+    """이미지 인덱스를 업로드 순서대로 group_size장씩 묶는 함수"""
+    group_size = max(1, int(group_size))
+    return [list(range(start, min(start + group_size, image_count))) for start in range(0, image_count, group_size)]
+
+def build_map_prompt(image_count: int, image_names: list, checklist: pd.DataFrame) -> tuple:
+    """사진 묶음별 관찰 결과(JSON) 프롬프트를 (정적 접두부, 요청별 접미부)로 생성하는 함수"""
+    checklist_lines = '\n'.join(
+        f"- {item['번호']}. [{item['대분류']}] {item['소분류']}"
+        for _, item in checklist.sort_values('번호').iterrows()
+    )
+    checklist_name = get_checklist_name(checklist)
+    
+    prefix = f"""
+Role(역할지정): 산업안전 위험성 평가 전문가로서 공사현장 사진 일부를 분석하여 통합 위험성 평가서 작성에 사용할 관찰 결과를 정리합니다.
+
+목표: 첨부된 사진들에서 확인되는 내용만 간결하게 지정된 JSON 스키마로 출력하세요. 다른 사진들의 관찰 결과와 나중에 합쳐집니다.
+
+출력 항목:
+- scene: 첨부된 사진들의 작업 환경, 작업 내용, 주요 장비 및 시설물을 2~3문장으로 요약
+- hazards: 사진에서 식별된 잠재 위험요인 (number, hazard: 위험요인, description: 사진에서 확인된 근거, countermeasures: 구체적인 위험성 감소대책 2~4개)
+- checklist: 아래 {checklist_name} 중 사진에서 근거가 확인되는 항목만 판정 (number, status, details: 사진에서 확인된 구체적 상황)
+  status - O: 사진에서 준수가 명확히 확인됨, X: 사진에서 명확히 미준수가 확인됨, 해당없음: 준수가 필요 없는 항목임
+
+{checklist_name}:
+{checklist_lines}
+
+제약사항:
+- 사진으로 확인할 수 없는 체크리스트 항목은 출력하지 말 것 (알수없음으로 처리됨)
+- 추측하지 말고 사진에서 보이는 근거만 짧게 작성
+- 모든 출력은 한국어로 작성
+"""
+    return prefix, build_prompt_suffix(image_count, image_names, "관찰 결과를 JSON 스키마로 출력해주세요.")
+
+def build_reduce_prompt() -> str:
+    """사진 묶음별 관찰 결과를 통합 작업 환경/위험요인/권장사항으로 합치는 텍스트 전용 프롬프트의 정적 접두부를 생성하는 함수"""
+    return """
+Role(역할지정): 산업안전 위험성 평가 전문가로서 동일한 공사현장의 사진 묶음별 관찰 결과를 종합하여 통합된 작업전 위험성 평가서를 작성합니다.
+
+목표: 사진 묶음별 관찰 결과(JSON)와 미준수 체크리스트 항목을 종합하여 현장 전체의 통합 위험성 평가 결과를 지정된 JSON 스키마로 출력하세요.
+
+출력 항목:
+- work_environment: 묶음별 현장 요약을 종합한 작업 환경, 작업 내용, 주요 장비 및 시설물, 현장 레이아웃에 대한 통합 설명
+- risks: 묶음별 위험요인 중 같은 위험은 하나로 합치고 현장 전체 관점으로 다시 작성한 위험요인 목록 (countermeasures는 4개 이상)
+- recommendations: 미준수 항목과 현장 전체 특성에 맞는 종합적이고 구체적인 추가 안전 권장사항 목록
+
+제약사항:
+- 관찰 결과에 없는 내용을 새로 만들지 말 것
+- 모든 내용은 실제 산업안전보건 기준에 부합하도록 구체적이고 실무적인 수준으로 작성
+- 모든 출력은 한국어로 작성
+"""
+
+def parse_map_findings(response_text: str, image_names: list) -> dict:
+    """사진 묶음 응답을 관찰 결과 dict로 변환하는 함수 (형식이 맞지 않으면 예외 발생)"""
+    try:
+        data = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise Exception(f"관찰 결과를 JSON으로 해석할 수 없습니다: {str(e)}")
+    if not isinstance(data, dict):
+        raise Exception("관찰 결과가 JSON 객체가 아닙니다.")
+    return {
+        "image_names": image_names,
+        "scene": str(data.get("scene", "")).strip(),
+        "hazards": [hazard for hazard in data.get("hazards", []) if isinstance(hazard, dict)],
+        "checklist": [item for item in data.get("checklist", []) if isinstance(item, dict)],
+    }
+
+def merge_checklist_findings(group_findings: list, checklist: pd.DataFrame) -> list:
+    """묶음별 체크리스트 판정을 우선순위(X > O > 해당없음 > 알수없음)로 합쳐 현장 전체 판정 목록을 만드는 함수
+
+    세부 내용은 판정이 같은 묶음들의 근거를 사진 이름과 함께 이어 붙이고, 어느 묶음에도 없는 항목은 '알수없음'으로 채웁니다.
+    """
+    merged = {}
+    for findings in group_findings:
+        source = ", ".join(findings["image_names"])
+        for item in findings["checklist"]:
+            number, status = item.get("number"), item.get("status")
+            if status not in CHECKLIST_STATUS_PRIORITY:
+                continue
+            details = f"[{source}] {str(item.get('details', '')).strip()}"
+            current = merged.get(number)
+            if current is None or CHECKLIST_STATUS_PRIORITY.index(status) < CHECKLIST_STATUS_PRIORITY.index(current["status"]):
+                merged[number] = {"number": number, "status": status, "details": [details]}
+            elif status == current["status"]:
+                current["details"].append(details)
+    
+    return [
+        {"number": int(number), "status": merged[number]["status"], "details": " / ".join(merged[number]["details"])}
+        if number in merged else
+        {"number": int(number), "status": "알수없음", "details": "사진에서 확인되지 않음"}
+        for number in sorted(int(number) for number in checklist['번호'])
+    ]
+
+def merge_findings_locally(group_findings: list, checklist_items: list, checklist: pd.DataFrame) -> dict:
+    """묶음별 관찰 결과를 추가 요청 없이 규칙으로 합쳐 작업 환경/위험요인/권장사항을 만드는 함수
+
+    같은 이름의 위험요인은 하나로 합쳐 감소대책을 중복 없이 모으고, 권장사항은 미준수 항목으로 구성합니다.
+    """
+    risks = {}
+    for findings in group_findings:
+        for hazard in findings["hazards"]:
+            name = str(hazard.get("hazard", "")).strip()
+            if not name:
+                continue
+            risk = risks.setdefault(re.sub(r"\s+", "", name), {
+                "hazard": name, "description": str(hazard.get("description", "")).strip(), "countermeasures": []
+            })
+            for countermeasure in hazard.get("countermeasures", []):
+                if countermeasure not in risk["countermeasures"]:
+                    risk["countermeasures"].append(countermeasure)
+    
+    items = checklist.set_index(checklist['번호'].astype(int))
+    return {
+        "work_environment": '\n'.join(
+            f"- {', '.join(findings['image_names'])}: {findings['scene']}" for findings in group_findings if findings["scene"]
+        ),
+        "risks": list(risks.values()),
+        "recommendations": [
+            f"[{items.at[item['number'], '대분류']}] {items.at[item['number'], '소분류']} 미준수 개선 - {item['details']}"
+            for item in checklist_items if item["status"] == "X"
+        ],
+    }
+
+def build_reduce_input(group_findings: list, checklist_items: list, checklist: pd.DataFrame) -> str:
+    """통합 요청에 보낼 묶음별 관찰 결과와 미준수 항목을 JSON 텍스트로 만드는 함수 (체크리스트 판정 전체는 보내지 않음)"""
+    items = checklist.set_index(checklist['번호'].astype(int))
+    return json.dumps({
+        "groups": [
+            {key: findings[key] for key in ("image_names", "scene", "hazards")} for findings in group_findings
+        ],
+        "violations": [
+            {"number": item["number"], "item": items.at[item["number"], '소분류'], "details": item["details"]}
+            for item in checklist_items if item["status"] == "X"
+        ],
+    }, ensure_ascii=False)
+
+def analyze_multiple_images_mapreduce(images: list, checklist: pd.DataFrame, image_names: list,
+                                      image_options: dict = None, original_bytes: list = None,
+                                      on_progress=None, map_options: dict = None) -> dict:
+    """사진을 묶음으로 나누어 동시에 관찰 결과를 받은 뒤(map) 하나의 통합 위험성 평가서로 합치는(reduce) 함수
+
+    각 사진은 한 번씩만 전송되므로 사진이 많아도 요청 1개의 크기가 묶음 크기로 제한됩니다.
+    체크리스트는 로컬 우선순위 규칙으로 합치고, 나머지 섹션은 통합 방식에 따라 텍스트 전용 요청 또는 로컬 규칙으로 합칩니다.
+    통합 요청이 실패하면 로컬 규칙으로 대신 합치고 검증 경고에 기록합니다.
+    on_progress가 주어지면 묶음이 완료될 때마다 로컬 규칙으로 합친 중간 결과를 IncrementalSectionParser로 전달합니다.
+    """
+    client = initialize_openai_client()
+    if client is None:
+        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
+    
+    map_options = resolve_map_options(map_options)
+    started_at = time.perf_counter()
+    prepared_images = prepare_images(images, image_options, original_bytes)
+    prepared_at = time.perf_counter()
+    # (파일명, 내용 해시) 순으로 묶어 업로드 순서나 같은 파일명과 무관하게 같은 입력이면 같은 묶음/결과가 나오도록 함
+    map_order = sorted(range(len(images)), key=lambda idx: (
+        image_names[idx], hashlib.sha256(prepared_images[idx]["base64"].encode("ascii")).hexdigest()
+    ))
+    groups = [[map_order[position] for position in group]
+              for group in build_image_groups(len(images), map_options["group_size"])]
+    usage_log = []
+    # 한 묶음이라도 실패하면 이미 작업자에게 넘어간 묶음도 요청을 보내지 않도록 표시
+    map_failed = threading.Event()
+
+    def run_group(group):
+        if map_failed.is_set():
+            raise Exception("앞선 사진 묶음 분석이 실패하여 요청을 보내지 않았습니다.")
+        group_started_at = time.perf_counter()
+        group_names = [image_names[idx] for idx in group]
+        group_prepared = [prepared_images[idx] for idx in group]
+        prefix, suffix = build_map_prompt(len(group), group_names, checklist)
+        try:
+            with trace_span("api.map", item=", ".join(group_names)):
+                text = request_completion(
+                    client, build_image_message(suffix, group_prepared), max_tokens=MAP_MAX_TOKENS,
+                    response_format={"type": "json_schema", "json_schema": PHOTO_FINDINGS_SCHEMA},
+                    usage_log=usage_log, system_prompt=prefix, image_tokens=get_prepared_image_tokens(group_prepared)
+                )
+            return parse_map_findings(text, group_names), len(text), round(time.perf_counter() - group_started_at, 2)
+        except Exception:
+            map_failed.set()
+            raise
+
+    group_findings = []
+    findings_by_group = {}
+    map_stats = []
+    with ThreadPoolExecutor(max_workers=max(1, int(map_options["max_workers"]))) as executor:
+        # 묶음 스레드에서도 현재 trace에 구간이 기록되도록 컨텍스트를 복사하여 실행
+        futures = {executor.submit(contextvars.copy_context().run, run_group, group): group_index
+                   for group_index, group in enumerate(groups)}
+        for future in as_completed(futures):
+            group_names = [image_names[idx] for idx in groups[futures[future]]]
+            try:
+                findings, characters, elapsed = future.result()
+            except Exception as e:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise Exception(f"사진 묶음({', '.join(group_names)}) 분석 중 오류: {str(e)}")
+            group_findings.append(findings)
+            findings_by_group[futures[future]] = findings
+            map_stats.append({"name": ", ".join(group_names), "images": len(group_names),
+                              "elapsed_seconds": elapsed, "characters": characters})
+
+            if on_progress is not None:
+                checklist_items = merge_checklist_findings(group_findings, checklist)
+                partial_report = {**merge_findings_locally(group_findings, checklist_items, checklist),
+                                  "checklist": checklist_items}
+                parser = IncrementalSectionParser()
+                parser.feed(build_report_from_sections(render_structured_sections(
+                    validate_structured_report(partial_report, checklist)[0], checklist
+                ), get_checklist_name(checklist)))
+                parser.finish()
+                on_progress(parser)
+    mapped_at = time.perf_counter()
+    
+    # 완료 순서가 아닌 묶음 순서대로 합쳐 같은 입력이면 같은 결과가 나오도록 함
+    group_findings = [findings_by_group[group_index] for group_index in range(len(groups))]
+    checklist_items = merge_checklist_findings(group_findings, checklist)
+    reduce_warnings = []
+    reduce_mode = map_options["reduce"]
+    if reduce_mode == "model":
+        reduce_prompt = build_reduce_prompt()
+        try:
+            with trace_span("api.reduce"):
+                summary_text = request_completion(
+                    client, [{"type": "text", "text": build_reduce_input(group_findings, checklist_items, checklist)}],
+                    max_tokens=REDUCE_MAX_TOKENS,
+                    response_format={"type": "json_schema", "json_schema": RISK_SUMMARY_SCHEMA},
+                    usage_log=usage_log, system_prompt=reduce_prompt
+                )
+            summary = json.loads(summary_text)
+            if not isinstance(summary, dict) or any(key not in summary for key in RISK_SUMMARY_SCHEMA["schema"]["required"]):
+                raise ValueError("통합 응답의 형식이 스키마와 다릅니다.")
+        except Exception as e:
+            reduce_mode = "local"
+            reduce_warnings.append(f"통합 요청이 실패하여 로컬 병합 규칙으로 합쳤습니다. ({str(e)})")
+    if reduce_mode == "local":
+        summary = merge_findings_locally(group_findings, checklist_items, checklist)
+    reduced_at = time.perf_counter()
+    
+    try:
+        structured, validation_warnings = validate_structured_report({**summary, "checklist": checklist_items}, checklist)
+    except ValueError as e:
+        raise Exception(f"통합 결과 형식이 올바르지 않습니다: {str(e)}")
+    sections = render_structured_sections(structured, checklist)
+    return {
+        "image_names": image_names,
+        "image_count": len(images),
+        "full_report": build_report_from_sections(sections, get_checklist_name(checklist)),
+        "sections": sections,
+        "structured": structured,
+        "checklist_items": checklist[['번호', '대분류', '소분류']].to_dict('records'),
+        "validation_warnings": reduce_warnings + validation_warnings,
+        "model": ANALYSIS_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "execution_mode": "mapreduce",
+        "output_format": "json",
+        "map_options": {**map_options, "reduce": reduce_mode},
+        "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+        "phase_seconds": {
+            "prepare": round(prepared_at - started_at, 2),
+            "map": round(mapped_at - prepared_at, 2),
+            "reduce": round(reduced_at - mapped_at, 2),
+        },
+        "map_stats": sorted(map_stats, key=lambda stat: -stat["elapsed_seconds"]),
+        "usage": summarize_usage(usage_log),
+        "image_stats": get_image_stats(prepared_images),
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-def create_section_files(sections: dict, timestamp: str) -> dict:
+# 사전 분류(트리아지) 함수들
+def build_triage_prompt(checklist: pd.DataFrame) -> str:
+    """대분류별 해당 여부를 판단하는 사전 분류 프롬프트의 정적 접두부를 생성하는 함수"""
+    category_lines = []
+    for category, items in checklist.sort_values('번호').groupby('대분류', sort=False):
+        examples = ', '.join(str(item) for item in items['소분류'].head(3))
+        category_lines.append(f"- {category}: {len(items)}개 항목 (예: {examples})")
+    checklist_name = get_checklist_name(checklist)
+    
+    return f"""
+Role(역할지정): 산업안전 위험성 평가 전문가로서 현장 사진을 빠르게 훑어보고 작업 유형을 분류합니다.
+
+목표: 첨부된 현장 사진들을 보고 현장 유형(scene)을 한 문장으로 요약하고, 아래 {checklist_name} 대분류마다 이 현장에 해당할 가능성이 있는지(applicable) 판단하세요.
+
+{checklist_name} 대분류:
+{chr(10).join(category_lines)}
+
+제약사항:
+- 대분류 이름은 위 목록과 정확히 같게 작성하고, 모든 대분류에 대해 판단
+- 조금이라도 관련 작업이나 장비/물질이 보이거나 사진만으로 배제할 수 없으면 applicable을 true로 판단
+- 사진에서 해당 작업이 명백히 없다고 판단될 때만 false로 판단하고, reason에 근거를 짧게 작성
+- 모든 출력은 한국어로 작성
+"""
+
+def triage_checklist_categories(images: list, checklist: pd.DataFrame, image_names: list) -> dict:
+    """저가 모델로 축소 이미지의 현장 유형을 분류하여 상세 분석할 대분류와 제외할 대분류를 정하는 함수
+
+    분류 응답에 없는 대분류와 TRIAGE_ALWAYS_CATEGORIES는 상세 분석 대상으로 유지합니다.
+    """
+    client = initialize_openai_client()
+    if client is None:
+        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
+    
+    started_at = time.perf_counter()
+    with trace_span("triage") as span:
+        thumbnails = prepare_images(images, TRIAGE_IMAGE_OPTIONS)
+        prefix = build_triage_prompt(checklist)
+        suffix = build_prompt_suffix(len(images), image_names, "현장 유형과 대분류별 해당 여부를 JSON 스키마로 출력해주세요.")
+        usage_log = []
+        response_text = request_completion(
+            client, build_image_message(suffix, thumbnails, detail="low"), max_tokens=TRIAGE_MAX_TOKENS,
+            response_format={"type": "json_schema", "json_schema": TRIAGE_SCHEMA},
+            usage_log=usage_log, system_prompt=prefix, model=TRIAGE_MODEL,
+            image_tokens=estimate_image_tokens(0, 0, detail="low") * len(thumbnails)
+        )
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError as e:
+            raise Exception(f"사전 분류 응답을 JSON으로 해석할 수 없습니다: {str(e)}")
+        
+        answers = {str(item.get("category", "")).strip(): item for item in data.get("categories", [])}
+        decisions = []
+        for category in checklist['대분류'].unique():
+            answer = answers.get(category)
+            if category in TRIAGE_ALWAYS_CATEGORIES:
+                applicable, reason = True, "항상 상세 분석하는 대분류"
+            elif answer is None:
+                applicable, reason = True, "분류 응답 누락"
+            else:
+                applicable, reason = bool(answer.get("applicable", True)), str(answer.get("reason", "")).strip()
+            decisions.append({"category": category, "applicable": applicable, "reason": reason})
+        span["skipped"] = sum(1 for decision in decisions if not decision["applicable"])
+    
+    return {
+        "model": TRIAGE_MODEL,
+        "scene": str(data.get("scene", "")).strip(),
+        "decisions": decisions,
+        "applicable": [decision["category"] for decision in decisions if decision["applicable"]],
+        "skipped": [decision["category"] for decision in decisions if not decision["applicable"]],
+        "usage": summarize_usage(usage_log, TRIAGE_MODEL),
+        "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+    }
+
+def estimate_triage_savings(images: list, checklist: pd.DataFrame, triaged_checklist: pd.DataFrame, image_names: list,
+                            triage: dict, image_options: dict = None, execution_mode: str = "single",
+                            output_format: str = "markdown", map_options: dict = None) -> dict:
+    """사전 분류로 줄어든 상세 분석 입력/출력 토큰과 비용을 추정하는 함수 (분류 호출 비용을 뺀 순절감액 포함)"""
+    image_sizes = [image.size for image in images]
+    full = estimate_analysis_tokens(image_sizes, checklist, image_names, image_options, execution_mode, output_format,
+                                    map_options)
+    triaged = estimate_analysis_tokens(image_sizes, triaged_checklist, image_names, image_options, execution_mode,
+                                       output_format, map_options)
+    saved_usage = {
+        "prompt_tokens": full["prompt_tokens"] - triaged["prompt_tokens"],
+        "completion_tokens": TRIAGE_OUTPUT_TOKENS_PER_ITEM * (len(checklist) - len(triaged_checklist)),
+    }
+    saved_cost = estimate_cost_usd(saved_usage, ANALYSIS_MODEL)
+    triage_cost = triage["usage"].get("cost_usd") or 0.0
+    return {
+        "saved_prompt_tokens": saved_usage["prompt_tokens"],
+        "saved_completion_tokens": saved_usage["completion_tokens"],
+        "saved_requests": full["requests"] - triaged["requests"],
+        "saved_cost_usd": saved_cost,
+        "triage_cost_usd": triage_cost,
+        "net_saved_usd": round(saved_cost - triage_cost, 6) if saved_cost is not None else None,
+    }
+
+def apply_triage_to_result(result: dict, checklist: pd.DataFrame, triage: dict):
+    """사전 분류에서 제외된 대분류 항목을 '해당없음'으로 채워 결과의 체크리스트/보고서를 완성하는 함수"""
+    reasons = {decision["category"]: decision["reason"] for decision in triage["decisions"]}
+    skipped_items = checklist[checklist['대분류'].isin(triage["skipped"])].sort_values('번호')
+    triaged_numbers = set(int(number) for number in skipped_items['번호'])
+    
+    if result.get("structured"):
+        structured = result["structured"]
+        checklist_items = [item for item in structured["checklist"] if item["number"] not in triaged_numbers]
+        checklist_items += [
+            {"number": int(item['번호']), "status": "해당없음",
+             "details": f"사전 분류 제외: {reasons[item['대분류']]}", "triaged": True}
+            for _, item in skipped_items.iterrows()
+        ]
+        structured["checklist"] = sorted(checklist_items, key=lambda item: item["number"])
+        result["checklist_items"] = checklist[['번호', '대분류', '소분류']].to_dict('records')
+        result["sections"] = render_structured_sections(structured, checklist)
+    else:
+        # 모델이 제외된 항목까지 작성한 경우에는 사전 분류 결과로 대체
+        sections = result["sections"]
+        checklist_rows = [row for row in extract_numbered_table_rows(sections.get("sgr_checklist", ""))
+                          if row[0] not in triaged_numbers]
+        checklist_rows += [
+            (int(item['번호']), "| " + " | ".join(escape_table_cell(value) for value in [
+                item['번호'], item['대분류'], item['소분류'], "해당없음", f"사전 분류 제외: {reasons[item['대분류']]}"
+            ]) + " |")
+            for _, item in skipped_items.iterrows()
+        ]
+        sections["sgr_checklist"] = build_checklist_table(checklist_rows)
+    
+    result["full_report"] = build_report_from_sections(result["sections"], get_checklist_name(checklist))
+    result["triage"] = {**triage, "triaged_numbers": sorted(triaged_numbers)}
+
+# 분석 결과 캐시 함수들
+def compute_checklist_hash(checklist: pd.DataFrame) -> str:
+    """프롬프트에 들어가는 체크리스트 표의 해시를 계산하는 함수"""
+    return hashlib.sha256(generate_checklist_prompt(checklist).encode('utf-8')).hexdigest()
+
+def resolve_output_format(execution_mode: str, output_format: str) -> str:
+    """실행 모드에서 사용할 수 있는 출력 형식을 반환하는 함수 (병렬 모드는 마크다운, 묶음별 분석 모드는 구조화 결과만 지원)"""
+    if execution_mode == "sharded":
+        return "markdown"
+    if execution_mode == "mapreduce":
+        return "json"
+    return output_format
+
+def compute_analysis_cache_key(image_bytes: list, checklist: pd.DataFrame, image_options: dict = None,
+                               model: str = ANALYSIS_MODEL, execution_mode: str = "single",
+                               output_format: str = "markdown", triage: bool = False, map_options: dict = None) -> str:
+    """이미지 원본 해시(정렬), 체크리스트 해시, 프롬프트 버전, 모델명, 실행 옵션으로 캐시 키를 생성하는 함수"""
+    key_source = {
+        "images": sorted(hashlib.sha256(data).hexdigest() for data in image_bytes),
+        "checklist": compute_checklist_hash(checklist),
+        "prompt_version": PROMPT_VERSION,
+        "model": model,
+        "image_options": image_options or {},
+        "execution_mode": execution_mode,
+        "output_format": output_format,
+        "triage": triage,
+    }
+    if execution_mode == "mapreduce":
+        key_source["map_options"] = resolve_map_options(map_options)
+    return hashlib.sha256(json.dumps(key_source, sort_keys=True).encode('utf-8')).hexdigest()
+
+def open_analysis_cache() -> sqlite3.Connection:
+    """분석 결과 캐시 DB를 열고 테이블을 준비하는 함수"""
+    os.makedirs(os.path.dirname(ANALYSIS_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(ANALYSIS_CACHE_PATH, timeout=10)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            cache_key TEXT PRIMARY KEY,
+            result_json TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    return conn
+
+def get_cached_analysis(cache_key: str):
+    """캐시에서 분석 결과를 조회하는 함수 (만료되었거나 없으면 None)"""
+    now = time.time()
+    with closing(open_analysis_cache()) as conn, conn:
+        row = conn.execute(
+            "SELECT result_json, created_at FROM analysis_cache WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > ANALYSIS_CACHE_TTL_SECONDS:
+            conn.execute("DELETE FROM analysis_cache WHERE cache_key = ?", (cache_key,))
+            return None
+        conn.execute("UPDATE analysis_cache SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+    return json.loads(row[0])
+
+def store_cached_analysis(cache_key: str, result: dict):
+    """분석 결과를 캐시에 저장하고 유효기간/용량 기준으로 오래된 항목을 정리하는 함수"""
+    result_json = json.dumps(result, ensure_ascii=False)
+    size_bytes = len(result_json.encode('utf-8'))
+    now = time.time()
+    with closing(open_analysis_cache()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache VALUES (?, ?, ?, ?, ?)",
+            (cache_key, result_json, size_bytes, now, now)
+        )
+        conn.execute("DELETE FROM analysis_cache WHERE created_at < ?", (now - ANALYSIS_CACHE_TTL_SECONDS,))
+
+        # 최대 용량 초과 시 가장 오래 사용되지 않은 항목부터 삭제 (LRU)
+        total_bytes = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM analysis_cache").fetchone()[0]
+        if total_bytes > ANALYSIS_CACHE_MAX_BYTES:
+            for key, size in conn.execute(
+                "SELECT cache_key, size_bytes FROM analysis_cache ORDER BY last_access ASC"
+            ).fetchall():
+                if total_bytes <= ANALYSIS_CACHE_MAX_BYTES:
+                    break
+                conn.execute("DELETE FROM analysis_cache WHERE cache_key = ?", (key,))
+                total_bytes -= size
+
+def get_analysis_cache_stats() -> dict:
+    """캐시 항목 수와 전체 용량을 반환하는 함수"""
+    with closing(open_analysis_cache()) as conn:
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM analysis_cache"
+        ).fetchone()
+    return {"entries": count, "bytes": total_bytes}
+
+def clear_analysis_cache():
+    """분석 결과 캐시를 모두 삭제하는 함수"""
+    with closing(open_analysis_cache()) as conn, conn:
+        conn.execute("DELETE FROM analysis_cache")
+
+def run_analysis_with_cache(images: list, checklist: pd.DataFrame, image_names: list, image_bytes: list,
+                            image_options: dict = None, force_refresh: bool = False, on_progress=None,
+                            execution_mode: str = "single", output_format: str = "markdown",
+                            triage: bool = False, map_options: dict = None) -> dict:
+    """캐시를 먼저 확인하고, 없거나 강제 재분석이면 분석을 수행한 뒤 결과를 캐시에 저장하는 함수
+
+    구조화(JSON) 출력은 단일 요청 모드에서만 지원하며, 병렬 모드에서는 마크다운 출력을 사용합니다.
+    묶음별 분석 모드는 map_options(묶음당 사진 수, 동시 요청 수, 통합 방식)에 따라 분석합니다.
+    triage가 켜져 있으면 사전 분류에서 해당 가능성이 있는 대분류만 상세 분석합니다.
+    """
+    output_format = resolve_output_format(execution_mode, output_format)
+    cache_key = compute_analysis_cache_key(image_bytes, checklist, image_options,
+                                           execution_mode=execution_mode, output_format=output_format,
+                                           triage=triage, map_options=map_options)
+
+    if not force_refresh:
+        with trace_span("cache.lookup") as span:
+            cached_result = get_cached_analysis(cache_key)
+            span["hit"] = cached_result is not None
+        if cached_result is not None:
+            # 같은 사진이라도 이번에 올린 파일 이름으로 표시 (캐시 키는 사진 내용만으로 계산)
+            cached_result["cache_hit"] = True
+            cached_result["image_names"] = image_names
+            return cached_result
+
+    if execution_mode == "sharded":
+        analyze = analyze_multiple_images_sharded
+    elif execution_mode == "mapreduce":
+        analyze = partial(analyze_multiple_images_mapreduce, map_options=map_options)
+    elif output_format == "json":
+        analyze = analyze_multiple_images_structured
+    else:
+        analyze = analyze_multiple_images_comprehensive
+    
+    # 사전 분류 (실패하면 전체 체크리스트로 상세 분석을 계속 진행)
+    triage_result = None
+    analysis_checklist = checklist
+    if triage:
+        try:
+            triage_result = triage_checklist_categories(images, checklist, image_names)
+        except Exception as e:
+            append_jsonl_log(TRIAGE_LOG_PATH, [{"cache_key": cache_key, "image_names": image_names, "error": str(e)}])
+        if triage_result and triage_result["skipped"] and triage_result["applicable"]:
+            analysis_checklist = checklist[checklist['대분류'].isin(triage_result["applicable"])]
+    
+    result = analyze(
+        images, analysis_checklist, image_names,
+        image_options=image_options,
+        original_bytes=[len(data) for data in image_bytes],
+        on_progress=on_progress
+    )
+    if triage_result is not None:
+        if analysis_checklist is not checklist:
+            apply_triage_to_result(result, checklist, triage_result)
+        else:
+            result["triage"] = {**triage_result, "skipped": [], "triaged_numbers": []}
+        result["triage"]["savings"] = estimate_triage_savings(
+            images, checklist, analysis_checklist, image_names, result["triage"],
+            image_options, execution_mode, output_format, map_options
+        )
+        append_jsonl_log(TRIAGE_LOG_PATH, [{
+            "cache_key": cache_key,
+            "image_names": image_names,
+            **{key: result["triage"][key] for key in ("model", "scene", "decisions", "skipped", "triaged_numbers", "savings")},
+        }])
+    result["cache_key"] = cache_key
+    result["checklist_name"] = get_checklist_name(checklist)
+    store_cached_analysis(cache_key, result)
+    result["cache_hit"] = False
+    return result
+
+# 백그라운드 분석 작업 큐 (작업 상태는 SQLite에 저장하여 새로고침/재접속 후에도 이어서 확인)
+def open_job_store() -> sqlite3.Connection:
+    """분석 작업 상태 DB를 열고 테이블을 준비하는 함수"""
+    os.makedirs(os.path.dirname(ANALYSIS_JOB_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(ANALYSIS_JOB_DB_PATH, timeout=10)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            image_names TEXT NOT NULL,
+            progress_text TEXT NOT NULL DEFAULT '',
+            result_json TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            owner_id TEXT,
+            checklist_name TEXT
+        )
+    """)
+    # 작업 소유자/체크리스트 이름 컬럼이 없던 이전 버전 DB에 컬럼 추가
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(analysis_jobs)")}
+    for column in ("owner_id", "checklist_name"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE analysis_jobs ADD COLUMN {column} TEXT")
+    return conn
+
+def get_process_start_marker(pid: int):
+    """프로세스 시작 시각 표식을 반환하는 함수 (Linux의 /proc/<pid>/stat starttime, 읽을 수 없으면 None)"""
+    try:
+        with open(f"/proc/{pid}/stat") as stat_file:
+            return stat_file.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+@st.cache_resource
+def get_job_owner_id() -> str:
+    """이 서버 프로세스를 나타내는 작업 소유자 ID (프로세스 ID:시작 시각, 프로세스마다 한 번 생성)"""
+    pid = os.getpid()
+    return f"{pid}:{get_process_start_marker(pid) or int(time.time())}"
+
+def is_job_owner_alive(owner_id: str) -> bool:
+    """작업 소유자 프로세스가 아직 실행 중인지 판별하는 함수
+
+    프로세스 ID가 재사용될 수 있으므로 /proc가 있으면 시작 시각까지 비교하고, 확인할 방법이 없는 환경에서는
+    실행 중으로 간주하여 다른 프로세스의 작업을 실패로 처리하지 않습니다 (소유자 기록이 없는 이전 작업은 종료로 간주).
+    """
+    if not owner_id:
+        return False
+    pid, _, marker = owner_id.partition(":")
+    try:
+        pid = int(pid)
+    except ValueError:
+        return False
+    current_marker = get_process_start_marker(pid)
+    if current_marker is not None:
+        return current_marker == marker
+    if os.path.isdir("/proc"):
+        return False
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def reap_orphaned_jobs(job_id: str = None) -> int:
+    """소유자 프로세스가 종료되어 끝날 수 없는 대기/실행 중 작업을 실패로 표시하는 함수 (job_id가 주어지면 그 작업만)"""
+    with closing(open_job_store()) as conn, conn:
+        query = "SELECT job_id, owner_id FROM analysis_jobs WHERE status IN ('queued', 'running')"
+        rows = conn.execute(query + " AND job_id = ?", (job_id,)) if job_id else conn.execute(query)
+        orphaned = [row[0] for row in rows.fetchall() if not is_job_owner_alive(row[1])]
+        conn.executemany(
+            "UPDATE analysis_jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?",
+            [("서버가 재시작되어 작업이 중단되었습니다.", time.time(), orphaned_id) for orphaned_id in orphaned]
+        )
+    return len(orphaned)
+
+def update_job(job_id: str, **fields):
+    """작업 상태 DB의 지정한 컬럼들을 갱신하는 함수"""
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    with closing(open_job_store()) as conn, conn:
+        conn.execute(f"UPDATE analysis_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+def get_job(job_id: str):
+    """작업 ID로 작업 상태를 조회하는 함수 (없으면 None)"""
+    with closing(open_job_store()) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM analysis_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["queue_position"] = conn.execute(
+            "SELECT COUNT(*) FROM analysis_jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+        ).fetchone()[0]
+    job["image_names"] = json.loads(job["image_names"])
+    result_json = job.pop("result_json")
+    job["result"] = json.loads(result_json) if result_json else None
+    return job
+
+def get_job_counts() -> dict:
+    """상태별 작업 수를 반환하는 함수"""
+    with closing(open_job_store()) as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status").fetchall()
+    counts = {status: 0 for status in ANALYSIS_JOB_STATUSES}
+    counts.update(dict(rows))
+    return counts
+
+@st.cache_resource
+def get_job_executor() -> ThreadPoolExecutor:
+    """서버 프로세스 전체에서 공유하는 분석 워커 풀을 생성하는 함수
+
+    종료된 프로세스에서 끝나지 못한 작업은 다시 실행할 수 없으므로 실패로 표시합니다.
+    (같은 DB를 쓰는 다른 실행 중인 서버 프로세스의 작업은 그대로 둠)
+    """
+    reap_orphaned_jobs()
+    return ThreadPoolExecutor(max_workers=ANALYSIS_JOB_MAX_WORKERS, thread_name_prefix="analysis-job")
+
+@st.cache_resource
+def get_inflight_analyses() -> dict:
+    """서버 프로세스 전체에서 공유하는 진행 중 분석 목록(캐시 키 → 작업 ID)과 중복 요청 통계를 생성하는 함수"""
+    return {"lock": threading.Lock(), "jobs": {}, "stats": {"requests": 0, "coalesced": 0}}
+
+def get_coalescing_stats() -> dict:
+    """동일 요청 합치기 통계(전체 요청, 합쳐진 요청, 진행 중인 분석 수)를 반환하는 함수"""
+    inflight = get_inflight_analyses()
+    with inflight["lock"]:
+        return {**inflight["stats"], "in_flight": len(inflight["jobs"])}
+
+def release_inflight_analysis(cache_key: str, job_id: str):
+    """작업이 끝나면 진행 중 분석 목록에서 제거하는 함수 (이후 같은 요청은 캐시에서 결과를 재사용)"""
+    inflight = get_inflight_analyses()
+    with inflight["lock"]:
+        if inflight["jobs"].get(cache_key) == job_id:
+            del inflight["jobs"][cache_key]
+
+def run_analysis_job(job_id: str, image_bytes: list, image_names: list, checklist: pd.DataFrame,
+                     analysis_options: dict, stream: bool = True, token_estimate: dict = None,
+                     cache_key: str = None):
+    """워커 스레드에서 분석을 실행하고 진행 내용과 결과를 작업 DB에 기록하는 함수 (화면 출력 없음)"""
+    update_job(job_id, status="running", started_at=time.time())
+    
+    # 스트리밍 중 작성된 내용은 일정 간격으로만 저장하여 DB 쓰기를 줄임
+    last_saved_at = 0.0
+    def save_progress(parser: IncrementalSectionParser):
+        nonlocal last_saved_at
+        now = time.time()
+        if now - last_saved_at >= ANALYSIS_JOB_PROGRESS_INTERVAL:
+            last_saved_at = now
+            update_job(job_id, progress_text=parser.text)
+    
+    trace = RunTrace(job_id)
+    try:
+        with activate_trace(trace):
+            with trace_span("image.load_cached"):
+                images = [load_working_image(data) for data in image_bytes]
+            result = run_analysis_with_cache(
+                images, checklist, image_names, image_bytes,
+                on_progress=save_progress if stream else None,
+                **analysis_options
+            )
+        result["trace"] = trace.to_dict()
+        result["token_estimate"] = token_estimate
+        update_job(job_id, status="done", result_json=json.dumps(result, ensure_ascii=False), finished_at=time.time())
+    except Exception as e:
+        update_job(job_id, status="failed", error=str(e), finished_at=time.time())
+    finally:
+        if cache_key:
+            release_inflight_analysis(cache_key, job_id)
+        trace.flush()
+
+def submit_analysis_job(image_bytes: list, image_names: list, checklist: pd.DataFrame,
+                        analysis_options: dict, stream: bool = True, token_estimate: dict = None) -> tuple:
+    """분석 작업을 대기열에 등록하고 (작업 ID, 기존 작업 연결 여부)를 반환하는 함수 (보관 기간이 지난 작업은 정리)
+
+    같은 캐시 키(이미지 내용, 체크리스트, 모델, 프롬프트 버전, 실행 옵션)의 분석이 이미 대기 중이거나 진행 중이면
+    새 API 호출을 만들지 않고 그 작업에 연결하여 같은 결과를 받습니다. (여러 탭/기기에서 동시에 분석을 누른 경우)
+    """
+    executor = get_job_executor()
+    cache_key = compute_analysis_cache_key(
+        image_bytes, checklist, analysis_options.get("image_options"),
+        execution_mode=analysis_options.get("execution_mode", "single"),
+        output_format=resolve_output_format(analysis_options.get("execution_mode", "single"),
+                                            analysis_options.get("output_format", "markdown")),
+        triage=analysis_options.get("triage", False),
+        map_options=analysis_options.get("map_options")
+    )
+    inflight = get_inflight_analyses()
+    with inflight["lock"]:
+        inflight["stats"]["requests"] += 1
+        if cache_key in inflight["jobs"]:
+            inflight["stats"]["coalesced"] += 1
+            return inflight["jobs"][cache_key], True
+        
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with closing(open_job_store()) as conn, conn:
+            conn.execute(
+                "DELETE FROM analysis_jobs WHERE status IN ('done', 'failed') AND created_at < ?",
+                (now - ANALYSIS_JOB_RETENTION_SECONDS,)
+            )
+            conn.execute(
+                "INSERT INTO analysis_jobs (job_id, status, image_names, created_at, owner_id, checklist_name) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(image_names, ensure_ascii=False), now, get_job_owner_id(), get_checklist_name(checklist))
+            )
+        inflight["jobs"][cache_key] = job_id
+    executor.submit(run_analysis_job, job_id, image_bytes, image_names, checklist.copy(), analysis_options, stream,
+                    token_estimate, cache_key)
+    return job_id, False
+
+def create_section_files(sections: dict, timestamp: str, checklist_name: str = DEFAULT_CHECKLIST_NAME) -> dict:
     """각 섹션을 개별 파일로 생성하는 함수"""
     files = {}
 
@@ -588,7 +2684,7 @@ def create_section_files(sections: dict, timestamp: str) -> dict:
 """
 
     if sections["sgr_checklist"]:
-        files["sgr_checklist"] = f"""# SGR 체크리스트 항목별 통합 체크 결과
+        files["sgr_checklist"] = f"""# {checklist_name} 항목별 통합 체크 결과
 
 생성 시간: {timestamp}
 
@@ -606,9 +2702,19 @@ def create_section_files(sections: dict, timestamp: str) -> dict:
     return files
 
 # 파일 다운로드 관련 함수들
-def create_zip_download(sections: dict, timestamp: str) -> bytes:
-    """전체 섹션을 ZIP 파일로 생성"""
-    section_files = create_section_files(sections, timestamp)
+def create_zip_download(sections: dict, timestamp: str, risk_df: pd.DataFrame = None,
+                        checklist_df: pd.DataFrame = None, metadata: dict = None) -> bytes:
+    """전체 섹션을 ZIP 파일로 생성 (DataFrame이 주어지면 마크다운 재파싱 없이 사용, metadata는 분석정보.json으로 포함)"""
+    with trace_span("export.zip") as span:
+        zip_data = build_zip_bytes(sections, timestamp, risk_df, checklist_df, metadata)
+        span["bytes"] = len(zip_data)
+    return zip_data
+
+def build_zip_bytes(sections: dict, timestamp: str, risk_df: pd.DataFrame = None,
+                    checklist_df: pd.DataFrame = None, metadata: dict = None) -> bytes:
+    """섹션 마크다운과 표 CSV를 묶은 ZIP 바이트를 생성하는 함수"""
+    section_files = create_section_files(sections, timestamp,
+                                         (metadata or {}).get("checklist_name", DEFAULT_CHECKLIST_NAME))
     
     zip_buffer = io.BytesIO()
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
@@ -628,25 +2734,29 @@ def create_zip_download(sections: dict, timestamp: str) -> bytes:
         
         # CSV 파일 추가
         try:
-            if sections.get("risk_analysis"):
+            if risk_df is None and sections.get("risk_analysis"):
                 risk_df = parse_risk_analysis_to_dataframe(sections["risk_analysis"])
-                if not risk_df.empty:
-                    risk_csv = risk_df.to_csv(index=False, encoding='utf-8-sig')
-                    zip_file.writestr(
-                        f"1.위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        risk_csv.encode('utf-8-sig')
-                    )
+            if risk_df is not None and not risk_df.empty:
+                risk_csv = risk_df.to_csv(index=False, encoding='utf-8-sig')
+                zip_file.writestr(
+                    f"1.위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    risk_csv.encode('utf-8-sig')
+                )
             
-            if sections.get("sgr_checklist"):
+            if checklist_df is None and sections.get("sgr_checklist"):
                 checklist_df = parse_sgr_checklist_to_dataframe(sections["sgr_checklist"])
-                if checklist_df is not None and not checklist_df.empty:
-                    checklist_csv = checklist_df.to_csv(index=False, encoding='utf-8-sig')
-                    zip_file.writestr(
-                        f"2.체크리스트_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                        checklist_csv.encode('utf-8-sig')
-                    )
+            if checklist_df is not None and not checklist_df.empty:
+                checklist_csv = checklist_df.to_csv(index=False, encoding='utf-8-sig')
+                zip_file.writestr(
+                    f"2.체크리스트_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    checklist_csv.encode('utf-8-sig')
+                )
         except Exception as e:
             st.warning(f"⚠️ CSV 파일 생성 중 일부 오류 발생: {str(e)}")
+        
+        # 분석 정보 (모델, 프롬프트 버전, 토큰 사용량/비용 등)
+        if metadata:
+            zip_file.writestr("분석정보.json", json.dumps(metadata, ensure_ascii=False, indent=2).encode('utf-8'))
     
     zip_buffer.seek(0)
     return zip_buffer.getvalue()
@@ -681,18 +2791,59 @@ def render_image_upload():
     return uploaded_images
 
 def render_image_preview(uploaded_images):
-    """업로드된 이미지 미리보기"""
+    """업로드된 이미지 미리보기 및 품질 사전 점검 (자동 제외를 켜면 분석할 이미지만 반환)"""
     if uploaded_images:
         st.markdown("### 📷 업로드된 이미지")
         
-        # 이미지를 3열로 표시
-        num_cols = min(len(uploaded_images), 3)
+        # 흐림/노출 불량/중복 사진 점검 (축소 흑백 이미지로 계산하고 결과는 캐시)
+        image_hashes = [get_upload_hash(image_file) for image_file in uploaded_images]
+        image_bytes = [image_file.getvalue() for image_file in uploaded_images]
+        screening = screen_images(image_hashes, image_bytes)
+        auto_drop = st.toggle(
+            "품질 미달/중복 사진 자동 제외", value=True, key="auto_drop_low_quality",
+            help="흐리거나 노출이 맞지 않는 사진, 연속 촬영으로 거의 같은 사진은 '알수없음' 판정만 늘리고 비용을 늘리므로 분석에서 제외합니다."
+        )
+        selected = select_images_to_analyze(screening) if auto_drop else list(range(len(uploaded_images)))
+        
+        # 사진이 많으면 페이지로 나누어 표시
+        page_count = math.ceil(len(uploaded_images) / PREVIEW_PAGE_SIZE)
+        page = 1
+        if page_count > 1:
+            page = st.number_input("미리보기 페이지", min_value=1, max_value=page_count, value=1, step=1,
+                                   key="preview_page")
+        page_start = (page - 1) * PREVIEW_PAGE_SIZE
+        page_indices = range(page_start, min(page_start + PREVIEW_PAGE_SIZE, len(uploaded_images)))
+        if page_count > 1:
+            st.caption(f"전체 {len(uploaded_images)}장 중 {page_indices.start + 1}~{page_indices.stop}번째 사진")
+        
+        # 이미지를 3열로 표시 (캐시된 썸네일 사용)
+        num_cols = min(len(page_indices), 3)
         cols = st.columns(num_cols)
         
-        for idx, image_file in enumerate(uploaded_images):
-            with cols[idx % num_cols]:
-                image = Image.open(image_file)
-                st.image(image, caption=f"📷 {image_file.name}", use_container_width=True)
+        for col_idx, idx in enumerate(page_indices):
+            image_file = uploaded_images[idx]
+            with cols[col_idx % num_cols]:
+                st.image(create_thumbnail(image_hashes[idx], image_bytes[idx]), caption=f"📷 {image_file.name}",
+                         use_container_width=True)
+                quality = screening[idx]
+                if quality["issues"]:
+                    labels = ", ".join(QUALITY_ISSUES[issue] for issue in quality["issues"])
+                    if quality["duplicate_of"] is not None:
+                        labels += f" ({uploaded_images[quality['duplicate_of']].name}와 유사)"
+                    status = "🚫 분석 제외" if idx not in selected else "⚠️ 주의"
+                    st.caption(f"{status} - {labels} · 선명도 {quality['blur_score']} · 밝기 {quality['brightness']}")
+        
+        # 제외된 사진으로 줄어든 전송 용량과 이미지 입력 토큰
+        dropped = [idx for idx in range(len(uploaded_images)) if idx not in selected]
+        if dropped:
+            max_edge = get_image_options()["max_edge"]
+            saved_bytes = sum(screening[idx]["bytes"] for idx in dropped)
+            saved_tokens = sum(estimate_image_tokens(*compute_prepared_size(screening[idx]["size"], max_edge)) for idx in dropped)
+            st.info(f"🧹 품질 점검으로 {len(dropped)}장을 분석에서 제외했습니다. "
+                    f"업로드 용량 {saved_bytes / 1024:.0f}KB · 이미지 입력 토큰 약 {saved_tokens:,} (요청 1회 기준) 절감")
+        elif any(quality["issues"] for quality in screening):
+            st.caption("⚠️ 품질 문제가 있는 사진이 있지만 모두 분석에 포함합니다.")
+        uploaded_images = [uploaded_images[idx] for idx in selected]
         
         # 정보 메시지
         if len(uploaded_images) == 1:
@@ -707,6 +2858,87 @@ def render_image_preview(uploaded_images):
                 💡 총 {len(uploaded_images)}개의 이미지가 업로드되었습니다. 동일한 현장의 사진들로 간주하여 <strong>통합 위험성 평가</strong>를 수행합니다.
             </div>
             """, unsafe_allow_html=True)
+    return uploaded_images
+
+def get_image_options() -> dict:
+    """사이드바의 이미지 전처리 설정값을 반환하는 함수"""
+    return {
+        "max_edge": st.session_state.get("image_max_edge", IMAGE_MAX_EDGE),
+        "image_format": st.session_state.get("image_format", IMAGE_FORMAT),
+        "quality": st.session_state.get("image_quality", IMAGE_QUALITY),
+    }
+
+def get_map_options() -> dict:
+    """사이드바의 묶음별 분석 설정값을 반환하는 함수"""
+    return {
+        "group_size": st.session_state.get("map_group_size", MAP_GROUP_SIZE),
+        "max_workers": st.session_state.get("map_max_workers", MAP_MAX_WORKERS),
+        "reduce": st.session_state.get("map_reduce_mode", "model"),
+    }
+
+def create_streaming_placeholders() -> dict:
+    """스트리밍 중 섹션별 내용을 표시할 자리표시자를 생성하는 함수"""
+    container = st.container()
+    with container:
+        return {
+            "work_environment": st.empty(),
+            "risk_analysis": st.empty(),
+            "sgr_checklist": st.empty(),
+        }
+
+def render_streaming_progress(placeholders: dict, parser: IncrementalSectionParser,
+                              checklist_name: str = DEFAULT_CHECKLIST_NAME):
+    """스트리밍으로 완성된 줄까지의 섹션 내용을 자리표시자에 표시하는 함수"""
+    sections = parser.get_sections()
+    
+    if sections["work_environment"]:
+        placeholders["work_environment"].markdown(f"#### 🏗️ 통합 작업 환경 설명\n\n{sections['work_environment']}")
+    if sections["risk_analysis"]:
+        placeholders["risk_analysis"].markdown(f"#### 🔍 잠재 위험요인 분석 (작성 중)\n\n{sections['risk_analysis']}")
+    if sections["sgr_checklist"]:
+        placeholders["sgr_checklist"].markdown(
+            f"#### ✅ {checklist_name} (작성 중)\n\n{format_checklist_content(sections['sgr_checklist'])}",
+            unsafe_allow_html=True
+        )
+
+def render_token_estimate(uploaded_images, checklist: pd.DataFrame) -> tuple:
+    """업로드 사진과 현재 설정으로 예상 입력 토큰/비용을 표시하고, 실제 전송할 이미지 옵션과 추정치를 반환하는 함수"""
+    image_options = get_image_options()
+    if checklist is None or checklist.empty:
+        return image_options, None
+    
+    # 이미지 헤더만 읽어 해상도를 확인 (디코딩 없음)
+    image_sizes = [Image.open(io.BytesIO(image_file.getvalue())).size for image_file in uploaded_images]
+    image_names = [image_file.name for image_file in uploaded_images]
+    execution_mode = st.session_state.get("analysis_mode", "single")
+    output_format = st.session_state.get("output_format", "markdown")
+    budget = st.session_state.get("token_budget", PROMPT_TOKEN_BUDGET)
+    map_options = get_map_options() if execution_mode == "mapreduce" else None
+    
+    estimate = estimate_analysis_tokens(image_sizes, checklist, image_names, image_options, execution_mode, output_format,
+                                        map_options)
+    input_cost = estimate_cost_usd({"prompt_tokens": estimate["prompt_tokens"]}, ANALYSIS_MODEL)
+    st.caption(
+        f"🧮 예상 입력 토큰 약 {estimate['prompt_tokens']:,} (텍스트 {estimate['text_tokens']:,} · "
+        f"이미지 {estimate['image_tokens']:,} · 요청 {estimate['requests']}회) · 예상 입력 비용 약 ${input_cost:.4f}"
+    )
+    
+    if estimate["prompt_tokens"] > budget:
+        if st.session_state.get("auto_downscale", True):
+            image_options, estimate = fit_image_options_to_budget(
+                image_sizes, checklist, image_names, image_options, budget, execution_mode, output_format, map_options
+            )
+            if estimate["prompt_tokens"] <= budget:
+                st.info(f"📉 입력 토큰 예산({budget:,})을 넘어 이미지 긴 변을 {image_options['max_edge']}px로 줄여 전송합니다. "
+                        f"(예상 {estimate['prompt_tokens']:,} 토큰)")
+            else:
+                st.warning(f"⚠️ 이미지를 최소 크기로 줄여도 예상 입력 토큰({estimate['prompt_tokens']:,})이 예산({budget:,})을 초과합니다. "
+                           "사진 수를 줄이거나 단일 요청 모드를 사용해보세요.")
+        else:
+            st.warning(f"⚠️ 예상 입력 토큰이 예산({budget:,})을 초과합니다. 사이드바에서 이미지 크기를 줄이거나 자동 축소를 켜주세요.")
+    
+    estimate["budget"] = budget
+    return image_options, estimate
 
 def render_analysis_button(uploaded_images, checklist):
     """분석 버튼 및 분석 실행"""
@@ -717,10 +2949,22 @@ def render_analysis_button(uploaded_images, checklist):
     
     st.markdown("### 🚀 위험성 평가 분석")
     
+    force_refresh = st.checkbox(
+        "🔁 캐시 무시하고 다시 분석",
+        value=False,
+        key="force_reanalyze",
+        help="동일한 사진/체크리스트의 이전 분석 결과가 있어도 새로 분석합니다."
+    )
+    
+    # 전송 전 입력 토큰/비용 추정 (예산 초과 시 경고 또는 이미지 자동 축소)
+    image_options, token_estimate = render_token_estimate(uploaded_images, checklist)
+    
+    job_running = bool(st.session_state.get('analysis_job_id'))
     if st.button(
         f"📊 {analysis_mode} - 종합 위험성 평가서 생성", 
         type="primary", 
         use_container_width=True,
+        disabled=job_running,
         key="analysis_button"
     ):
         client = initialize_openai_client()
@@ -732,35 +2976,215 @@ def render_analysis_button(uploaded_images, checklist):
             return False
         else:
             try:
-                # 진행 상황 표시
-                with st.spinner(f"🤖 AI가 {len(uploaded_images)}장의 현장 사진을 종합 분석하여 통합 위험성 평가서를 생성하고 있습니다..."):
-                    
-                    # 이미지들을 PIL Image 객체로 변환
-                    images = []
-                    image_names = []
-                    
-                    for image_file in uploaded_images:
-                        image = Image.open(image_file)
-                        images.append(image)
-                        image_names.append(image_file.name)
-                    
-                    # 통합 분석 수행
-                    result = analyze_multiple_images_comprehensive(images, checklist, image_names)
+                image_names = [image_file.name for image_file in uploaded_images]
+                image_bytes = [image_file.getvalue() for image_file in uploaded_images]
                 
-                # 분석 결과를 세션 상태에 저장
-                st.session_state['analysis_result'] = result
-                st.session_state['analysis_completed'] = True
-
-                st.success("✅ 통합 위험성 평가서 생성 완료!")
+                # 분석은 백그라운드 작업으로 등록하고, 진행 상황은 작업 상태 영역에서 주기적으로 확인
+                # (동일한 사진/체크리스트/프롬프트 버전의 결과가 캐시에 있으면 작업에서 재사용하고,
+                #  같은 분석이 이미 진행 중이면 새로 요청하지 않고 그 작업에 연결)
+                job_id, coalesced = submit_analysis_job(
+                    image_bytes, image_names, checklist,
+                    analysis_options={
+                        "image_options": image_options,
+                        "force_refresh": force_refresh,
+                        "execution_mode": st.session_state.get("analysis_mode", "single"),
+                        "output_format": st.session_state.get("output_format", "markdown"),
+                        "triage": st.session_state.get("use_triage", False),
+                        "map_options": get_map_options(),
+                    },
+                    stream=st.session_state.get("stream_analysis", True),
+                    token_estimate=token_estimate
+                )
+                
+                # 새로고침 후에도 이어서 확인할 수 있도록 작업 ID를 세션과 URL에 저장
+                st.session_state['analysis_job_id'] = job_id
+                st.session_state['analysis_job_coalesced'] = coalesced
+                # 진행 중인 다른 세션의 작업에 연결된 경우, 결과에는 그 세션이 아닌 이번 업로드의 이름/추정치를 표시
+                st.session_state['analysis_job_overrides'] = (
+                    {"image_names": image_names, "token_estimate": token_estimate} if coalesced else None
+                )
+                st.session_state['analysis_completed'] = False
+                st.query_params["job"] = job_id
                 return True
 
             except Exception as e:
-                st.error(f"❌ 분석 중 오류 발생: {str(e)}")
-                st.info("💡 오류가 지속되면 이미지 크기를 줄이거나 장수를 줄여서 다시 시도해보세요.")
+                st.error(f"❌ 분석 작업 등록 중 오류 발생: {str(e)}")
                 return False
     
+    if job_running:
+        st.caption("⏳ 진행 중인 분석이 끝나면 다시 분석할 수 있습니다.")
     return False
 
+def attach_analysis_job():
+    """세션 최초 실행 시 URL의 작업 ID로 진행 중이거나 완료된 분석 작업에 다시 연결하는 함수"""
+    if 'analysis_job_id' not in st.session_state:
+        st.session_state['analysis_job_id'] = st.query_params.get("job")
+
+def finish_analysis_job(job: dict):
+    """완료된 작업의 결과를 세션에 반영하는 함수 (다른 세션의 작업에 연결했다면 이번 업로드의 이름/추정치로 바꿈)"""
+    result = {**job["result"], **(st.session_state.get('analysis_job_overrides') or {})}
+    st.session_state['analysis_result'] = result
+    st.session_state['analysis_completed'] = True
+    st.session_state['analysis_job_id'] = None
+    st.session_state['analysis_job_coalesced'] = False
+    st.session_state['analysis_job_overrides'] = None
+    st.query_params.pop("job", None)
+    if result.get("cache_hit"):
+        st.session_state['analysis_notice'] = f"⚡ 이전 분석 결과를 캐시에서 불러왔습니다. (분석 시각: {result['timestamp']})"
+    else:
+        st.session_state['analysis_notice'] = "✅ 통합 위험성 평가서 생성 완료!"
+
+@st.fragment(run_every=ANALYSIS_JOB_POLL_SECONDS)
+def render_analysis_job_status():
+    """진행 중인 분석 작업의 상태와 작성 중인 내용을 주기적으로 갱신하여 표시하는 함수"""
+    job_id = st.session_state.get('analysis_job_id')
+    if not job_id:
+        return
+    
+    # 워커 풀을 먼저 준비하고, 이 작업의 소유 프로세스가 종료되었으면 계속 대기로 보이지 않도록 실패로 표시
+    get_job_executor()
+    reap_orphaned_jobs(job_id)
+    job = get_job(job_id)
+    if job is None:
+        st.warning("⚠️ 분석 작업을 찾을 수 없습니다. 보관 기간이 지났을 수 있으니 다시 분석해주세요.")
+        st.session_state['analysis_job_id'] = None
+        st.session_state['analysis_job_overrides'] = None
+        st.query_params.pop("job", None)
+        return
+    
+    if job["status"] == "done":
+        finish_analysis_job(job)
+        st.rerun()
+    elif job["status"] == "failed":
+        st.error(f"❌ 분석 중 오류 발생: {job['error']}")
+        st.info("💡 오류가 지속되면 이미지 크기를 줄이거나 장수를 줄여서 다시 시도해보세요.")
+        st.session_state['analysis_job_id'] = None
+        st.session_state['analysis_job_overrides'] = None
+        st.query_params.pop("job", None)
+        return
+    
+    if st.session_state.get('analysis_job_coalesced'):
+        st.caption("🔗 같은 사진과 체크리스트의 분석이 이미 진행 중이어서 해당 작업의 결과를 함께 받습니다.")
+    
+    if job["status"] == "queued":
+        st.info(f"{ANALYSIS_JOB_STATUSES['queued']} - 앞선 작업 {job['queue_position']}건 (작업 ID: {job_id})")
+        return
+    
+    # API 요청 한도 대기 상황 (여러 사용자가 같은 API 키를 쓰면 요청이 순서대로 대기)
+    scheduler = get_request_scheduler(ANALYSIS_MODEL).snapshot()
+    if scheduler["queue_depth"] or scheduler["cooldown_seconds"]:
+        st.caption(f"🚦 API 한도 대기 중 - 대기 요청 {scheduler['queue_depth']}건 · "
+                   f"최근 평균 대기 {scheduler['avg_wait_seconds']}초 · 한도 초과 휴지 {scheduler['cooldown_seconds']}초")
+    
+    elapsed = time.time() - (job["started_at"] or job["created_at"])
+    st.info(
+        f"{ANALYSIS_JOB_STATUSES['running']} - AI가 {len(job['image_names'])}장의 현장 사진을 종합 분석하여 "
+        f"통합 위험성 평가서를 생성하고 있습니다... ({elapsed:.0f}초 경과, 작업 ID: {job_id})"
+    )
+    if job["progress_text"]:
+        parser = IncrementalSectionParser()
+        parser.feed(job["progress_text"])
+        # 제목은 사이드바의 현재 선택이 아니라 작업 등록 시 저장한 체크리스트 이름을 사용
+        render_streaming_progress(create_streaming_placeholders(), parser,
+                                  job["checklist_name"] or DEFAULT_CHECKLIST_NAME)
+
+def render_image_stats(image_stats: list, image_names: list):
+    """이미지 전처리 전후 용량과 추정 토큰을 표시하는 함수"""
+    summary = summarize_image_stats(image_stats)
+    with st.expander(f"🖼️ 이미지 전처리 결과 (전송량 {summary['payload_bytes'] / 1024 / 1024:.2f}MB, "
+                     f"{summary['saved_bytes'] / 1024 / 1024:.2f}MB 절감)", expanded=False):
+        rows = []
+        for name, stat in zip(image_names, image_stats):
+            rows.append({
+                "이미지": name,
+                "원본 해상도": f"{stat['original_size'][0]}x{stat['original_size'][1]}",
+                "전송 해상도": f"{stat['prepared_size'][0]}x{stat['prepared_size'][1]}",
+                "원본 용량(KB)": round((stat["original_bytes"] or 0) / 1024, 1),
+                "전송 용량(KB)": round(stat["payload_bytes"] / 1024, 1),
+                "원본 추정 토큰": stat["original_tokens"],
+                "전송 추정 토큰": stat["prepared_tokens"],
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.caption(f"추정 이미지 토큰: {summary['original_tokens']:,} → {summary['prepared_tokens']:,}")
+
+# 분석 결과 파생 산출물 캐시 (결과별로 한 번만 생성하고 재실행 시 재사용)
+def get_result_id(result: dict) -> str:
+    """분석 결과를 식별하는 ID를 반환하는 함수"""
+    if "result_id" not in result:
+        identity = f"{result['timestamp']}\n{result['full_report']}"
+        result["result_id"] = hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+    return result["result_id"]
+
+def get_result_artifacts(result: dict) -> dict:
+    """현재 분석 결과의 파생 산출물 저장소를 반환하는 함수 (다른 결과가 선택되면 새로 생성)"""
+    result_id = get_result_id(result)
+    artifacts = st.session_state.get('result_artifacts')
+    if artifacts is None or artifacts.get('result_id') != result_id:
+        artifacts = {'result_id': result_id}
+        st.session_state['result_artifacts'] = artifacts
+    return artifacts
+
+def get_artifact(artifacts: dict, name: str, builder):
+    """산출물이 아직 없을 때만 builder로 생성하여 저장하고 반환하는 함수"""
+    if name not in artifacts:
+        artifacts[name] = builder()
+    return artifacts[name]
+
+def run_traced(trace: RunTrace, builder):
+    """builder를 trace가 활성화된 상태로 실행하고, 기록된 구간을 로그에 남기는 함수"""
+    with activate_trace(trace):
+        value = builder()
+    trace.flush()
+    return value
+
+def lazy_artifact(artifacts: dict, name: str, builder):
+    """다운로드 버튼용으로, 클릭 시 처음 한 번만 산출물을 생성하는 함수를 반환"""
+    return lambda: get_artifact(artifacts, name, builder)
+
+def build_result_metadata(result: dict) -> dict:
+    """내보내기 파일에 포함할 분석 정보(모델, 프롬프트 버전, 토큰 사용량 등)를 만드는 함수"""
+    metadata_keys = ["timestamp", "model", "prompt_version", "prompt_prefix_hash", "checklist_name", "execution_mode",
+                     "output_format", "image_names", "elapsed_seconds", "map_options", "phase_seconds", "cache_key", "cache_hit",
+                     "usage", "token_estimate", "triage"]
+    return {key: result.get(key) for key in metadata_keys if result.get(key) is not None}
+
+def render_usage_summary(result: dict):
+    """분석 결과의 실제 토큰 사용량/비용과 전송 전 추정치를 표시하는 함수"""
+    usage = result.get("usage")
+    token_estimate = result.get("token_estimate")
+    parts = []
+    if usage and usage["calls"]:
+        parts.append(f"입력 {usage['prompt_tokens']:,} 토큰 (캐시 {usage['cached_tokens']:,}, "
+                     f"적중률 {usage.get('cached_ratio', 0):.0%}) · 출력 {usage['completion_tokens']:,} 토큰")
+        if usage.get("cost_usd") is not None:
+            parts.append(f"비용 약 ${usage['cost_usd']:.4f}")
+    if token_estimate:
+        parts.append(f"사전 추정 입력 {token_estimate['prompt_tokens']:,} 토큰")
+    if not parts:
+        return
+    if result.get("cache_hit"):
+        parts.append("캐시 재사용으로 이번 실행의 API 비용 없음")
+    st.caption("🧾 " + " · ".join(parts))
+
+def render_triage_summary(result: dict):
+    """사전 분류 결과(현장 유형, 제외된 대분류, 절감 추정치)를 표시하는 함수"""
+    triage = result.get("triage")
+    if not triage:
+        return
+    savings = triage.get("savings", {})
+    parts = [f"현장 유형: {triage['scene']}" if triage.get("scene") else "현장 유형 미분류"]
+    if triage["skipped"]:
+        parts.append(f"제외 대분류 {', '.join(triage['skipped'])} ({len(triage['triaged_numbers'])}개 항목 해당없음 처리)")
+    else:
+        parts.append("제외된 대분류 없음")
+    if savings.get("net_saved_usd") is not None:
+        parts.append(f"예상 절감 약 ${savings['net_saved_usd']:.4f} (분류 비용 ${savings['triage_cost_usd']:.4f} 차감)")
+    st.caption(f"🔎 사전 분류({triage['model']}) · " + " · ".join(parts))
+    with st.expander("사전 분류 판단 근거", expanded=False):
+        st.dataframe(pd.DataFrame(triage["decisions"]).rename(columns={
+            "category": "대분류", "applicable": "상세 분석", "reason": "근거"
+        }), use_container_width=True, hide_index=True)
+
 def render_analysis_results():
     """분석 결과 렌더링"""
     if not st.session_state.get('analysis_completed', False) or 'analysis_result' not in st.session_state:
@@ -768,7 +3192,26 @@ def render_analysis_results():
     
     result = st.session_state['analysis_result']
     sections = result.get('sections', {})
-    section_files = create_section_files(sections, result['timestamp'])
+    checklist_name = result.get('checklist_name', DEFAULT_CHECKLIST_NAME)
+    checklist_file_name = checklist_name.replace(' ', '')
+    
+    # 파싱/포맷 결과는 결과별로 한 번만 계산하고, 파일 데이터는 다운로드 시점에 생성
+    # (이 단계들의 소요 시간은 분석 구간 뒤에 이어지는 render 구간으로 기록)
+    artifacts = get_result_artifacts(result)
+    analysis_trace = result.get("trace") or {}
+    render_trace = get_artifact(artifacts, "render_trace", lambda: RunTrace(
+        analysis_trace.get("trace_id"), phase="render", offset_ms=get_trace_total_ms(analysis_trace)
+    ))
+    section_files = get_artifact(artifacts, "section_files", lambda: run_traced(
+        render_trace, lambda: create_section_files(sections, result['timestamp'], checklist_name)
+    ))
+    risk_df, checklist_df, parse_error = get_artifact(artifacts, "dataframes", lambda: run_traced(
+        render_trace, lambda: build_result_dataframes(result)
+    ))
+
+    notice = st.session_state.pop('analysis_notice', None)
+    if notice:
+        st.success(notice)
 
     st.markdown("---")
     st.header("📋 AI 위험성 평가 결과")
@@ -782,65 +3225,109 @@ def render_analysis_results():
     with col3:
         st.metric("분석 섹션", f"{len([s for s in sections.values() if s])-1}개")
 
+    # 구조화 응답 검증 결과
+    if result.get("validation_warnings"):
+        with st.expander(f"⚠️ 구조화 응답 검증 경고 {len(result['validation_warnings'])}건", expanded=False):
+            for warning in result["validation_warnings"]:
+                st.markdown(f"- {warning}")
+
+    # 실행 모드별 소요 시간 (병렬 모드는 샤드별 시간 포함)
+    if result.get("elapsed_seconds") is not None:
+        mode_label = ANALYSIS_MODES.get(result.get("execution_mode", "single"), "")
+        st.caption(f"⏱️ {mode_label} · 분석 소요 시간 {result['elapsed_seconds']}초")
+        if result.get("shard_stats"):
+            with st.expander(f"🧩 병렬 샤드별 소요 시간 ({len(result['shard_stats'])}개 요청)", expanded=False):
+                st.dataframe(pd.DataFrame(result["shard_stats"]).rename(columns={
+                    "name": "샤드", "elapsed_seconds": "소요 시간(초)", "characters": "응답 글자 수"
+                }), use_container_width=True, hide_index=True)
+        if result.get("map_stats"):
+            map_options = result.get("map_options", {})
+            phases = result.get("phase_seconds", {})
+            st.caption(
+                f"🗺️ 사진 {map_options.get('group_size')}장씩 {len(result['map_stats'])}개 묶음 · 동시 요청 {map_options.get('max_workers')}개 · "
+                f"{REDUCE_MODES.get(map_options.get('reduce'), '')} · 전처리 {phases.get('prepare')}초 → "
+                f"묶음 분석 {phases.get('map')}초 → 통합 {phases.get('reduce')}초"
+            )
+            with st.expander(f"🗺️ 사진 묶음별 소요 시간 ({len(result['map_stats'])}개 요청)", expanded=False):
+                st.dataframe(pd.DataFrame(result["map_stats"]).rename(columns={
+                    "name": "사진 묶음", "images": "사진 수", "elapsed_seconds": "소요 시간(초)", "characters": "응답 글자 수"
+                }), use_container_width=True, hide_index=True)
+    
+    # 토큰 사용량 및 비용
+    render_usage_summary(result)
+    render_triage_summary(result)
+
+    # 이미지 전처리 결과 (전송 용량 및 추정 토큰)
+    if result.get("image_stats"):
+        render_image_stats(result["image_stats"], result.get("image_names", []))
+
     # 섹션별 탭 생성
     tab1, tab2, tab3 = st.tabs([
-        "✅ SGR 체크리스트",
+        f"✅ {checklist_name}",
         "🔍 위험요인 분석", 
         "💡 추가 권장사항"
     ])
 
     with tab1:
-        st.subheader("📋 SGR 체크리스트 결과")
+        st.subheader(f"📋 {checklist_name} 결과")
         
         if sections.get("sgr_checklist"):
-            # 체크리스트 내용에 스타일 적용
-            formatted_checklist = format_checklist_content(sections["sgr_checklist"])
-            st.markdown(formatted_checklist, unsafe_allow_html=True)
+            # 체크리스트 내용에 스타일 적용 (실패하면 원문 그대로 표시)
+            try:
+                formatted_checklist = get_artifact(
+                    artifacts, "formatted_checklist", lambda: format_checklist_content(sections["sgr_checklist"])
+                )
+                st.markdown(formatted_checklist, unsafe_allow_html=True)
+            except Exception as e:
+                st.warning(f"⚠️ 체크리스트 표시 중 오류: {str(e)}")
+                st.text(sections["sgr_checklist"])
             
             # 다운로드 버튼
-            try:
-                checklist_df = parse_sgr_checklist_to_dataframe(sections["sgr_checklist"])
-                if checklist_df is not None and not checklist_df.empty:
-                    checklist_csv = checklist_df.to_csv(index=False, encoding='utf-8-sig')
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.download_button(
-                            label="📥 체크리스트 CSV 다운로드",
-                            data=checklist_csv.encode('utf-8-sig'),
-                            file_name=f"SGR체크리스트_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv",
-                            key="checklist_csv_download"
-                        )
-                    with col2:
-                        if "sgr_checklist" in section_files:
-                            st.download_button(
-                                label="📥 체크리스트 MD 다운로드",
-                                data=section_files["sgr_checklist"].encode('utf-8-sig'),
-                                file_name=f"SGR체크리스트_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
-                                mime="text/markdown",
-                                key="sgr_md_download"
-                            )
-                else:
-                    st.warning("⚠️ 체크리스트를 DataFrame으로 변환할 수 없습니다.")
-                    # MD 파일만 다운로드 제공
+            if parse_error:
+                st.warning(f"⚠️ 체크리스트 파싱 중 오류: {parse_error}")
+                # 오류 발생 시에도 MD 파일은 다운로드 가능하도록
+                if "sgr_checklist" in section_files:
+                    st.download_button(
+                        label="📥 체크리스트 MD 다운로드 (원본)",
+                        data=section_files["sgr_checklist"].encode('utf-8-sig'),
+                        file_name=f"{checklist_file_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                        mime="text/markdown",
+                        on_click="ignore",
+                        key="sgr_md_download_error"
+                    )
+            elif checklist_df is not None and not checklist_df.empty:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button(
+                        label="📥 체크리스트 CSV 다운로드",
+                        data=lazy_artifact(artifacts, "checklist_csv",
+                                           lambda: checklist_df.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')),
+                        file_name=f"{checklist_file_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        mime="text/csv",
+                        on_click="ignore",
+                        key="checklist_csv_download"
+                    )
+                with col2:
                     if "sgr_checklist" in section_files:
                         st.download_button(
                             label="📥 체크리스트 MD 다운로드",
                             data=section_files["sgr_checklist"].encode('utf-8-sig'),
-                            file_name=f"SGR체크리스트_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                            file_name=f"{checklist_file_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
                             mime="text/markdown",
-                            key="sgr_md_download_only"
+                            on_click="ignore",
+                            key="sgr_md_download"
                         )
-            except Exception as e:
-                st.warning(f"⚠️ 체크리스트 파싱 중 오류: {str(e)}")
-                # 오류 발생 시에도 MD 파일은 다운로드 가능하도록
+            else:
+                st.warning("⚠️ 체크리스트를 DataFrame으로 변환할 수 없습니다.")
+                # MD 파일만 다운로드 제공
                 if "sgr_checklist" in section_files:
                     st.download_button(
-                        label="📥 체크리스트 MD 다운로드 (원본)",
+                        label="📥 체크리스트 MD 다운로드",
                         data=section_files["sgr_checklist"].encode('utf-8-sig'),
-                        file_name=f"SGR체크리스트_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                        file_name=f"{checklist_file_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
                         mime="text/markdown",
-                        key="sgr_md_download_error"
+                        on_click="ignore",
+                        key="sgr_md_download_only"
                     )
         else:
             st.info("체크리스트 섹션의 내용을 찾을 수 없습니다.")
@@ -851,30 +3338,39 @@ def render_analysis_results():
         if sections.get("risk_analysis"):
             st.markdown(sections["risk_analysis"])
             
-            try:
-                risk_df = parse_risk_analysis_to_dataframe(sections["risk_analysis"])
-                if not risk_df.empty:
-                    risk_csv = risk_df.to_csv(index=False, encoding='utf-8-sig')
-                    col1, col2 = st.columns(2)
-                    with col1:
+            if parse_error:
+                st.warning(f"⚠️ 위험요인 분석 파싱 중 오류: {parse_error}")
+                if "risk_analysis" in section_files:
+                    st.download_button(
+                        label="📥 위험요인 분석 MD 다운로드 (원본)",
+                        data=section_files["risk_analysis"].encode('utf-8-sig'),
+                        file_name=f"위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                        mime="text/markdown",
+                        on_click="ignore",
+                        key="risk_md_download_error"
+                    )
+            elif risk_df is not None and not risk_df.empty:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button(
+                        label="📥 위험요인 분석 CSV 다운로드",
+                        data=lazy_artifact(artifacts, "risk_csv",
+                                           lambda: risk_df.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')),
+                        file_name=f"위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        mime="text/csv",
+                        on_click="ignore",
+                        key="risk_csv_download"
+                    )
+                with col2:
+                    if "risk_analysis" in section_files:
                         st.download_button(
-                            label="📥 위험요인 분석 CSV 다운로드",
-                            data=risk_csv.encode('utf-8-sig'),
-                            file_name=f"위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv",
-                            key="risk_csv_download"
+                            label="📥 위험요인 분석 MD 다운로드",
+                            data=section_files["risk_analysis"].encode('utf-8-sig'),
+                            file_name=f"위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                            mime="text/markdown",
+                            on_click="ignore",
+                            key="risk_md_download"
                         )
-                    with col2:
-                        if "risk_analysis" in section_files:
-                            st.download_button(
-                                label="📥 위험요인 분석 MD 다운로드",
-                                data=section_files["risk_analysis"].encode('utf-8-sig'),
-                                file_name=f"위험요인분석_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
-                                mime="text/markdown",
-                                key="risk_md_download"
-                            )
-            except Exception as e:
-                st.warning(f"⚠️ 위험요인 분석 파싱 중 오류: {str(e)}")
         else:
             st.info("위험요인 분석 섹션의 내용을 찾을 수 없습니다.")
 
@@ -889,25 +3385,104 @@ def render_analysis_results():
                     data=section_files["recommendations"].encode('utf-8-sig'),
                     file_name=f"추가권장사항_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
                     mime="text/markdown",
+                    on_click="ignore",
                     key="rec_download"
                 )
         else:
             st.info("추가 권장사항 섹션의 내용을 찾을 수 없습니다.")
 
-    # 전체 통합 다운로드
+    # 전체 통합 다운로드 (ZIP은 처음 다운로드할 때 한 번만 생성)
     if section_files:
         st.markdown("---")
         st.subheader("📦 전체 결과 통합 다운로드")
         
-        zip_data = create_zip_download(sections, result['timestamp'])
         st.download_button(
             label="📁 전체 결과 ZIP 다운로드 (MD + CSV 파일 포함)",
-            data=zip_data,
+            data=lazy_artifact(artifacts, "zip",
+                               lambda: run_traced(render_trace, lambda: create_zip_download(
+                                   sections, result['timestamp'], risk_df, checklist_df,
+                                   metadata=build_result_metadata(result)))),
             file_name=f"위험성평가결과_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
             mime="application/zip",
+            on_click="ignore",
             key="zip_download"
         )
 
+def get_trace_total_ms(trace: dict) -> float:
+    """저장된 trace의 마지막 구간 종료 시점(ms)을 반환하는 함수"""
+    return max((span["start_ms"] + span["duration_ms"] for span in trace.get("spans", [])), default=0.0)
+
+@st.cache_data(show_spinner=False)
+def load_trace_summary(log_path: str, size: int, mtime_ns: int) -> pd.DataFrame:
+    """JSONL 계측 로그에서 구간별 호출 수와 p50/p95 소요 시간, API 구간의 프롬프트 캐시 적중률을 집계하는 함수 (로그가 바뀌면 다시 계산)"""
+    spans = pd.read_json(log_path, lines=True)
+    durations = spans.groupby("stage")["duration_ms"]
+    summary = pd.DataFrame({
+        "횟수": durations.size(),
+        "p50(ms)": durations.quantile(0.5).round(1),
+        "p95(ms)": durations.quantile(0.95).round(1),
+    })
+    if {"prompt_tokens", "cached_tokens"} <= set(spans.columns):
+        tokens = spans.groupby("stage")[["prompt_tokens", "cached_tokens"]].sum(min_count=1)
+        summary["캐시 적중률"] = (tokens["cached_tokens"] / tokens["prompt_tokens"]).round(3)
+    return summary.sort_values("p95(ms)", ascending=False)
+
+def render_trace_waterfall(result: dict):
+    """현재 분석 결과의 구간별 소요 시간을 워터폴 차트로 표시하는 함수"""
+    spans = list((result.get("trace") or {}).get("spans", []))
+    artifacts = st.session_state.get('result_artifacts') or {}
+    if artifacts.get('result_id') == result.get('result_id') and 'render_trace' in artifacts:
+        spans += artifacts['render_trace'].to_dict()["spans"]
+    if not spans:
+        st.caption("이 결과에는 구간 계측 정보가 없습니다.")
+        return
+    
+    rows = [{
+        "구간": f"{span['stage']} · {span['item']}" if span.get("item") else span["stage"],
+        "단계": span["phase"],
+        "시작(ms)": span["start_ms"],
+        "종료(ms)": span["start_ms"] + span["duration_ms"],
+        "소요(ms)": span["duration_ms"],
+    } for span in spans]
+    st.caption(f"전체 {get_trace_total_ms({'spans': spans}) / 1000:.2f}초 · 구간 {len(spans)}개")
+    st.vega_lite_chart(pd.DataFrame(rows), {
+        "mark": {"type": "bar", "tooltip": True},
+        "encoding": {
+            "y": {"field": "구간", "type": "nominal", "sort": None, "title": None},
+            "x": {"field": "시작(ms)", "type": "quantitative", "title": "ms"},
+            "x2": {"field": "종료(ms)"},
+            "color": {"field": "단계", "type": "nominal", "legend": None},
+        },
+    }, use_container_width=True)
+    
+    totals = pd.DataFrame(rows).groupby("구간")["소요(ms)"].agg(["count", "sum"]).round(1)
+    with st.expander("구간별 합계", expanded=False):
+        st.dataframe(totals.sort_values("sum", ascending=False), use_container_width=True)
+
+def render_trace_log_summary():
+    """누적 계측 로그의 구간별 p50/p95를 표시하는 함수"""
+    if not os.path.exists(TRACE_LOG_PATH):
+        st.caption("아직 기록된 계측 로그가 없습니다.")
+        return
+    stat = os.stat(TRACE_LOG_PATH)
+    with st.expander("누적 로그 p50/p95", expanded=False):
+        st.dataframe(load_trace_summary(TRACE_LOG_PATH, stat.st_size, stat.st_mtime_ns), use_container_width=True)
+        st.caption(f"로그 파일: `{TRACE_LOG_PATH}` (최대 {JSONL_LOG_MAX_BYTES // (1024 * 1024)}MB, 이전 기록은 "
+                   f"`.1`~`.{JSONL_LOG_BACKUP_COUNT}` 백업 파일)")
+
+def render_scheduler_status():
+    """모델별 API 요청 스케줄러의 대기열 길이, 대기 시간, 재시도 횟수를 표시하는 함수"""
+    snapshots = get_scheduler_snapshots()
+    if not snapshots:
+        st.caption("아직 API 요청이 없습니다.")
+        return
+    st.dataframe(pd.DataFrame(snapshots).set_index("name").rename(columns={
+        "rpm": "RPM 한도", "tpm": "TPM 한도", "queue_depth": "대기", "in_flight": "전송 중",
+        "available_requests": "남은 요청", "available_tokens": "남은 토큰", "cooldown_seconds": "휴지(초)",
+        "avg_wait_seconds": "평균 대기(초)", "p95_wait_seconds": "p95 대기(초)",
+        "requests": "요청", "throttled": "대기 발생", "retries": "재시도", "failures": "실패", "refunded_tokens": "반환 토큰",
+    }).T, use_container_width=True)
+
 def render_sidebar():
     """사이드바 렌더링"""
     with st.sidebar:
@@ -923,14 +3498,123 @@ def render_sidebar():
         client = initialize_openai_client()
         if client:
             st.success("✅ OpenAI API 연결됨")
+            warm_up = get_warm_up_status(client)
+            if warm_up and warm_up["done"]:
+                if warm_up["errors"]:
+                    st.caption(f"🔌 연결 예열 실패: {warm_up['errors'][0]}")
+                else:
+                    st.caption(f"🔌 연결 {warm_up['connections']}개 예열됨 ({warm_up['elapsed_seconds'] * 1000:.0f}ms)")
         else:
             st.error("❌ OpenAI API 연결 실패")
         
-        # 체크리스트 미리보기
-        st.markdown("### 📋 SGR 체크리스트 미리보기")
-        checklist = load_predefined_checklist()
+        # 이미지 전처리 설정
+        st.markdown("### 🖼️ 이미지 전처리 설정")
+        st.slider(
+            "긴 변 최대 크기 (px)", min_value=512, max_value=IMAGE_MAX_EDGE_LIMIT, value=IMAGE_MAX_EDGE, step=64,
+            key="image_max_edge",
+            help="업로드 사진을 이 크기 이하로 축소한 뒤 전송합니다."
+        )
+        st.selectbox("전송 이미지 형식", options=list(IMAGE_FORMATS.keys()), key="image_format")
+        st.slider("압축 품질", min_value=50, max_value=95, value=IMAGE_QUALITY, step=5, key="image_quality")
+        
+        # 분석 실행 옵션
+        st.markdown("### 🚀 분석 실행 옵션")
+        st.radio(
+            "실행 모드", options=list(ANALYSIS_MODES.keys()),
+            format_func=lambda mode: ANALYSIS_MODES[mode], key="analysis_mode",
+            help="대분류 병렬 모드는 체크리스트 대분류별로 동시에 요청하여 대기 시간을 줄이지만, 이미지가 요청마다 전송되어 비용이 늘어납니다. "
+                 "사진 묶음별 분석은 사진을 묶음으로 나누어 동시에 분석한 뒤 합치므로 사진이 10장 이상일 때 적합합니다."
+        )
+        if st.session_state.get("analysis_mode") == "mapreduce":
+            st.slider("묶음당 사진 수", min_value=1, max_value=4, value=MAP_GROUP_SIZE, key="map_group_size",
+                      help="요청 1개에 함께 보낼 사진 수입니다. 작을수록 요청이 작아지지만 요청 수가 늘어납니다.")
+            st.slider("동시 요청 수", min_value=1, max_value=8, value=MAP_MAX_WORKERS, key="map_max_workers",
+                      help="묶음 분석 요청을 동시에 보낼 최대 개수입니다. API 요청 한도는 공용 스케줄러가 지킵니다.")
+            st.radio("통합 방식", options=list(REDUCE_MODES.keys()), format_func=lambda mode: REDUCE_MODES[mode],
+                     key="map_reduce_mode",
+                     help="체크리스트 판정은 항상 로컬 규칙(미준수 우선)으로 합치고, 작업 환경/위험요인/권장사항의 통합 방식을 선택합니다.")
+        st.selectbox(
+            "출력 형식", options=list(OUTPUT_FORMATS.keys()),
+            format_func=lambda output_format: OUTPUT_FORMATS[output_format], key="output_format",
+            help="구조화 JSON은 응답을 스키마로 검증한 뒤 표를 직접 생성합니다. (단일 요청 모드 전용, 스트리밍 미지원)"
+        )
+        st.toggle(
+            "실시간 스트리밍 표시", value=True, key="stream_analysis",
+            help="분석 결과를 생성되는 대로 섹션별로 먼저 보여줍니다."
+        )
+        st.toggle(
+            "사전 분류로 해당 없는 대분류 제외", value=False, key="use_triage",
+            help=f"{TRIAGE_MODEL}로 축소 이미지의 현장 유형을 먼저 분류하고, 해당 가능성이 없는 대분류 항목은 '해당없음'으로 채웁니다."
+        )
+        st.number_input(
+            "분석 1회 입력 토큰 예산", min_value=1000, max_value=500000, value=PROMPT_TOKEN_BUDGET, step=1000,
+            key="token_budget",
+            help="전송 전 추정한 입력 토큰이 이 값을 넘으면 경고합니다."
+        )
+        st.toggle(
+            "예산 초과 시 이미지 자동 축소", value=True, key="auto_downscale",
+            help=f"이미지 긴 변을 {', '.join(map(str, DOWNSCALE_MAX_EDGES))}px 순으로 줄여 예산에 맞춥니다."
+        )
+        
+        # 분석 결과 캐시 정보
+        st.markdown("### 🗄️ 분석 결과 캐시")
+        try:
+            cache_stats = get_analysis_cache_stats()
+            st.caption(f"저장된 결과 {cache_stats['entries']}건 · {cache_stats['bytes'] / 1024:.1f}KB")
+            if st.button("🧹 캐시 비우기", key="clear_analysis_cache"):
+                clear_analysis_cache()
+                st.rerun()
+        except sqlite3.Error as e:
+            st.warning(f"⚠️ 캐시 DB 접근 오류: {str(e)}")
+        
+        # 분석 작업 대기열 현황
+        st.markdown("### 🗂️ 분석 작업 현황")
+        try:
+            job_counts = get_job_counts()
+            st.caption(" · ".join(f"{label} {job_counts[status]}건" for status, label in ANALYSIS_JOB_STATUSES.items()))
+            coalescing = get_coalescing_stats()
+            st.caption(f"🔗 동일 요청 합치기 - 요청 {coalescing['requests']}건 중 {coalescing['coalesced']}건 합침 "
+                       f"(진행 중 분석 {coalescing['in_flight']}건)")
+        except sqlite3.Error as e:
+            st.warning(f"⚠️ 작업 DB 접근 오류: {str(e)}")
+        
+        # API 요청 스케줄러 현황 (모델별 대기열, 대기 시간, 재시도)
+        st.markdown("### 🚦 API 요청 대기열")
+        render_scheduler_status()
+        
+        # 실행 구간 계측 (최근 분석 워터폴 + 누적 로그 통계)
+        st.markdown("### ⏱️ 실행 구간 분석")
+        if st.session_state.get('analysis_result'):
+            render_trace_waterfall(st.session_state['analysis_result'])
+        try:
+            render_trace_log_summary()
+        except ValueError as e:
+            st.warning(f"⚠️ 계측 로그를 읽을 수 없습니다: {str(e)}")
+        
+        # 체크리스트 선택 및 미리보기
+        st.markdown("### 📋 체크리스트 미리보기")
+        checklist_sources = get_checklist_sources()
+        prewarm = prewarm_checklist_sources(get_checklist_source_files())
+        st.selectbox(
+            "체크리스트", options=[CHECKLIST_AUTO_DETECT] + list(checklist_sources.keys()),
+            format_func=lambda key: "자동 감지" if key == CHECKLIST_AUTO_DETECT else checklist_sources[key]["label"],
+            key="checklist_source",
+            help="자동 감지는 사진 파일 이름과 현장 설명에 나온 사업 부문 키워드로 체크리스트를 고릅니다."
+        )
+        if st.session_state.get("checklist_source", CHECKLIST_AUTO_DETECT) == CHECKLIST_AUTO_DETECT:
+            st.text_input("현장/작업 설명 (자동 감지용)", key="site_description",
+                          placeholder="예: 통합국 수변전 설비 점검")
+        source_key, reason = resolve_checklist_source()
+        st.caption(f"사용 중: {checklist_sources[source_key]['label']} · {reason}")
+        if not prewarm["done"]:
+            st.caption(f"⏳ 체크리스트 미리 준비 중 ({prewarm['compiled']}/{len(checklist_sources)})")
+        elif prewarm["failed"]:
+            failed_labels = [checklist_sources[key]['label'] for key in prewarm['failed'] if key in checklist_sources]
+            st.caption(f"⚠️ 미리 준비하지 못한 체크리스트: {', '.join(failed_labels)}")
+        checklist = load_predefined_checklist(source_key)
         if not checklist.empty:
             st.success(f"✅ {len(checklist)}개 항목 로드됨")
+            st.caption(f"체크리스트 버전 `{get_checklist_artifact(source_key).content_hash[:12]}`")
             
             # 대분류별 통계
             category_counts = checklist['대분류'].value_counts()
@@ -962,17 +3646,13 @@ def render_sidebar():
         - OpenAI API 키 설정
         """)
         
-        st.markdown("### 📄 체크리스트 구조")
-        st.markdown("""
-        **대분류별 구성:**
-        - **SGR 준수** (9개 항목)
-        - **유해위험물** (4개 항목)  
-        - **중량물 이동** (6개 항목)
-        - **화기 작업** (5개 항목)
-        - **3대 사고 예방 조치** (12개 항목)
-        
-        총 **36개 세부 체크리스트 항목**으로 구성되어 있습니다.
-        """)
+        # 현재 사용 중인 체크리스트의 대분류별 구성
+        if not checklist.empty:
+            st.markdown("### 📄 체크리스트 구조")
+            category_lines = '\n'.join(f"- **{category}** ({count}개 항목)"
+                                       for category, count in checklist.groupby('대분류', sort=False).size().items())
+            st.markdown(f"**{get_checklist_name(checklist)} 대분류별 구성:**\n{category_lines}\n\n"
+                        f"총 **{len(checklist)}개 세부 체크리스트 항목**으로 구성되어 있습니다.")
 
 # 메인 앱 실행
 def main():
@@ -986,14 +3666,14 @@ def main():
     # 헤더 렌더링
     render_header()
     
-    # 체크리스트 로드
-    checklist = load_predefined_checklist()
+    # 체크리스트 로드 (사이드바에서 선택하거나 자동 감지한 원본)
+    checklist = load_predefined_checklist(resolve_checklist_source()[0])
     
     # 이미지 업로드 섹션
     uploaded_images = render_image_upload()
     
-    # 이미지 미리보기
-    render_image_preview(uploaded_images)
+    # 이미지 미리보기 (품질 점검에서 제외된 사진은 분석 대상에서 빠짐)
+    uploaded_images = render_image_preview(uploaded_images)
     
     # 분석 버튼 및 실행
     if uploaded_images:
@@ -1005,6 +3685,10 @@ def main():
         </div>
         """, unsafe_allow_html=True)
     
+    # 진행 중인 분석 작업 상태 (새로고침 후에도 작업 ID로 다시 연결)
+    if st.session_state.get('analysis_job_id'):
+        render_analysis_job_status()
+    
     # 분석 결과 표시
     render_analysis_results()
 
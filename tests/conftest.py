@@ -0,0 +1,44 @@
+"""pytest 공용 fixture: Streamlit 앱 파일을 모듈로 불러와 함수 단위로 검사 (bare 모드로 실행되어 화면 출력은 무시됨)"""
+import importlib.util
+import logging
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXT_APP_FILE = "text_risk_assessment_app_0723_v0.1.py"
+VISION_APP_FILE = "streamlit_safety_tool_0731_F.py"
+
+sys.path.insert(0, REPO_ROOT)
+
+
+def load_app(file_name: str, module_name: str):
+    """앱 파일을 모듈로 불러오는 함수"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_environment(tmp_path_factory):
+    """캐시와 로그는 임시 폴더에 쓰고, API 키 없이 저장소 루트 기준 상대 경로로 실행"""
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv("APP_CACHE_FOLDER", str(tmp_path_factory.mktemp("app-cache")))
+    monkeypatch.setenv("OPENAI_WARMUP", "0")
+    monkeypatch.chdir(REPO_ROOT)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    yield
+    monkeypatch.undo()
+
+
+@pytest.fixture(scope="session")
+def text_app(app_environment):
+    return load_app(TEXT_APP_FILE, "text_app")
+
+
+@pytest.fixture(scope="session")
+def vision_app(app_environment):
+    return load_app(VISION_APP_FILE, "vision_app")
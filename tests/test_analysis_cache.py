@@ -0,0 +1,34 @@
+"""분석 결과 캐시 검사: 캐시 키는 사진 내용으로 정해지고, 캐시 결과에는 이번 업로드 이름을 표시해야 하며, 깨진 결과는 표 대신 오류를 돌려줘야 함"""
+
+
+def test_cache_hit_uses_current_image_names(vision_app):
+    checklist = vision_app.create_default_checklist()
+    image_bytes = [b"photo-a", b"photo-b"]
+    cache_key = vision_app.compute_analysis_cache_key(image_bytes, checklist)
+    vision_app.store_cached_analysis(cache_key, {"image_names": ["old_a.jpg", "old_b.jpg"], "sections": {}})
+
+    result = vision_app.run_analysis_with_cache([], checklist, ["new_a.jpg", "new_b.jpg"], image_bytes)
+    assert result["cache_hit"] is True
+    assert result["image_names"] == ["new_a.jpg", "new_b.jpg"]
+
+
+def test_cache_key_ignores_upload_order(vision_app):
+    checklist = vision_app.create_default_checklist()
+    assert (vision_app.compute_analysis_cache_key([b"a", b"b"], checklist)
+            == vision_app.compute_analysis_cache_key([b"b", b"a"], checklist))
+
+
+def test_cache_key_changes_with_inputs(vision_app):
+    checklist = vision_app.create_default_checklist()
+    base_key = vision_app.compute_analysis_cache_key([b"a"], checklist)
+    assert vision_app.compute_analysis_cache_key([b"c"], checklist) != base_key
+    assert vision_app.compute_analysis_cache_key([b"a"], checklist.head(3)) != base_key
+    assert vision_app.compute_analysis_cache_key([b"a"], checklist, execution_mode="sharded") != base_key
+    assert vision_app.compute_analysis_cache_key([b"a"], checklist, triage=True) != base_key
+
+
+def test_malformed_result_returns_parse_error(vision_app):
+    result = {"structured": {"risks": "깨진 응답"}, "checklist_items": [{"번호": 1}], "sections": {}}
+    risk_df, checklist_df, parse_error = vision_app.build_result_dataframes(result)
+    assert risk_df is None and checklist_df is None
+    assert parse_error
@@ -0,0 +1,81 @@
+"""분석 작업 DB 검사: 종료된 프로세스의 작업만 실패로 표시하고, 작업은 등록 시의 체크리스트 이름과 이번 업로드 이름을 표시해야 함"""
+import io
+import json
+import os
+import threading
+import time
+from contextlib import closing
+
+from PIL import Image
+
+
+def insert_job(vision_app, job_id, owner_id, status="running"):
+    with closing(vision_app.open_job_store()) as conn, conn:
+        conn.execute(
+            "INSERT INTO analysis_jobs (job_id, status, image_names, created_at, owner_id) VALUES (?, ?, ?, ?, ?)",
+            (job_id, status, json.dumps(["현장.jpg"]), time.time(), owner_id)
+        )
+
+
+def test_current_process_owns_its_jobs(vision_app):
+    owner_id = vision_app.get_job_owner_id()
+    assert owner_id.startswith(f"{os.getpid()}:")
+    assert vision_app.is_job_owner_alive(owner_id)
+    assert not vision_app.is_job_owner_alive(None)
+
+
+def test_reap_only_jobs_of_exited_owners(vision_app):
+    pid, _, marker = vision_app.get_job_owner_id().partition(":")
+    insert_job(vision_app, "job-alive", vision_app.get_job_owner_id())
+    insert_job(vision_app, "job-reused-pid", f"{pid}:{marker}0", status="queued")
+    insert_job(vision_app, "job-legacy", None)
+
+    assert vision_app.reap_orphaned_jobs() == 2
+    assert vision_app.get_job("job-alive")["status"] == "running"
+    assert vision_app.get_job("job-reused-pid")["status"] == "failed"
+    assert vision_app.get_job("job-legacy")["status"] == "failed"
+
+
+def test_coalesced_job_shows_current_image_names(vision_app, monkeypatch):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "orange").save(buffer, format="PNG")
+    image_bytes = [buffer.getvalue()]
+    checklist = vision_app.create_default_checklist()
+    release = threading.Event()
+
+    def slow_analysis(images, checklist, image_names, image_bytes, **kwargs):
+        release.wait(10)
+        return {"image_names": image_names, "timestamp": "2025-07-31 10:00:00", "sections": {}}
+
+    monkeypatch.setattr(vision_app, "run_analysis_with_cache", slow_analysis)
+    first_id, first_coalesced = vision_app.submit_analysis_job(image_bytes, ["첫번째.png"], checklist, {},
+                                                               token_estimate={"prompt_tokens": 1})
+    second_id, second_coalesced = vision_app.submit_analysis_job(image_bytes, ["두번째.png"], checklist, {},
+                                                                 token_estimate={"prompt_tokens": 2})
+    release.set()
+    assert (first_coalesced, second_coalesced) == (False, True)
+    assert second_id == first_id
+
+    deadline = time.time() + 10
+    while vision_app.get_job(first_id)["status"] != "done" and time.time() < deadline:
+        time.sleep(0.05)
+    job = vision_app.get_job(first_id)
+    assert job["result"]["image_names"] == ["첫번째.png"]
+
+    session_state = {"analysis_job_overrides": {"image_names": ["두번째.png"], "token_estimate": {"prompt_tokens": 2}}}
+    monkeypatch.setattr(vision_app.st, "session_state", session_state)
+    vision_app.finish_analysis_job(job)
+    result = session_state["analysis_result"]
+    assert result["image_names"] == ["두번째.png"]
+    assert result["token_estimate"] == {"prompt_tokens": 2}
+
+
+def test_job_keeps_the_checklist_name_it_was_submitted_with(vision_app, monkeypatch):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "purple").save(buffer, format="PNG")
+    checklist = vision_app.create_default_checklist()
+    checklist.attrs["checklist_name"] = "송전 체크리스트"
+    monkeypatch.setattr(vision_app, "run_analysis_with_cache", lambda *args, **kwargs: {"sections": {}})
+
+    job_id, _ = vision_app.submit_analysis_job([buffer.getvalue()], ["현장.png"], checklist, {})
+    assert vision_app.get_job(job_id)["checklist_name"] == "송전 체크리스트"
@@ -0,0 +1,22 @@
+"""공용 도구 검사: 두 앱이 같은 표 변환/토큰 추정/비용 계산 함수를 써야 함"""
+import pandas as pd
+
+import analysis_utils
+
+
+def test_apps_share_helpers(text_app, vision_app):
+    for name in ("dataframe_to_markdown_table", "estimate_text_tokens", "extract_usage", "estimate_cost_usd"):
+        assert getattr(text_app, name) is getattr(analysis_utils, name)
+        assert getattr(vision_app, name) is getattr(analysis_utils, name)
+
+
+def test_markdown_table_escapes_cells():
+    table = analysis_utils.dataframe_to_markdown_table(pd.DataFrame({"항목": ["a|b", "줄\n바꿈"]}))
+    assert table.splitlines() == ["| 항목 |", "|------|", "| a\\|b |", "| 줄 바꿈 |"]
+
+
+def test_cost_uses_model_pricing():
+    usage = {"prompt_tokens": 1_000_000, "cached_tokens": 0, "completion_tokens": 0}
+    assert analysis_utils.estimate_cost_usd(usage, "gpt-4.1") == 2.0
+    assert analysis_utils.estimate_cost_usd(usage, "gpt-4o-mini") == 0.15
+    assert analysis_utils.estimate_cost_usd(usage, "unknown-model") is None
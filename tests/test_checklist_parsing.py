@@ -0,0 +1,47 @@
+"""체크리스트 시트 파싱 검사: SGR 체크리스트와 SKONS 위험성평가 양식에서 항목을 골라내야 함"""
+import pandas as pd
+
+
+def test_sgr_sheet_keeps_numbered_and_keyword_items(vision_app):
+    sheet = pd.DataFrame({
+        "A": ["구분", "SGR 준수", None, None, "화기\n작업", None],
+        "B": ["점검 항목", "1) 안전보호구를 착용한다.", "비고: 현장 확인", "2) 위험성평가를 시행한다.",
+              "화기 작업 시 소화기를 비치한다.", "20) 번호가 범위를 벗어난 항목"],
+    })
+    checklist = vision_app.parse_checklist_sheet(sheet)
+    assert checklist.to_dict("records") == [
+        {"번호": 1, "대분류": "SGR 준수", "소분류": "안전보호구를 착용한다."},
+        {"번호": 2, "대분류": "SGR 준수", "소분류": "위험성평가를 시행한다."},
+        {"번호": 3, "대분류": "화기 작업", "소분류": "화기 작업 시 소화기를 비치한다."},
+    ]
+
+
+def test_skons_sheet_groups_countermeasures_by_accident_type(vision_app):
+    sheet = pd.DataFrame([
+        ["SKONS 위험성평가", None, None],
+        ["No", "재해유형", "위험성 감소 대책"],
+        [1, "떨어짐", "- 안전대 착용\n- 작업발판 설치"],
+        [2, "떨어짐", "- 안전대 착용"],
+        [3, "감전", "o 절연장갑 착용"],
+        [4, "nan", "- 무시할 행"],
+    ])
+    checklist = vision_app.parse_skons_sheet(sheet)
+    assert checklist.to_dict("records") == [
+        {"번호": 1, "대분류": "떨어짐", "소분류": "안전대 착용"},
+        {"번호": 2, "대분류": "떨어짐", "소분류": "작업발판 설치"},
+        {"번호": 3, "대분류": "감전", "소분류": "절연장갑 착용"},
+    ]
+
+
+def test_skons_sheet_without_header_is_empty(vision_app):
+    assert vision_app.parse_skons_sheet(pd.DataFrame([["제목", "내용"], ["a", "b"]])).empty
+
+
+def test_checklist_table_round_trips_through_parser(vision_app):
+    table = vision_app.build_checklist_table([
+        (2, "| 2 | SGR 준수 | 위험성평가 시행 | X | 기록 없음 |"),
+        (1, "| 1 | SGR 준수 | 보호구 착용 | O | 안전모 착용 확인 |"),
+    ])
+    parsed = vision_app.parse_sgr_checklist_to_dataframe(table)
+    assert parsed["번호"].astype(str).tolist() == ["1", "2"]
+    assert parsed["준수여부"].tolist() == ["O", "X"]
@@ -0,0 +1,37 @@
+"""체크리스트 원본 검사: 원본별 표시 이름이 프롬프트와 보고서 제목에 쓰여야 함"""
+import pytest
+
+
+@pytest.fixture(scope="module")
+def checklist_sources(vision_app):
+    return vision_app.get_checklist_sources()
+
+
+def test_sources_have_display_names(vision_app, checklist_sources):
+    assert checklist_sources[vision_app.DEFAULT_CHECKLIST_SOURCE]["name"] == vision_app.DEFAULT_CHECKLIST_NAME
+    assert all(source["name"].endswith("체크리스트") for source in checklist_sources.values())
+
+
+def test_skons_prompts_use_source_name(vision_app, checklist_sources):
+    skons_keys = [key for key, source in checklist_sources.items() if source["kind"] == "skons"]
+    if not skons_keys:
+        pytest.skip("SKONS 위험성평가 양식 파일이 없습니다.")
+    artifact = vision_app.get_checklist_artifact(skons_keys[0])
+    checklist = artifact.checklist.copy()
+    assert artifact.name == checklist_sources[skons_keys[0]]["name"]
+
+    prefix, _ = vision_app.build_comprehensive_prompt(1, ["현장.jpg"], checklist)
+    assert f"## 2. {artifact.name} 항목별 통합 체크 결과" in prefix
+    assert "SGR 체크리스트" not in prefix
+    shard = vision_app.build_analysis_shards(checklist)[1]
+    assert shard["name"].startswith(artifact.name)
+    assert artifact.name in vision_app.build_shard_prompt(shard, 1, ["현장.jpg"])[0]
+    assert artifact.name in vision_app.build_triage_prompt(checklist)
+
+
+def test_report_header_round_trips_through_parser(vision_app):
+    sections = {"work_environment": "", "risk_analysis": "", "recommendations": "",
+                "sgr_checklist": "| 번호 | 대분류 | 소분류 | 준수여부 | 세부 내용 |\n|---|---|---|---|---|\n| 1 | 감전 | 절연장갑 착용 | O | 확인 |"}
+    report = vision_app.build_report_from_sections(sections, "SKONS 전송망 체크리스트")
+    assert "## 2. SKONS 전송망 체크리스트 항목별 통합 체크 결과" in report
+    assert "절연장갑" in vision_app.parse_analysis_sections(report)["sgr_checklist"]
@@ -0,0 +1,71 @@
+"""참조 양식 작업 일치(즉시 생성) 검사: 화면 예시 문구가 엉뚱한 작업으로 확정되지 않아야 함"""
+import os
+
+import pytest
+
+PLACEHOLDER_EXAMPLE = "오늘 철탑에서 안테나 재설치 작업이 있어 위험성 평가 안내해줘"
+MANHOLE_EXAMPLE = "지하 맨홀에서 케이블 교체 작업을 진행할 예정입니다"
+HIGH_VOLTAGE_EXAMPLE = "고압 전선 근처에서 장비 설치 작업이 예정되어 있습니다"
+
+
+@pytest.fixture(scope="module")
+def task_index(text_app):
+    file_path = os.path.join(text_app.REFERENCE_FILES_FOLDER, text_app.DEFAULT_REFERENCE_FILE)
+    return text_app.get_reference_index(file_path)["task_index"]
+
+
+@pytest.fixture(scope="module")
+def risk_records(text_app):
+    file_path = os.path.join(text_app.REFERENCE_FILES_FOLDER, text_app.DEFAULT_REFERENCE_FILE)
+    return text_app.get_reference_index(file_path)["risk_records"]
+
+
+def test_placeholder_includes_tower_work_at_height(text_app, task_index, risk_records):
+    match = text_app.match_reference_tasks(task_index, PLACEHOLDER_EXAMPLE)
+    assert "고소작업(철탑/강관주/CP주 건립, 해체, 보강)" in match["tasks"]
+    assert "떨어짐" in {risk_records[position]["accident_type"] for position in match["positions"]}
+    assert match["confidence"] < text_app.FAST_PATH_CONFIDENCE
+
+
+@pytest.mark.parametrize("work_description", [MANHOLE_EXAMPLE, "맨홀 케이블 교체"])
+def test_manhole_cable_is_not_torch_work(text_app, task_index, work_description):
+    match = text_app.match_reference_tasks(task_index, work_description)
+    assert "외부 토치 작업(광케이블)" not in match["tasks"]
+    assert any(task.startswith("밀폐공간") for task in match["tasks"])
+    assert match["confidence"] < text_app.FAST_PATH_CONFIDENCE
+
+
+def test_high_voltage_is_not_fire_or_gas_work(text_app, task_index):
+    match = text_app.match_reference_tasks(task_index, HIGH_VOLTAGE_EXAMPLE)
+    assert not any(task.startswith("화기/가스") for task in match["tasks"])
+    assert match["confidence"] < text_app.FAST_PATH_CONFIDENCE
+
+
+def test_common_words_are_not_indexed(text_app, task_index):
+    # 여러 작업 이름에 흔히 나오는 단어는 작업을 가르지 못하므로 일치 근거로 쓰지 않음
+    assert "지하철" not in task_index["idf"]
+    assert "맨홀" in task_index["idf"]
+
+
+@pytest.mark.parametrize("work_description, task", [
+    ("축전지 교체", "축전지 점검 및 시설"),
+    ("고압 전기 활선 작업", None),
+])
+def test_clear_description_reaches_threshold(text_app, task_index, work_description, task):
+    match = text_app.match_reference_tasks(task_index, work_description)
+    assert len(match["tasks"]) == 1
+    if task:
+        assert match["tasks"] == [task]
+    assert match["confidence"] >= text_app.FAST_PATH_CONFIDENCE
+
+
+def test_confirmed_tasks_replace_positions(text_app, task_index, risk_records):
+    match = {**text_app.match_reference_tasks(task_index, MANHOLE_EXAMPLE), "reference": "참조",
+             "risk_records": risk_records, "task_index": task_index}
+    task = task_index["names"][0]
+    confirmed = text_app.confirm_fast_path_tasks(match, [task])
+    assert confirmed["confirmed"] is True
+    assert confirmed["positions"] == task_index["positions"][0]
+    result = text_app.build_fast_risk_guide(MANHOLE_EXAMPLE, [], confirmed)
+    assert result["fast_path"]["confirmed"] is True
+    assert {risk["task"] for risk in result["structured"]["risks"]} == {task}
@@ -0,0 +1,19 @@
+"""JSONL 로그 회전 검사: 크기 상한을 넘으면 백업으로 밀어내고, 백업 수는 JSONL_LOG_BACKUP_COUNT를 넘지 않아야 함"""
+import json
+import os
+
+
+def test_log_rotates_when_size_limit_exceeded(vision_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(vision_app, "JSONL_LOG_MAX_BYTES", 200)
+    monkeypatch.setattr(vision_app, "JSONL_LOG_BACKUP_COUNT", 2)
+    log_path = str(tmp_path / "trace_log.jsonl")
+
+    for index in range(20):
+        vision_app.append_jsonl_log(log_path, [{"index": index, "stage": "x" * 40}])
+
+    assert os.path.getsize(log_path) <= 200
+    assert os.path.exists(log_path + ".1") and os.path.exists(log_path + ".2")
+    assert not os.path.exists(log_path + ".3")
+    with open(log_path, encoding="utf-8") as f:
+        last = [json.loads(line) for line in f][-1]
+    assert last["index"] == 19
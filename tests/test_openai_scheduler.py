@@ -0,0 +1,79 @@
+"""공용 요청 스케줄러 검사: 토큰 버킷, 사용량 반환, 응답 헤더 한도, 스트리밍 슬롯 유지"""
+from types import SimpleNamespace
+
+import openai_scheduler
+from openai_scheduler import RequestScheduler, ScheduledStream, TokenBucket
+
+
+def make_response(total_tokens):
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.time_until(30) == 30.0
+    bucket.refund(20)
+    assert bucket.time_until(30) == 10.0
+
+
+def test_token_bucket_caps_requests_larger_than_capacity():
+    bucket = TokenBucket(100)
+    assert bucket.time_until(1000) == 0.0
+    bucket.consume(1000)
+    assert bucket.available == 0.0
+
+
+def test_unused_reservation_is_refunded():
+    scheduler = RequestScheduler("test", rpm=100, tpm=10000)
+    scheduler.call(lambda request_id: make_response(1500), tokens=6000)
+    snapshot = scheduler.snapshot()
+    assert 8400 <= snapshot["available_tokens"] <= 8600
+    assert snapshot["refunded_tokens"] == 4500
+    assert snapshot["in_flight"] == 0
+
+
+def test_limits_follow_rate_limit_headers():
+    scheduler = RequestScheduler("test", rpm=100, tpm=10000, fixed_limits=("rpm",))
+    scheduler.update_limits({"x-ratelimit-limit-requests": "5000", "x-ratelimit-limit-tokens": "450000"})
+    assert scheduler.rpm == 100
+    assert scheduler.tpm == 450000
+    assert scheduler.snapshot()["available_tokens"] == 450000
+
+
+def test_environment_limits_are_fixed(monkeypatch):
+    monkeypatch.setenv("OPENAI_TPM_LIMIT", "1234")
+    monkeypatch.delenv("OPENAI_RPM_LIMIT", raising=False)
+    limit = openai_scheduler.get_rate_limit("gpt-4.1")
+    assert limit["tpm"] == 1234
+    assert limit["fixed_limits"] == ("tpm",)
+
+
+def test_stream_holds_slot_until_exhausted():
+    scheduler = RequestScheduler("test", rpm=100, tpm=10000)
+    chunks = [SimpleNamespace(usage=None), make_response(1000)]
+    stream = scheduler.call(lambda request_id: iter(chunks), tokens=3000, stream=True)
+    assert isinstance(stream, ScheduledStream)
+    assert scheduler.snapshot()["in_flight"] == 1
+    assert list(stream) == chunks
+    snapshot = scheduler.snapshot()
+    assert snapshot["in_flight"] == 0
+    assert snapshot["refunded_tokens"] == 2000
+
+
+def test_stream_releases_slot_when_closed_early():
+    scheduler = RequestScheduler("test", rpm=100, tpm=10000)
+    with scheduler.call(lambda request_id: iter([SimpleNamespace(usage=None)] * 3), tokens=3000, stream=True) as stream:
+        chunks = iter(stream)
+        next(chunks)
+        assert scheduler.snapshot()["in_flight"] == 1
+    snapshot = scheduler.snapshot()
+    assert snapshot["in_flight"] == 0
+    assert snapshot["refunded_tokens"] == 0
+
+
+def test_concurrency_limit_follows_token_budget():
+    scheduler = RequestScheduler("test", rpm=100, tpm=30000)
+    assert scheduler.concurrency_limit(4000) == 7
+    assert scheduler.concurrency_limit(100000) == 1
+    assert RequestScheduler("test", rpm=3, tpm=30000).concurrency_limit(10) == 3
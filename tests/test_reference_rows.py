@@ -0,0 +1,55 @@
+"""참조표 검색 검사: BM25로 관련 행을 고르고, 응답의 행 ID를 참조표 원문으로 확장해야 함"""
+import pytest
+
+
+@pytest.fixture(scope="module")
+def reference_file(text_app):
+    text_app.st.session_state["reference_files"] = text_app.load_reference_files_from_folder()
+    return text_app.st.session_state["reference_files"][text_app.DEFAULT_REFERENCE_FILE]
+
+
+def test_bm25_ranks_matching_document_first(text_app):
+    index = text_app.build_bm25_index(["맨홀 내부 산소 농도 측정", "철탑 안테나 설치", "사다리 작업 시 2인 1조"])
+    hits = text_app.search_bm25(index, "맨홀 산소 측정", top_k=2)
+    assert hits[0][0] == 0
+    assert text_app.search_bm25(index, "없는단어", top_k=2) == []
+
+
+def test_select_reference_rows_limits_rows(text_app, reference_file):
+    selected = text_app.select_reference_rows(reference_file, "철탑 안테나 설치", top_k=5)
+    assert selected["rows_selected"] == 5
+    assert selected["rows_total"] > 5
+    assert selected["selected_chars"] < selected["full_chars"]
+
+    everything = text_app.select_reference_rows(reference_file, "철탑 안테나 설치", top_k=0)
+    assert everything["rows_selected"] == everything["rows_total"]
+
+
+def test_selected_rows_carry_reference_ids(text_app, reference_file):
+    reference_index = text_app.get_reference_index(reference_file["path"])
+    selected = text_app.select_reference_rows(reference_file, "철탑 안테나 설치", top_k=3, with_ids=True)
+    header = selected["content"].splitlines()[0].split()
+    assert header[0] == "ID"
+    assert len(set(reference_index["reference_ids"])) == len(reference_index["reference_ids"])
+
+
+def test_reference_ids_expand_to_source_rows(text_app, reference_file):
+    reference_index = text_app.get_reference_index(reference_file["path"])
+    reference_id = reference_index["reference_ids"][0]
+    data = {
+        "work_analysis": "철탑 작업",
+        "reference_ids": [reference_id, reference_id, "없는-ID"],
+        "novel_risks": [],
+        "additional_safety": [],
+        "safety_checklist": [],
+    }
+    structured, warnings, expansion = text_app.expand_reference_guide(data, [text_app.DEFAULT_REFERENCE_FILE])
+    assert structured["risks"] == [reference_index["risk_records"][reference_index["reference_positions"][reference_id]]]
+    assert expansion["cited"] == 2
+    assert expansion["unknown_ids"] == ["없는-ID"]
+    assert any("없는-ID" in warning for warning in warnings)
+
+
+def test_reference_id_response_requires_fields(text_app, reference_file):
+    with pytest.raises(ValueError):
+        text_app.expand_reference_guide({"reference_ids": []}, [text_app.DEFAULT_REFERENCE_FILE])
@@ -0,0 +1,80 @@
+"""병렬 분석 검사: 샤드나 사진 묶음이 실패하면 시작하지 않은 요청은 보내지 않고, 묶음 분석은 업로드 순서와 무관해야 함"""
+import hashlib
+import json
+import threading
+
+import pytest
+from PIL import Image
+
+
+def test_failed_shard_cancels_pending_shards(vision_app, monkeypatch):
+    checklist = vision_app.create_default_checklist()
+    shard_count = len(vision_app.build_analysis_shards(checklist))
+    calls = []
+    lock = threading.Lock()
+
+    def fail_request(*args, **kwargs):
+        with lock:
+            calls.append(kwargs.get("max_tokens"))
+        raise RuntimeError("연결 끊김")
+
+    monkeypatch.setattr(vision_app, "initialize_openai_client", lambda: object())
+    monkeypatch.setattr(vision_app, "request_completion", fail_request)
+    with pytest.raises(Exception, match="연결 끊김"):
+        vision_app.analyze_multiple_images_sharded([Image.new("RGB", (64, 64))], checklist, ["현장.jpg"], max_workers=1)
+    assert shard_count > 2
+    assert len(calls) == 1
+
+
+def test_failed_map_group_cancels_pending_groups(vision_app, monkeypatch):
+    checklist = vision_app.create_default_checklist()
+    calls = []
+    lock = threading.Lock()
+
+    def fail_request(*args, **kwargs):
+        with lock:
+            calls.append(kwargs.get("max_tokens"))
+        raise RuntimeError("연결 끊김")
+
+    monkeypatch.setattr(vision_app, "initialize_openai_client", lambda: object())
+    monkeypatch.setattr(vision_app, "request_completion", fail_request)
+    images = [Image.new("RGB", (64, 64), color) for color in ("red", "green", "blue", "white", "black")]
+    with pytest.raises(Exception, match="연결 끊김"):
+        vision_app.analyze_multiple_images_mapreduce(images, checklist, [f"현장{idx}.jpg" for idx in range(5)],
+                                                     map_options={"group_size": 1, "max_workers": 1, "reduce": "local"})
+    assert len(calls) == 1
+
+
+def test_pool_uses_one_worker_per_shard(vision_app, monkeypatch):
+    checklist = vision_app.create_default_checklist()
+    shard_count = len(vision_app.build_analysis_shards(checklist))
+    started = set()
+    all_started = threading.Barrier(shard_count, timeout=10)
+
+    def parallel_request(*args, **kwargs):
+        started.add(threading.get_ident())
+        all_started.wait()
+        return ""
+
+    monkeypatch.setattr(vision_app, "initialize_openai_client", lambda: object())
+    monkeypatch.setattr(vision_app, "request_completion", parallel_request)
+    result = vision_app.analyze_multiple_images_sharded([Image.new("RGB", (64, 64))], checklist, ["현장.jpg"])
+    assert len(started) == shard_count
+    assert len(result["shard_stats"]) == shard_count
+
+
+def test_mapreduce_order_ignores_upload_order_with_duplicate_names(vision_app, monkeypatch):
+    checklist = vision_app.create_default_checklist()
+
+    def describe_photo(client, content, **kwargs):
+        return json.dumps({"scene": hashlib.sha256(content[1]["image_url"]["url"].encode()).hexdigest()[:12], "hazards": [], "checklist": []})
+
+    monkeypatch.setattr(vision_app, "initialize_openai_client", lambda: object())
+    monkeypatch.setattr(vision_app, "request_completion", describe_photo)
+    red, blue = Image.new("RGB", (64, 64), "red"), Image.new("RGB", (64, 64), "blue")
+    reports = [
+        vision_app.analyze_multiple_images_mapreduce(images, checklist, ["현장.jpg", "현장.jpg"],
+                                                     map_options={"group_size": 1, "reduce": "local"})["full_report"]
+        for images in ([red, blue], [blue, red])
+    ]
+    assert reports[0] == reports[1]
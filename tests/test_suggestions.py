@@ -0,0 +1,12 @@
+"""작업명 추천 검사: 작업 내용 끝의 입력 중인 단어로 찾고, 선택하면 그 단어만 바꿔야 함"""
+
+
+def test_trailing_word_is_the_word_being_typed(text_app):
+    assert text_app.get_trailing_word("오늘 철탑") == "철탑"
+    assert text_app.get_trailing_word("오늘 철탑 ") == ""
+    assert text_app.get_trailing_word("") == ""
+
+
+def test_replace_trailing_word_keeps_the_rest(text_app):
+    assert text_app.replace_trailing_word("오늘 철탑", "철탑/강관주/CP/IP주") == "오늘 철탑/강관주/CP/IP주 "
+    assert text_app.replace_trailing_word("줄바꿈\nㅊㅌ", "철탑") == "줄바꿈\n철탑 "
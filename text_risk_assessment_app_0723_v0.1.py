@@ -1,5 +1,4 @@
 import streamlit as st
-from openai import OpenAI
 import pandas as pd
 import json
 import os
@@ -10,6 +9,15 @@ from dotenv import load_dotenv
 import locale
 import zipfile
 import glob
+import re
+import math
+import hashlib
+import pickle
+import time
+from collections import Counter
+from analysis_utils import dataframe_to_markdown_table, estimate_cost_usd, estimate_text_tokens, extract_usage
+from openai_client import get_openai_client
+from openai_scheduler import get_request_scheduler
 
 # 한국 로케일 설정 (선택사항)
 try:
@@ -25,6 +33,165 @@ REFERENCE_FILES_FOLDER = "reference_files"
 # 기본 참조 파일명
 DEFAULT_REFERENCE_FILE = "참조-SKONS-access위험성평가양식.xlsx"
 
+# 캐시 저장 폴더 (환경변수 APP_CACHE_FOLDER로 변경, 벤치마크와 테스트는 임시 폴더 사용)
+CACHE_FOLDER = os.environ.get("APP_CACHE_FOLDER", ".cache")
+# 참조 파일 스냅샷 저장 폴더 (경로/크기/수정 시각이 같으면 파싱 결과를 재사용)
+REFERENCE_SNAPSHOT_FOLDER = os.path.join(CACHE_FOLDER, "reference_snapshots")
+
+# 참조자료 검색 설정 (인덱스 대상 컬럼, 기본 top-k, BM25 파라미터)
+REFERENCE_INDEX_COLUMNS = ["대분류", "중분류", "소분류", "세부 위험요인"]
+REFERENCE_TOP_K = 40
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# 참조 양식 즉시 생성(빠른 경로) 설정: 작업 내용의 단어를 소분류(작업 기준) 이름과 맞춰 후보 작업을 고르고,
+# 사용자가 확인한 작업의 행으로 평가표를 바로 생성 (API 오류 시에는 일치도가 기준 이상일 때만 대신 사용)
+# 일치도는 작업 내용 단어 중 후보 작업 이름과 일치한 비율과, 후보 작업 이름 중 작업 내용과 일치한 비율 중 작은 값
+FAST_PATH_CONFIDENCE = 0.8
+FAST_PATH_MAX_TASKS = 3
+FAST_PATH_CHECKLIST_GRADES = ["C3", "C4"]  # 작업 전 체크리스트로 뽑을 감소대책의 개선전 위험등급
+FAST_PATH_MAX_WORD_TASK_RATIO = 0.1  # 작업 이름의 이 비율보다 많은 작업에 나오는 단어는 작업을 가르지 못하므로 제외
+FAST_PATH_QUALIFIER_WEIGHT = 0.5  # 작업 이름의 괄호 안 설명 단어 묶음이 일치도에서 차지하는 가중치 (괄호 밖은 1)
+# 같은 점수의 후보 중에서는 작업등급이 높은(위험한) 작업을 골라 심각한 위험요인이 빠지지 않도록 함 (낮은 등급 → 높은 등급)
+FAST_PATH_WORK_GRADE_ORDER = ["C1", "C2", "C3", "C4", "S"]
+# 작업 종류를 가르지 않는 동작 단어 (작업 내용과 작업 이름 모두에서 일치 판단에서 제외)
+FAST_PATH_ACTION_WORDS = ["작업", "설치", "재설치", "교체", "점검", "시설", "해체", "철거", "보수", "유지보수", "구축",
+                          "신설", "정비", "조정", "포설", "보강", "건립", "청소", "측정", "조사"]
+# 요청 문장이나 작업 이름의 조건에 흔한 단어 (이 단어로 시작하는 단어는 일치 판단과 일치도 계산에서 제외)
+FAST_PATH_IGNORED_WORDS = ["위험", "평가", "안내", "오늘", "내일", "금일", "및", "등", "관련", "있어", "있는", "있습니다",
+                           "해줘", "해주세요", "주세요", "알려", "예정", "진행", "근처", "이상", "이하", "이내", "초과", "미만"]
+
+# 작업명 추천 설정: 참조 양식 모든 시트의 중분류/소분류(작업 기준) 이름을 자모 접두어 트라이와 자모 n-gram으로 검색
+# (조합 중인 글자나 초성만 입력해도 단어 첫머리와 일치하면 찾고, 단어 중간 일치는 자모 n-gram 일치 비율로 보충)
+SUGGESTION_COLUMNS = ["중분류", "소분류"]
+SUGGESTION_LIMIT = 8
+SUGGESTION_NGRAM_SIZE = 3
+SUGGESTION_MIN_NGRAM_SCORE = 0.6
+HANGUL_CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+HANGUL_JUNGSEONG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+HANGUL_JONGSEONG = [""] + list("ㄱㄲㄳㄴㄵㄶㄷㄹㄺㄻㄼㄽㄾㄿㅀㅁㅂㅄㅅㅆㅇㅈㅊㅋㅌㅍㅎ")
+# 겹모음/겹받침은 입력 순서대로 낱자로 풀어 조합 중인 글자('고' → '과')도 접두어로 일치하도록 함
+HANGUL_COMPOUND_JAMO = {"ㅘ": "ㅗㅏ", "ㅙ": "ㅗㅐ", "ㅚ": "ㅗㅣ", "ㅝ": "ㅜㅓ", "ㅞ": "ㅜㅔ", "ㅟ": "ㅜㅣ", "ㅢ": "ㅡㅣ",
+                        "ㄳ": "ㄱㅅ", "ㄵ": "ㄴㅈ", "ㄶ": "ㄴㅎ", "ㄺ": "ㄹㄱ", "ㄻ": "ㄹㅁ", "ㄼ": "ㄹㅂ", "ㄽ": "ㄹㅅ",
+                        "ㄾ": "ㄹㅌ", "ㄿ": "ㄹㅍ", "ㅀ": "ㄹㅎ", "ㅄ": "ㅂㅅ"}
+
+# 분석 모델, 정적 프롬프트 접두부 버전 (토큰 단가는 analysis_utils.MODEL_PRICING)
+ANALYSIS_MODEL = "gpt-4o-mini"
+PROMPT_VERSION = "2025-07-23.2"
+
+# 분석 1회 입력 토큰 예산 (초과 시 참조 행 수를 절반씩 줄여 맞춤, 최소 행 수)
+PROMPT_TOKEN_BUDGET = 20000
+REFERENCE_TOP_K_MIN = 5
+
+# 위험성 평가표 컬럼
+RISK_TABLE_COLUMNS = ["순번", "작업 내용", "작업등급", "재해유형", "세부 위험요인", "위험등급-개선전", "위험성 감소대책", "위험등급-개선후"]
+RISK_GRADES = ["C1", "C2", "C3", "C4"]
+
+# 출력 형식 (마크다운 표 / JSON 스키마 기반 구조화 출력)
+OUTPUT_FORMATS = {
+    "markdown": "마크다운 표",
+    "json": "구조화 JSON (스키마 검증)",
+    "reference_ids": "참조 행 번호 (원문 로컬 확장)",
+}
+
+# 답변 형식 안내 (마크다운 / 구조화 JSON)
+RISK_GUIDE_MARKDOWN_FORMAT = """**답변 형식**:
+
+## 작업 내용 분석
+[작업의 특성, 주요 위험 포인트, 작업 환경 등을 분석]
+
+## 오늘 작업에서 예상되는 위험요인과 감소대책은 아래와 같습니다. 확인해주세요.
+
+| 순번 | 작업 내용 | 작업등급 | 재해유형 | 세부 위험요인 | 위험등급-개선전 | 위험성 감소대책 | 위험등급-개선후 |
+|------|-----------|----------|----------|---------------|----------------|----------------|----------------|
+| 1 | [구체적 작업] | [S/A/B등급] | [재해유형] | [세부 위험요인] | [C1-C4] | [구체적 대책] | [C1-C4] |
+[참조자료를 바탕으로 해당 작업과 관련된 모든 위험요인을 나열]
+
+## 추가 안전 조치
+[작업 특성에 맞는 추가적인 안전 조치사항]
+
+## 작업 전 체크리스트
+[작업 시작 전 반드시 확인해야 할 사항들]
+
+"""
+RISK_GUIDE_JSON_FORMAT = """**답변 형식**: 지정된 JSON 스키마로 답변
+- work_analysis: 작업의 특성, 주요 위험 포인트, 작업 환경 등을 분석
+- risks: 참조자료를 바탕으로 해당 작업과 관련된 모든 위험요인 (task: 구체적 작업, work_grade: 작업등급, accident_type: 재해유형, hazard: 세부 위험요인, grade_before: 위험등급-개선전, countermeasure: 구체적 대책, grade_after: 위험등급-개선후)
+- additional_safety: 작업 특성에 맞는 추가적인 안전 조치사항 목록
+- safety_checklist: 작업 시작 전 반드시 확인해야 할 사항 목록
+
+"""
+
+RISK_GUIDE_REFERENCE_FORMAT = """**답변 형식**: 지정된 JSON 스키마로 답변
+- work_analysis: 작업의 특성, 주요 위험 포인트, 작업 환경 등을 분석
+- reference_ids: 참조자료에서 해당 작업과 관련된 모든 위험요인 행의 ID 목록 (ID 컬럼 값을 그대로 작성하고, 행 내용은 다시 쓰지 않음)
+- novel_risks: 참조자료에 없는 추가 위험요인만 작성, 없으면 빈 목록 (task: 구체적 작업, work_grade: 작업등급, accident_type: 재해유형, hazard: 세부 위험요인, grade_before: 위험등급-개선전, countermeasure: 구체적 대책, grade_after: 위험등급-개선후)
+- additional_safety: 작업 특성에 맞는 추가적인 안전 조치사항 목록
+- safety_checklist: 작업 시작 전 반드시 확인해야 할 사항 목록
+
+"""
+
+# 참조 행 번호 모드에서 행 ID로 확장할 위험요인 항목과 참조표 컬럼 (컬럼명은 공백/줄바꿈을 무시하고 앞부분으로 찾음)
+REFERENCE_RISK_COLUMNS = {
+    "task": "소분류",
+    "work_grade": "작업등급",
+    "accident_type": "재해유형",
+    "hazard": "세부 위험요인",
+    "grade_before": "위험등급",
+    "countermeasure": "위험성 감소 대책",
+    "grade_after": "위험등급.1",
+}
+
+# 구조화 출력용 JSON 스키마
+RISK_ITEM_FIELDS = ["task", "work_grade", "accident_type", "hazard", "grade_before", "countermeasure", "grade_after"]
+RISK_GUIDE_SCHEMA = {
+    "name": "work_risk_guide",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "work_analysis": {"type": "string"},
+            "risks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "task": {"type": "string"},
+                        "work_grade": {"type": "string"},
+                        "accident_type": {"type": "string"},
+                        "hazard": {"type": "string"},
+                        "grade_before": {"type": "string", "enum": RISK_GRADES},
+                        "countermeasure": {"type": "string"},
+                        "grade_after": {"type": "string", "enum": RISK_GRADES}
+                    },
+                    "required": RISK_ITEM_FIELDS,
+                    "additionalProperties": False
+                }
+            },
+            "additional_safety": {"type": "array", "items": {"type": "string"}},
+            "safety_checklist": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["work_analysis", "risks", "additional_safety", "safety_checklist"],
+        "additionalProperties": False
+    }
+}
+RISK_REFERENCE_SCHEMA = {
+    "name": "work_risk_reference",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "work_analysis": {"type": "string"},
+            "reference_ids": {"type": "array", "items": {"type": "string"}},
+            "novel_risks": RISK_GUIDE_SCHEMA["schema"]["properties"]["risks"],
+            "additional_safety": {"type": "array", "items": {"type": "string"}},
+            "safety_checklist": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["work_analysis", "reference_ids", "novel_risks", "additional_safety", "safety_checklist"],
+        "additionalProperties": False
+    }
+}
+
 # OpenAI API 키 읽기 함수 (기존 코드 재사용)
 def load_openai_api_key() -> str:
     """환경변수에서 OpenAI API 키를 읽어옵니다."""
@@ -33,58 +200,95 @@ def load_openai_api_key() -> str:
         raise ValueError("OPENAI_API_KEY 환경변수가 설정되어 있지 않습니다.")
     return api_key
 
-# OpenAI 클라이언트 초기화 (기존 코드 재사용)
+# OpenAI 클라이언트 초기화 (재실행마다 새로 만들지 않고 프로세스 공용 클라이언트의 연결 풀을 재사용)
 try:
     api_key = load_openai_api_key()
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 except Exception as e:
     st.error(str(e))
     client = None
 
-def load_file_content(file_path: str) -> str:
+def detect_text_encoding(raw_bytes: bytes) -> str:
     """
-    파일 경로에서 파일을 읽어서 텍스트로 변환
+    UTF-8(BOM 포함) 여부를 확인하고, 아니면 cp949로 판단하는 함수
     """
     try:
-        file_extension = os.path.splitext(file_path)[1].lower()
-        
-        if file_extension == '.xlsx':
-            # Excel 파일 처리
-            df = pd.read_excel(file_path)
-            if df.empty:
-                return None
-            return df.to_string(index=False)
-                
-        elif file_extension == '.csv':
-            # CSV 파일 처리
-            try:
-                df = pd.read_csv(file_path, encoding='utf-8')
-                if df.empty:
-                    return None
-                return df.to_string(index=False)
-            except UnicodeDecodeError:
-                df = pd.read_csv(file_path, encoding='cp949')
-                if df.empty:
-                    return None
-                return df.to_string(index=False)
-                
-        elif file_extension == '.txt':
-            # 텍스트 파일 처리
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if not content.strip():
-                        return None
-                    return content
-            except UnicodeDecodeError:
-                with open(file_path, 'r', encoding='cp949') as f:
-                    content = f.read()
-                    if not content.strip():
-                        return None
-                    return content
+        raw_bytes.decode('utf-8')
+        return 'utf-8-sig' if raw_bytes.startswith(b'\xef\xbb\xbf') else 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp949'
+
+def parse_reference_file(file_path: str) -> dict:
+    """
+    참조 파일을 파싱하여 DataFrame(표 형식인 경우)과 텍스트, 감지된 인코딩을 반환하는 함수
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    dataframe = None
+    encoding = None
+
+    if file_extension == '.xlsx':
+        dataframe = pd.read_excel(file_path)
+        text = dataframe.to_string(index=False) if not dataframe.empty else None
+    elif file_extension in ('.csv', '.txt'):
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+        encoding = detect_text_encoding(raw_bytes)
+        if file_extension == '.csv':
+            dataframe = pd.read_csv(io.BytesIO(raw_bytes), encoding=encoding)
+            text = dataframe.to_string(index=False) if not dataframe.empty else None
         else:
-            return None
-            
+            text = raw_bytes.decode(encoding)
+            text = text if text.strip() else None
+    else:
+        text = None
+
+    return {"dataframe": dataframe, "text": text, "encoding": encoding}
+
+@st.cache_resource(show_spinner=False)
+def load_reference_snapshot(file_path: str, size: int, mtime_ns: int) -> dict:
+    """
+    참조 파일의 컴파일된 스냅샷을 반환 (프로세스 내 모든 세션이 공유, 디스크 스냅샷은 워커 프로세스 간 공유)
+    """
+    path_hash = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    snapshot_path = os.path.join(REFERENCE_SNAPSHOT_FOLDER, f"{path_hash}-{size}-{mtime_ns}.pkl")
+
+    if os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            pass  # 손상된 스냅샷은 다시 생성
+
+    snapshot = parse_reference_file(file_path)
+    snapshot.update({"path": file_path, "size": size, "mtime_ns": mtime_ns})
+
+    # 같은 파일의 이전 버전 스냅샷을 정리하고 새 스냅샷을 원자적으로 저장
+    try:
+        os.makedirs(REFERENCE_SNAPSHOT_FOLDER, exist_ok=True)
+        for old_snapshot in glob.glob(os.path.join(REFERENCE_SNAPSHOT_FOLDER, f"{path_hash}-*.pkl")):
+            os.remove(old_snapshot)
+        temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, snapshot_path)
+    except OSError:
+        pass  # 스냅샷 저장 실패 시에도 메모리 캐시는 사용
+
+    return snapshot
+
+def get_reference_snapshot(file_path: str) -> dict:
+    """
+    파일의 현재 크기/수정 시각에 해당하는 참조 스냅샷을 반환하는 함수
+    """
+    stat = os.stat(file_path)
+    return load_reference_snapshot(file_path, stat.st_size, stat.st_mtime_ns)
+
+def load_file_content(file_path: str) -> str:
+    """
+    파일 경로에서 파일을 읽어서 텍스트로 변환 (스냅샷 캐시 사용)
+    """
+    try:
+        return get_reference_snapshot(file_path)["text"]
     except Exception as e:
         st.error(f"파일 '{file_path}' 읽기 중 오류: {str(e)}")
         return None
@@ -193,6 +397,489 @@ def load_reference_files_from_folder() -> dict:
     
     return reference_files
 
+def find_reference_column(df: pd.DataFrame, name: str):
+    """
+    줄바꿈/공백이 섞인 컬럼명('소분류\n(작업 기준)' 등)에서 이름이 일치하는 컬럼을 찾는 함수
+    """
+    target = re.sub(r'\s+', '', name)
+    for column in df.columns:
+        if re.sub(r'\s+', '', str(column)).startswith(target):
+            return column
+    return None
+
+def tokenize_korean_ngrams(text: str) -> list:
+    """
+    한글/영문/숫자 단어를 2~3글자 문자 n-gram 토큰으로 분해하는 함수 (한 글자 단어는 그대로 사용)
+    """
+    tokens = []
+    for word in re.findall(r'[0-9A-Za-z가-힣]+', str(text).lower()):
+        if len(word) == 1:
+            tokens.append(word)
+            continue
+        for n in (2, 3):
+            tokens.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+def build_bm25_index(documents: list) -> dict:
+    """
+    문서 목록으로 BM25 검색용 역색인(토큰 → (문서번호, 빈도))을 생성하는 함수
+    """
+    postings = {}
+    doc_lengths = []
+    for doc_id, document in enumerate(documents):
+        term_counts = Counter(tokenize_korean_ngrams(document))
+        doc_lengths.append(sum(term_counts.values()))
+        for token, count in term_counts.items():
+            postings.setdefault(token, []).append((doc_id, count))
+
+    doc_count = len(documents)
+    return {
+        "postings": postings,
+        "idf": {
+            token: math.log(1 + (doc_count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for token, entries in postings.items()
+        },
+        "doc_lengths": doc_lengths,
+        "avg_length": (sum(doc_lengths) / doc_count) if doc_count else 0,
+    }
+
+def search_bm25(index: dict, query: str, top_k: int) -> list:
+    """
+    BM25 점수 기준 상위 top_k개의 (문서번호, 점수) 목록을 반환하는 함수
+    """
+    scores = Counter()
+    avg_length = index["avg_length"] or 1
+    for token in set(tokenize_korean_ngrams(query)):
+        if token not in index["postings"]:
+            continue
+        idf = index["idf"][token]
+        for doc_id, count in index["postings"][token]:
+            length_norm = 1 - BM25_B + BM25_B * index["doc_lengths"][doc_id] / avg_length
+            scores[doc_id] += idf * count * (BM25_K1 + 1) / (count + BM25_K1 * length_norm)
+    return scores.most_common(top_k)
+
+def assign_reference_ids(df: pd.DataFrame) -> list:
+    """
+    참조표의 No 컬럼으로 행 ID 목록을 만드는 함수 (중복되거나 비어 있는 번호('추가' 등)는 뒤에 순번을 붙여 구분)
+    """
+    no_column = find_reference_column(df, "No")
+    values = df[no_column].tolist() if no_column is not None else list(range(1, len(df) + 1))
+    labels = []
+    for value in values:
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        label = str(value).strip()
+        labels.append(label if label and label != "nan" else "행")
+    counts = Counter(labels)
+    seen = Counter()
+    reference_ids = []
+    for label in labels:
+        seen[label] += 1
+        reference_ids.append(label if counts[label] == 1 else f"{label}{seen[label]}")
+    return reference_ids
+
+def build_reference_risk_records(df: pd.DataFrame) -> list:
+    """
+    참조표의 각 행을 위험요인 항목(작업, 작업등급, 재해유형, 세부 위험요인, 위험등급, 감소대책) 원문으로 변환하는 함수
+    """
+    columns = {field: find_reference_column(df, name) for field, name in REFERENCE_RISK_COLUMNS.items()}
+    records = pd.DataFrame({
+        field: df[column].fillna('').astype(str).str.strip() if column is not None else ''
+        for field, column in columns.items()
+    }, index=df.index)
+    return records[list(REFERENCE_RISK_COLUMNS)].to_dict('records')
+
+def extract_match_words(text: str) -> list:
+    """
+    작업 일치 판단에 쓸 단어 목록을 반환하는 함수 (한글과 영문/숫자 경계에서 나누고, 한 글자, 숫자로 시작하는 단어,
+    동작/요청 단어로 시작하는 단어는 제외)
+    """
+    excluded_prefixes = tuple(FAST_PATH_IGNORED_WORDS + FAST_PATH_ACTION_WORDS)
+    return [word for word in re.findall(r'[가-힣]+|[0-9a-z]+', str(text).lower())
+            if len(word) > 1 and not word[0].isdigit() and not word.startswith(excluded_prefixes)]
+
+def is_matching_word(word: str, task_word: str) -> bool:
+    """
+    작업 내용 단어가 작업 이름 단어와 같은 단어인지 판별하는 함수
+    공통 앞부분이 2글자 이상이면서 작업 이름 단어의 절반 이상이어야 함 ('철탑에서'↔'철탑', '고압'↔'고압전기', '전선'↮'급전선')
+    """
+    common_length = len(os.path.commonprefix([word, task_word]))
+    return common_length >= 2 and common_length * 2 >= len(task_word)
+
+def split_task_name_groups(task_name: str) -> list:
+    """
+    작업 이름을 (단어 집합, 가중치) 묶음 목록으로 나누는 함수 ('/'로 나열된 단어는 한 묶음, 괄호 안 묶음은 설명 가중치)
+    예: '고소작업(철탑/강관주/CP주 건립, 해체, 보강)' → [({'고소작업'}, 1.0), ({'철탑', '강관주', 'cp주'}, 0.5)]
+    """
+    head = re.sub(r'\([^()]*\)', ' ', task_name)
+    qualifiers = ' '.join(re.findall(r'\(([^()]*)\)', task_name))
+    groups = []
+    for text, weight in ((head, 1.0), (qualifiers, FAST_PATH_QUALIFIER_WEIGHT)):
+        for part in re.split(r'[\s,]+', text):
+            words = {word for alternative in part.split('/') for word in extract_match_words(alternative)}
+            if words:
+                groups.append((words, weight))
+    return groups
+
+def get_work_grade_rank(work_grade: str) -> int:
+    """
+    작업등급('S등급', 'C3등급' 등)의 위험 순위를 반환하는 함수 (높을수록 위험, 알 수 없으면 -1)
+    """
+    grade = re.sub(r'\s+', '', str(work_grade)).upper()
+    ranks = [rank for rank, name in enumerate(FAST_PATH_WORK_GRADE_ORDER) if grade.startswith(name)]
+    return ranks[-1] if ranks else -1
+
+def build_reference_task_index(risk_records: list) -> dict:
+    """
+    참조표의 소분류(작업 기준) 이름별 행 위치, 작업등급 순위, 이름 단어 묶음과 단어별 IDF를 만드는 함수
+    작업 이름의 FAST_PATH_MAX_WORD_TASK_RATIO보다 많은 작업에 나오는 단어는 작업을 가르지 못하므로 색인에서 제외
+    """
+    task_positions = {}
+    for position, record in enumerate(risk_records):
+        if record["task"]:
+            task_positions.setdefault(record["task"], []).append(position)
+
+    task_names = list(task_positions)
+    task_groups = [split_task_name_groups(name) for name in task_names]
+    document_counts = Counter(word for groups in task_groups for word in set().union(*(words for words, _ in groups)))
+    max_count = max(2, len(task_names) * FAST_PATH_MAX_WORD_TASK_RATIO)
+    idf = {word: math.log(1 + len(task_names) / count) for word, count in document_counts.items() if count <= max_count}
+    return {
+        "names": task_names,
+        "positions": [task_positions[name] for name in task_names],
+        "grade_ranks": [max(get_work_grade_rank(risk_records[position]["work_grade"]) for position in task_positions[name])
+                        for name in task_names],
+        "groups": [[(words & idf.keys(), weight) for words, weight in groups if words & idf.keys()] for groups in task_groups],
+        "idf": idf,
+    }
+
+@st.cache_resource(show_spinner=False)
+def build_reference_index(file_path: str, size: int, mtime_ns: int):
+    """
+    참조 파일의 대분류/중분류/소분류/세부 위험요인 컬럼으로 검색 인덱스를 생성 (스냅샷 버전별로 1회)
+    """
+    snapshot = load_reference_snapshot(file_path, size, mtime_ns)
+    df = snapshot["dataframe"]
+    if df is None or df.empty:
+        return None
+
+    columns = [column for column in (find_reference_column(df, name) for name in REFERENCE_INDEX_COLUMNS) if column is not None]
+    if not columns:
+        return None
+
+    documents = df[columns].fillna('').astype(str).agg(' '.join, axis=1).tolist()
+    reference_ids = assign_reference_ids(df)
+    risk_records = build_reference_risk_records(df)
+    return {
+        "dataframe": df,
+        "bm25": build_bm25_index(documents),
+        "full_text_length": len(snapshot["text"] or ""),
+        "reference_ids": reference_ids,
+        "reference_positions": {reference_id: position for position, reference_id in enumerate(reference_ids)},
+        "risk_records": risk_records,
+        "task_index": build_reference_task_index(risk_records),
+    }
+
+def get_reference_index(file_path: str):
+    """
+    파일의 현재 버전에 해당하는 검색 인덱스를 반환하는 함수
+    """
+    stat = os.stat(file_path)
+    return build_reference_index(file_path, stat.st_size, stat.st_mtime_ns)
+
+def decompose_hangul(text: str) -> str:
+    """
+    한글 음절을 초성/중성/종성 자모로 분해하고 겹모음/겹받침은 낱자로 푸는 함수 (한글이 아닌 글자는 그대로)
+    """
+    jamo = []
+    for char in text:
+        code = ord(char) - 0xAC00
+        if 0 <= code < 11172:
+            jamo.extend((HANGUL_CHOSEONG[code // 588], HANGUL_JUNGSEONG[code // 28 % 21], HANGUL_JONGSEONG[code % 28]))
+        else:
+            jamo.append(char)
+    return "".join(HANGUL_COMPOUND_JAMO.get(char, char) for char in jamo)
+
+def extract_choseong(text: str) -> str:
+    """
+    한글 음절을 초성으로 바꾸는 함수 (한글이 아닌 글자는 그대로)
+    """
+    choseong = []
+    for char in text:
+        code = ord(char) - 0xAC00
+        choseong.append(HANGUL_CHOSEONG[code // 588] if 0 <= code < 11172 else char)
+    return "".join(choseong)
+
+def normalize_suggestion_text(text: str) -> str:
+    """
+    추천 검색용으로 한글(낱자 포함)/영문/숫자만 남기고 소문자로 이어 붙이는 함수
+    """
+    return "".join(re.findall(r'[0-9a-z가-힣ㄱ-ㅣ]+', str(text).lower()))
+
+def get_jamo_ngrams(jamo: str) -> set:
+    """
+    자모 문자열의 SUGGESTION_NGRAM_SIZE-gram 집합을 반환하는 함수 (더 짧으면 빈 집합)
+    """
+    return {jamo[i:i + SUGGESTION_NGRAM_SIZE] for i in range(len(jamo) - SUGGESTION_NGRAM_SIZE + 1)}
+
+def insert_trie(trie: dict, key: str, entry_id: int):
+    """
+    트라이에 key를 넣고 지나는 모든 노드의 항목 목록('' 키)에 entry_id를 추가하는 함수
+    """
+    node = trie
+    for char in key:
+        node = node.setdefault(char, {"": []})
+        if not node[""] or node[""][-1] != entry_id:
+            node[""].append(entry_id)
+
+def lookup_trie(trie: dict, prefix: str) -> list:
+    """
+    prefix로 시작하는 key를 가진 항목 번호 목록을 반환하는 함수
+    """
+    node = trie
+    for char in prefix:
+        node = node.get(char)
+        if node is None:
+            return []
+    return node.get("", [])
+
+def collect_suggestion_terms(sheets: list) -> dict:
+    """
+    시트들의 중분류/소분류(작업 기준) 이름별 종류와 참조 행 수를 모으는 함수 (병합 헤더로 반복된 컬럼명 행은 제외)
+    """
+    terms = {}
+    for df in sheets:
+        for name in SUGGESTION_COLUMNS:
+            column = find_reference_column(df, name)
+            if column is None:
+                continue
+            header = re.sub(r'\s+', '', str(column))
+            values = df[column].dropna().astype(str).map(lambda value: " ".join(value.split()))
+            for term, rows in values.value_counts(sort=False).items():
+                if term and term.replace(" ", "") != header:
+                    entry = terms.setdefault(term, {"kind": name, "rows": 0})
+                    entry["rows"] += rows
+    return terms
+
+@st.cache_resource(show_spinner=False)
+def build_suggestion_index(file_path: str, size: int, mtime_ns: int) -> dict:
+    """
+    참조 파일의 작업명 추천 색인(자모/초성 트라이, 자모 n-gram 역색인)을 생성 (스냅샷 버전별로 1회, 모든 세션이 공유)
+    Excel은 첫 시트만 담는 스냅샷과 달리 모든 시트의 작업명을 모읍니다.
+    """
+    if os.path.splitext(file_path)[1].lower() == '.xlsx':
+        sheets = list(pd.read_excel(file_path, sheet_name=None).values())
+    else:
+        df = load_reference_snapshot(file_path, size, mtime_ns)["dataframe"]
+        sheets = [df] if df is not None else []
+
+    entries = []
+    jamo_trie, choseong_trie, ngrams = {}, {}, {}
+    for entry_id, (term, info) in enumerate(collect_suggestion_terms(sheets).items()):
+        words = re.findall(r'[0-9a-z가-힣]+', term.lower())
+        word_jamo = [decompose_hangul(word) for word in words]
+        word_choseong = [extract_choseong(word) for word in words]
+        # 각 단어 첫머리부터 이름 끝까지를 key로 넣어 '철탑' → '고소작업(철탑/...)'처럼 중간 단어로도 찾도록 함
+        for start in range(len(words)):
+            insert_trie(jamo_trie, "".join(word_jamo[start:]), entry_id)
+            insert_trie(choseong_trie, "".join(word_choseong[start:]), entry_id)
+        jamo = "".join(word_jamo)
+        for gram in get_jamo_ngrams(jamo):
+            ngrams.setdefault(gram, []).append(entry_id)
+        entries.append({"term": term, "kind": info["kind"], "rows": info["rows"], "jamo": jamo})
+    return {"entries": entries, "jamo_trie": jamo_trie, "choseong_trie": choseong_trie, "ngrams": ngrams}
+
+def get_suggestion_index(file_path: str) -> dict:
+    """
+    파일의 현재 버전에 해당하는 작업명 추천 색인을 반환하는 함수
+    """
+    stat = os.stat(file_path)
+    return build_suggestion_index(file_path, stat.st_size, stat.st_mtime_ns)
+
+def search_suggestion_index(suggestion_index: dict, query: str, limit: int = SUGGESTION_LIMIT) -> list:
+    """
+    입력 중인 검색어와 일치하는 작업명을 (순위, 작업명, 종류) 목록으로 반환하는 함수
+
+    순위는 이름 첫머리 일치 → 단어 첫머리 일치 → 초성 일치 → n-gram(단어 중간) 일치 순이며,
+    같은 단계에서는 n-gram 일치 비율, 참조 행 수가 많은 이름, 짧은 이름 순입니다.
+    """
+    normalized = normalize_suggestion_text(query)
+    if not normalized:
+        return []
+
+    entries = suggestion_index["entries"]
+    ranks = {}
+
+    def add(entry_id, tier, score=1.0):
+        if entry_id not in ranks:
+            entry = entries[entry_id]
+            ranks[entry_id] = (tier, -score, -entry["rows"], len(entry["term"]))
+
+    if all(char in HANGUL_CHOSEONG for char in normalized):
+        for entry_id in lookup_trie(suggestion_index["choseong_trie"], normalized):
+            add(entry_id, 2)
+    else:
+        query_jamo = decompose_hangul(normalized)
+        for entry_id in lookup_trie(suggestion_index["jamo_trie"], query_jamo):
+            add(entry_id, 0 if entries[entry_id]["jamo"].startswith(query_jamo) else 1)
+        grams = get_jamo_ngrams(query_jamo)
+        if len(ranks) < limit and grams:
+            hits = Counter(entry_id for gram in grams for entry_id in suggestion_index["ngrams"].get(gram, ()))
+            for entry_id, count in hits.items():
+                if count / len(grams) >= SUGGESTION_MIN_NGRAM_SCORE:
+                    add(entry_id, 3, round(count / len(grams), 3))
+
+    top = sorted(ranks.items(), key=lambda item: item[1])[:limit]
+    return [(rank, entries[entry_id]["term"], entries[entry_id]["kind"]) for entry_id, rank in top]
+
+def suggest_reference_terms(query: str, selected_references: list, limit: int = SUGGESTION_LIMIT) -> list:
+    """
+    선택된 표 형식 참조 파일들에서 검색어와 일치하는 작업명을 순위대로 중복 없이 최대 limit개 반환하는 함수
+    """
+    results = []
+    for ref_name in selected_references:
+        file_info = st.session_state['reference_files'].get(ref_name)
+        if not file_info or os.path.splitext(file_info['path'])[1].lower() not in ('.xlsx', '.csv'):
+            continue
+        results.extend(search_suggestion_index(get_suggestion_index(file_info['path']), query, limit))
+
+    terms = []
+    for _, term, _ in sorted(results):
+        if term not in terms:
+            terms.append(term)
+    return terms[:limit]
+
+def get_trailing_word(text: str) -> str:
+    """
+    작업 내용 끝에서 입력 중인 단어를 반환하는 함수 (공백으로 끝나면 입력 중인 단어가 없으므로 빈 문자열)
+    """
+    match = re.search(r"(\S+)$", text)
+    return match.group(1) if match else ""
+
+def replace_trailing_word(text: str, term: str) -> str:
+    """
+    작업 내용 끝의 입력 중인 단어를 추천 작업명으로 바꾸는 함수 (이어서 입력할 수 있도록 뒤에 공백을 붙임)
+    """
+    return f"{text[:len(text) - len(get_trailing_word(text))]}{term} "
+
+def get_reference_id_prefix(file_number: int, selected_references: list) -> str:
+    """
+    참조 파일이 여러 개일 때 행 ID가 겹치지 않도록 붙이는 파일 순번 접두어 ('2-15' 등, 파일이 하나면 없음)
+    """
+    return f"{file_number}-" if len(selected_references) > 1 else ""
+
+def select_reference_rows(file_info: dict, work_description: str, top_k: int, with_ids: bool = False, id_prefix: str = ""):
+    """
+    작업 내용과 관련성이 높은 참조 행 top_k개(0이면 전체)만 골라 텍스트로 반환 (검색할 수 없는 파일은 None)
+    with_ids가 켜져 있으면 No 컬럼 대신 중복 없는 행 ID(id_prefix 포함)를 ID 컬럼으로 맨 앞에 표시
+    """
+    reference_index = get_reference_index(file_info['path'])
+    if reference_index is None:
+        return None
+
+    df = reference_index["dataframe"]
+    if top_k:
+        hits = search_bm25(reference_index["bm25"], work_description, top_k)
+        # 검색 결과가 없으면 앞쪽 행을 사용하여 빈 참조자료를 보내지 않도록 함
+        row_ids = sorted(doc_id for doc_id, _ in hits) if hits else list(range(min(top_k, len(df))))
+    else:
+        row_ids = list(range(len(df)))
+    rows = df.iloc[row_ids]
+    if with_ids:
+        no_column = find_reference_column(df, "No")
+        rows = rows.drop(columns=[no_column]) if no_column is not None else rows.copy()
+        rows.insert(0, "ID", [id_prefix + reference_index["reference_ids"][row_id] for row_id in row_ids])
+    selected_text = rows.to_string(index=False)
+    return {
+        "content": selected_text,
+        "rows_total": len(df),
+        "rows_selected": len(row_ids),
+        "full_chars": reference_index["full_text_length"],
+        "selected_chars": len(selected_text),
+    }
+
+def match_reference_tasks(task_index: dict, work_description: str) -> dict:
+    """
+    작업 내용과 일치하는 소분류(작업 기준)를 최대 FAST_PATH_MAX_TASKS개 고르고 양방향 일치도를 계산하는 함수
+
+    아직 설명되지 않은 작업 내용 단어의 IDF 합이 가장 큰 작업부터 차례로 고르며, 같으면 작업등급이 높은 작업,
+    작업 이름 중 일치한 비율이 높은 작업, 양식 순서로 고릅니다. 일치도는 작업 내용 단어 중 고른 작업 이름과 일치한
+    비율(query_coverage)과 고른 작업 이름 중 작업 내용과 일치한 가중 비율의 최솟값(name_coverage) 중 작은 값입니다.
+    """
+    idf = task_index["idf"]
+    words = extract_match_words(work_description)
+
+    # 작업별로 일치한 작업 내용 단어(가중치는 일치한 이름 단어의 IDF)와 이름 묶음 중 일치한 가중 비율
+    task_hits = []
+    name_coverages = []
+    for groups in task_index["groups"]:
+        hits = {}
+        matched_weight = 0.0
+        for group_words, weight in groups:
+            matched = False
+            for task_word in group_words:
+                for word in words:
+                    if is_matching_word(word, task_word):
+                        hits[word] = max(hits.get(word, 0.0), idf[task_word])
+                        matched = True
+            matched_weight += weight if matched else 0.0
+        total_weight = sum(weight for _, weight in groups)
+        task_hits.append(hits)
+        name_coverages.append(matched_weight / total_weight if total_weight else 0.0)
+
+    selected = []
+    covered = set()
+    while len(selected) < FAST_PATH_MAX_TASKS:
+        def rank(task_id):
+            gain = sum(weight for word, weight in task_hits[task_id].items() if word not in covered)
+            return (round(gain, 6), task_index["grade_ranks"][task_id], name_coverages[task_id], -task_id)
+        best = max((task_id for task_id in range(len(task_index["names"])) if task_id not in selected), key=rank, default=None)
+        if best is None or rank(best)[0] <= 0:
+            break
+        selected.append(best)
+        covered |= set(task_hits[best])
+
+    matched_words = [word for word in words if word in covered]
+    query_coverage = len(matched_words) / len(words) if words else 0.0
+    name_coverage = min((name_coverages[task_id] for task_id in selected), default=0.0)
+    return {
+        "tasks": [task_index["names"][task_id] for task_id in selected],
+        "positions": [position for task_id in selected for position in task_index["positions"][task_id]],
+        "confidence": round(min(query_coverage, name_coverage), 3),
+        "query_coverage": round(query_coverage, 3),
+        "name_coverage": round(name_coverage, 3),
+        "matched_words": matched_words,
+        "unmatched_words": [word for word in words if word not in matched_words],
+    }
+
+def find_fast_path_match(work_description: str, selected_references: list):
+    """
+    선택된 표 형식 참조 파일 중 작업 내용과 일치도가 가장 높은 파일의 작업 일치 결과를 반환 (없으면 None)
+    """
+    best = None
+    for ref_name in selected_references:
+        file_info = st.session_state['reference_files'].get(ref_name)
+        reference_index = get_reference_index(file_info['path']) if file_info else None
+        if reference_index is None:
+            continue
+        match = match_reference_tasks(reference_index["task_index"], work_description)
+        if match["tasks"] and (best is None or match["confidence"] > best["confidence"]):
+            best = {**match, "reference": ref_name, "risk_records": reference_index["risk_records"],
+                    "task_index": reference_index["task_index"], "task_names": reference_index["task_index"]["names"]}
+    return best
+
+def confirm_fast_path_tasks(match: dict, tasks: list) -> dict:
+    """
+    사용자가 확인(수정)한 소분류(작업 기준) 목록으로 작업 일치 결과의 작업과 행 위치를 바꾸는 함수
+    """
+    task_positions = dict(zip(match["task_index"]["names"], match["task_index"]["positions"]))
+    return {
+        **match,
+        "tasks": list(tasks),
+        "positions": [position for task in tasks for position in task_positions.get(task, [])],
+        "confirmed": True,
+    }
+
 def parse_analysis_sections(analysis_text: str) -> dict:
     """
     GPT 분석 결과를 섹션으로 구분하여 파싱하는 함수 (기존 코드 수정)
@@ -339,7 +1026,7 @@ def parse_risk_table_from_markdown(markdown_text: str) -> pd.DataFrame:
                     continue
     
     if risk_data:
-        columns = ["순번", "작업 내용", "작업등급", "재해유형", "세부 위험요인", "위험등급-개선전", "위험성 감소대책", "위험등급-개선후"]
+        columns = list(RISK_TABLE_COLUMNS)
         # 데이터 길이에 맞춰 컬럼 조정
         max_cols = max(len(row) for row in risk_data) if risk_data else 8
         if max_cols < 8:
@@ -357,84 +1044,336 @@ def parse_risk_table_from_markdown(markdown_text: str) -> pd.DataFrame:
         return pd.DataFrame(normalized_data, columns=columns)
     else:
         # 기본 빈 DataFrame 반환
-        columns = ["순번", "작업 내용", "작업등급", "재해유형", "세부 위험요인", "위험등급-개선전", "위험성 감소대책", "위험등급-개선후"]
-        return pd.DataFrame(columns=columns)
+        return pd.DataFrame(columns=RISK_TABLE_COLUMNS)
 
-def analyze_work_risk(work_description: str, selected_references: list) -> dict:
+def validate_risk_guide(data: dict) -> tuple:
     """
-    작업 내용을 기반으로 위험성 분석을 수행하는 함수
+    구조화 응답의 형식을 검증하고 (정리된 데이터, 경고 목록)을 반환하는 함수
     """
-    if client is None:
-        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
-    
-    # 선택된 참조 파일들의 내용 결합
-    combined_reference_content = ""
-    for ref_name in selected_references:
-        if ref_name in st.session_state['reference_files']:
-            combined_reference_content += f"\n\n=== {ref_name} ===\n"
-            combined_reference_content += st.session_state['reference_files'][ref_name]['content']
-    
-    # 위험성 평가를 위한 프롬프트
-    prompt = f"""
-너는 안전보건 담당자야. 현장의 작업자에게 작업전 위험성 평가를 가이드하는 업무를 담당하고 있어.
+    if not isinstance(data, dict):
+        raise ValueError("구조화 응답이 JSON 객체가 아닙니다.")
+    for key in ("work_analysis", "risks", "additional_safety", "safety_checklist"):
+        if key not in data:
+            raise ValueError(f"구조화 응답에 '{key}' 항목이 없습니다.")
 
-첨부의 참조자료는 각 작업에서 발생할 수 있는 유해, 위험요인들과 그에 대한 개선방안이 정리되어 있어.
+    warnings = []
+    risks = []
+    for idx, risk in enumerate(data["risks"], start=1):
+        if not isinstance(risk, dict) or not str(risk.get("hazard", "")).strip():
+            warnings.append(f"위험요인 {idx}번 항목이 비어 있어 제외했습니다.")
+            continue
+        cleaned_risk = {key: str(risk.get(key, "")).strip() for key in RISK_ITEM_FIELDS}
+        for key in ("grade_before", "grade_after"):
+            if cleaned_risk[key] not in RISK_GRADES:
+                warnings.append(f"위험요인 {idx}번의 위험등급 값('{cleaned_risk[key]}')이 C1~C4 형식이 아닙니다.")
+        risks.append(cleaned_risk)
 
-내가 특정 작업에 대해서 말하면, 위험요인은 참조자료를 참고해서 최대한 자세히 답변해줘.
+    cleaned = {
+        "work_analysis": str(data["work_analysis"]).strip(),
+        "risks": risks,
+        "additional_safety": [str(item).strip() for item in data["additional_safety"] if str(item).strip()],
+        "safety_checklist": [str(item).strip() for item in data["safety_checklist"] if str(item).strip()],
+    }
+    return cleaned, warnings
 
-**작업 내용**: {work_description}
+def build_reference_risk_lookup(selected_references: list) -> dict:
+    """
+    선택된 참조 파일들의 행 ID(파일 순번 접두어 포함) → 위험요인 원문 사전을 만드는 함수
+    """
+    lookup = {}
+    for file_number, ref_name in enumerate(selected_references, start=1):
+        file_info = st.session_state['reference_files'].get(ref_name)
+        reference_index = get_reference_index(file_info['path']) if file_info else None
+        if reference_index is None:
+            continue
+        prefix = get_reference_id_prefix(file_number, selected_references)
+        for reference_id, position in reference_index["reference_positions"].items():
+            lookup[prefix + reference_id] = reference_index["risk_records"][position]
+    return lookup
 
-**참조자료**:
-{combined_reference_content}
+def expand_reference_guide(data: dict, selected_references: list) -> tuple:
+    """
+    참조 행 ID 응답을 참조표 원문으로 확장하여 (구조화 응답과 같은 형식의 데이터, 경고 목록, 확장 통계)를 반환하는 함수
+    인용한 행은 참조자료 순서가 아니라 응답 순서대로, 새 위험요인은 그 뒤에 배치
+    """
+    if not isinstance(data, dict) or "reference_ids" not in data or "novel_risks" not in data:
+        raise ValueError("참조 행 ID 응답에 'reference_ids' 또는 'novel_risks' 항목이 없습니다.")
+    cleaned, warnings = validate_risk_guide({**data, "risks": data["novel_risks"]})
 
-**답변 형식**:
+    lookup = build_reference_risk_lookup(selected_references)
+    reference_risks = []
+    unknown_ids = []
+    cited_ids = list(dict.fromkeys(str(reference_id).strip() for reference_id in data["reference_ids"]))
+    for reference_id in cited_ids:
+        record = lookup.get(reference_id)
+        if record is None:
+            unknown_ids.append(reference_id)
+        else:
+            reference_risks.append(dict(record))
+    if unknown_ids:
+        warnings.append(f"참조자료에 없는 행 ID {len(unknown_ids)}건을 제외했습니다: {', '.join(unknown_ids[:10])}")
 
-## 작업 내용 분석
-[작업의 특성, 주요 위험 포인트, 작업 환경 등을 분석]
+    expansion = {
+        "cited": len(cited_ids),
+        "expanded": len(reference_risks),
+        "novel": len(cleaned["risks"]),
+        "unknown_ids": unknown_ids,
+    }
+    cleaned["risks"] = reference_risks + cleaned["risks"]
+    return cleaned, warnings, expansion
+
+def structured_to_risk_table(data: dict) -> pd.DataFrame:
+    """
+    구조화 응답의 위험요인 목록을 위험성 평가표 DataFrame으로 변환하는 함수
+    """
+    rows = [
+        [str(idx)] + [risk[key] for key in RISK_ITEM_FIELDS]
+        for idx, risk in enumerate(data["risks"], start=1)
+    ]
+    return pd.DataFrame(rows, columns=RISK_TABLE_COLUMNS)
+
+def render_risk_guide_report(data: dict) -> str:
+    """
+    구조화 응답을 기존 답변 형식과 같은 마크다운 보고서로 변환하는 함수
+    """
+    additional_safety = '\n'.join(f"- {item}" for item in data["additional_safety"])
+    safety_checklist = '\n'.join(f"- [ ] {item}" for item in data["safety_checklist"])
+    return f"""## 작업 내용 분석
+{data["work_analysis"]}
 
 ## 오늘 작업에서 예상되는 위험요인과 감소대책은 아래와 같습니다. 확인해주세요.
 
-| 순번 | 작업 내용 | 작업등급 | 재해유형 | 세부 위험요인 | 위험등급-개선전 | 위험성 감소대책 | 위험등급-개선후 |
-|------|-----------|----------|----------|---------------|----------------|----------------|----------------|
-| 1 | [구체적 작업] | [S/A/B등급] | [재해유형] | [세부 위험요인] | [C1-C4] | [구체적 대책] | [C1-C4] |
-[참조자료를 바탕으로 해당 작업과 관련된 모든 위험요인을 나열]
+{dataframe_to_markdown_table(structured_to_risk_table(data))}
 
 ## 추가 안전 조치
-[작업 특성에 맞는 추가적인 안전 조치사항]
+{additional_safety}
 
 ## 작업 전 체크리스트
-[작업 시작 전 반드시 확인해야 할 사항들]
+{safety_checklist}
+"""
+
+def get_risk_table_dataframe(result: dict) -> pd.DataFrame:
+    """
+    분석 결과에서 위험성 평가표 DataFrame을 얻는 함수 (구조화 결과가 있으면 직접 변환)
+    """
+    if result.get("structured"):
+        return structured_to_risk_table(result["structured"])
+    return parse_risk_table_from_markdown(result['full_report'])
+
+# 토큰 추정 및 사용량/비용 집계 함수들
+def estimate_messages_tokens(messages: list) -> int:
+    """요청 메시지 목록 전체의 입력 토큰 수를 대략 추정하는 함수"""
+    return sum(estimate_text_tokens(message["content"]) for message in messages)
+
+def compute_cached_ratio(usage: dict) -> float:
+    """입력 토큰 중 프롬프트 캐시로 처리된 비율을 계산하는 함수"""
+    return round(usage["cached_tokens"] / usage["prompt_tokens"], 3) if usage["prompt_tokens"] else 0.0
+
+def build_result_metadata(result: dict) -> dict:
+    """내보내기 파일에 포함할 분석 정보(모델, 참조자료 축소 통계, 토큰 사용량 등)를 만드는 함수"""
+    metadata_keys = ["timestamp", "work_description", "used_references", "model", "prompt_version", "prompt_prefix_hash",
+                     "prompt_stats", "reference_expansion", "fast_path", "usage", "token_estimate", "schedule"]
+    return {key: result.get(key) for key in metadata_keys if result.get(key) is not None}
+
+def build_risk_prompt(work_description: str, selected_references: list, top_k: int = REFERENCE_TOP_K,
+                      output_format: str = "markdown") -> tuple:
+    """
+    참조자료(관련 행 top_k개, 0이면 전체)와 작업 내용으로 위험성 평가 요청 메시지를 만드는 함수
+    (요청 메시지 목록, 참조자료 축소 통계)를 반환
 
-**중요사항**:
+    프롬프트 캐시가 적용되도록 지침/답변 형식은 정적 system 메시지로 먼저 두고,
+    user 메시지에는 참조자료를 작업 내용보다 앞에 배치 (같은 참조 행이면 접두부가 더 길게 일치)
+    output_format이 "reference_ids"이면 표 형식 참조자료에 행 ID 컬럼을 붙여 모델이 ID만 인용하도록 함
+    """
+    # 선택된 참조 파일들의 내용 결합 (검색 가능한 표 형식 파일은 관련 행 top_k개만 사용)
+    combined_reference_content = ""
+    prompt_stats = {"full_chars": 0, "selected_chars": 0, "rows_total": 0, "rows_selected": 0}
+    with_ids = output_format == "reference_ids"
+    for file_number, ref_name in enumerate(selected_references, start=1):
+        if ref_name in st.session_state['reference_files']:
+            file_info = st.session_state['reference_files'][ref_name]
+            selection = None
+            if top_k or with_ids:
+                selection = select_reference_rows(file_info, work_description, top_k, with_ids,
+                                                  get_reference_id_prefix(file_number, selected_references))
+            if selection is None:
+                selection = {
+                    "content": file_info['content'],
+                    "full_chars": len(file_info['content']),
+                    "selected_chars": len(file_info['content']),
+                    "rows_total": 0,
+                    "rows_selected": 0,
+                }
+            combined_reference_content += f"\n\n=== {ref_name} ===\n"
+            combined_reference_content += selection['content']
+            for key in prompt_stats:
+                prompt_stats[key] += selection[key]
+    
+    # 위험성 평가를 위한 정적 지침 (출력 형식에 따라 답변 형식 안내만 다름)
+    answer_format = {
+        "json": RISK_GUIDE_JSON_FORMAT,
+        "reference_ids": RISK_GUIDE_REFERENCE_FORMAT,
+    }.get(output_format, RISK_GUIDE_MARKDOWN_FORMAT)
+    system_prompt = f"""
+너는 안전보건 담당자야. 현장의 작업자에게 작업전 위험성 평가를 가이드하는 업무를 담당하고 있어.
+
+첨부의 참조자료는 각 작업에서 발생할 수 있는 유해, 위험요인들과 그에 대한 개선방안이 정리되어 있어.
+
+내가 특정 작업에 대해서 말하면, 위험요인은 참조자료를 참고해서 최대한 자세히 답변해줘.
+
+{answer_format}**중요사항**:
 - 참조자료의 내용을 최대한 활용하여 해당 작업과 관련된 모든 위험요인을 식별
 - 위험등급은 C1(낮음), C2(보통), C3(높음), C4(매우높음)으로 표시
 - 작업등급은 S(특별관리), C4, C3, C2, C1로 구분
 - 실무에서 바로 활용 가능한 구체적이고 실용적인 대책 제시
 - 모든 내용은 한국어로 작성
 """
+    user_prompt = f"""
+**참조자료**:
+{combined_reference_content}
+
+**작업 내용**: {work_description}
+"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    return messages, prompt_stats
+
+def compute_prompt_prefix_hash(messages: list) -> str:
+    """정적 system 메시지의 해시를 계산하는 함수 (프롬프트 캐시 라우팅 키와 결과 메타데이터에 사용)"""
+    return hashlib.sha256(f"{ANALYSIS_MODEL}:{PROMPT_VERSION}:{messages[0]['content']}".encode("utf-8")).hexdigest()[:16]
+
+def analyze_work_risk(work_description: str, selected_references: list, top_k: int = REFERENCE_TOP_K,
+                      output_format: str = "markdown", token_budget: int = None, auto_reduce: bool = True) -> dict:
+    """
+    작업 내용을 기반으로 위험성 분석을 수행하는 함수 (top_k가 0이면 참조자료 전체를 사용)
+    output_format이 "json"이면 JSON 스키마로 응답을 받아 검증한 뒤 표와 마크다운 보고서를 직접 생성
+    output_format이 "reference_ids"이면 참조 행 ID와 새 위험요인만 받아 행 내용은 참조표 원문으로 로컬에서 확장
+    token_budget을 넘는 프롬프트는 auto_reduce가 켜져 있으면 참조 행 수를 줄여 예산에 맞춤
+    """
+    if client is None:
+        raise Exception("OpenAI 클라이언트가 초기화되지 않았습니다.")
+    
+    messages, prompt_stats = build_risk_prompt(work_description, selected_references, top_k, output_format)
+    
+    # 입력 토큰이 예산을 넘으면 참조 행 수를 절반씩 줄여 다시 구성
+    initial_prompt_tokens = estimate_messages_tokens(messages)
+    token_estimate = {"prompt_tokens": initial_prompt_tokens, "budget": token_budget, "top_k": top_k, "reduced": False}
+    if token_budget and initial_prompt_tokens > token_budget and auto_reduce:
+        reduced_top_k = top_k
+        while token_estimate["prompt_tokens"] > token_budget and (reduced_top_k == 0 or reduced_top_k > REFERENCE_TOP_K_MIN):
+            # 전체 사용(0)이면 기본 top-k부터, 그 외에는 절반씩 줄임
+            reduced_top_k = max(REFERENCE_TOP_K_MIN, reduced_top_k // 2) if reduced_top_k else REFERENCE_TOP_K
+            messages, prompt_stats = build_risk_prompt(work_description, selected_references, reduced_top_k, output_format)
+            token_estimate.update({"prompt_tokens": estimate_messages_tokens(messages), "top_k": reduced_top_k, "reduced": True})
+        token_estimate["initial_prompt_tokens"] = initial_prompt_tokens
     
-    # OpenAI API 호출
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        max_tokens=3000
+    # OpenAI API 호출 (같은 정적 지침끼리 프롬프트 캐시를 공유하도록 캐시 키 지정)
+    # 공용 스케줄러가 분당 요청/토큰 한도에 맞춰 대기시키고 일시적 오류는 재시도
+    prompt_prefix_hash = compute_prompt_prefix_hash(messages)
+    request_args = {
+        "model": ANALYSIS_MODEL,
+        "messages": messages,
+        "max_tokens": 3000,
+        "prompt_cache_key": prompt_prefix_hash
+    }
+    if output_format in ("json", "reference_ids"):
+        schema = RISK_REFERENCE_SCHEMA if output_format == "reference_ids" else RISK_GUIDE_SCHEMA
+        request_args["response_format"] = {"type": "json_schema", "json_schema": schema}
+    schedule_stats = {}
+    response = get_request_scheduler(ANALYSIS_MODEL).create_completion(
+        client, request_args, token_estimate["prompt_tokens"] + request_args["max_tokens"], schedule_stats
     )
     
-    # GPT의 분석 결과를 가져오기
+    # GPT의 분석 결과와 토큰 사용량 가져오기
     analysis_result = response.choices[0].message.content
+    usage = extract_usage(getattr(response, "usage", None))
+    if usage:
+        usage["cached_ratio"] = compute_cached_ratio(usage)
+        usage["cost_usd"] = estimate_cost_usd(usage, ANALYSIS_MODEL)
+    
+    # 구조화 응답은 검증 후 로컬에서 마크다운 보고서를 생성
+    structured = None
+    validation_warnings = []
+    reference_expansion = None
+    if output_format in ("json", "reference_ids"):
+        try:
+            data = json.loads(analysis_result)
+        except json.JSONDecodeError as e:
+            raise Exception(f"구조화 응답을 JSON으로 해석할 수 없습니다: {str(e)}")
+        if output_format == "reference_ids":
+            structured, validation_warnings, reference_expansion = expand_reference_guide(data, selected_references)
+        else:
+            structured, validation_warnings = validate_risk_guide(data)
+        analysis_result = render_risk_guide_report(structured)
     
     # 결과를 구조화된 형태로 파싱
     return {
         "work_description": work_description,
         "full_report": analysis_result,
         "sections": parse_analysis_sections(analysis_result),
+        "structured": structured,
+        "validation_warnings": validation_warnings,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "used_references": selected_references
+        "used_references": selected_references,
+        "prompt_stats": prompt_stats,
+        "reference_expansion": reference_expansion,
+        "model": ANALYSIS_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "prompt_prefix_hash": prompt_prefix_hash,
+        "usage": usage,
+        "token_estimate": token_estimate,
+        "schedule": {key: round(value, 2) if isinstance(value, float) else value for key, value in schedule_stats.items()}
+    }
+
+def build_fast_risk_guide(work_description: str, selected_references: list, match: dict = None):
+    """
+    API 호출 없이 일치한 소분류(작업 기준)의 참조 행으로 위험성 평가표를 바로 만드는 함수 (일치하는 작업이 없으면 None)
+    결과는 analyze_work_risk와 같은 형식이며, 같은 위험요인/대책이 여러 작업에 있으면 한 번만 표시
+    """
+    started_at = time.perf_counter()
+    match = match or find_fast_path_match(work_description, selected_references)
+    if match is None:
+        return None
+
+    risks = []
+    seen = set()
+    for position in match["positions"]:
+        record = match["risk_records"][position]
+        key = (record["accident_type"], record["hazard"], record["countermeasure"])
+        if record["hazard"] and key not in seen:
+            seen.add(key)
+            risks.append(dict(record))
+    high_risk_measures = [" ".join(risk["countermeasure"].split()) for risk in risks
+                          if risk["grade_before"] in FAST_PATH_CHECKLIST_GRADES and risk["countermeasure"]]
+    task_names = ", ".join(f"'{task}'" for task in match["tasks"])
+    structured = {
+        "work_analysis": (f"참조 양식({match['reference']})의 소분류(작업 기준) 중 {task_names} 작업과 일치하여 "
+                          f"해당 위험요인 {len(risks)}건을 양식 원문 그대로 정리했습니다. "
+                          f"(일치도 {match['confidence']:.0%}{', 사용자 확인' if match.get('confirmed') else ''}, "
+                          f"AI 분석 없이 생성)"),
+        "risks": risks,
+        "additional_safety": [],
+        "safety_checklist": list(dict.fromkeys(high_risk_measures)),
+    }
+    analysis_result = render_risk_guide_report(structured)
+    return {
+        "work_description": work_description,
+        "full_report": analysis_result,
+        "sections": parse_analysis_sections(analysis_result),
+        "structured": structured,
+        "validation_warnings": [],
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "used_references": [match["reference"]],
+        "fast_path": {
+            "tasks": match["tasks"],
+            "confidence": match["confidence"],
+            "confirmed": match.get("confirmed", False),
+            "unmatched_words": match["unmatched_words"],
+            "rows": len(risks),
+            "elapsed_ms": round((time.perf_counter() - started_at) * 1000, 2),
+        },
     }
 
 # Streamlit App UI
@@ -524,30 +1463,143 @@ else:
 # 2. 작업 내용 입력 섹션
 st.header("✍️ 작업 내용 입력")
 
+def apply_suggestion_to_work_input():
+    """
+    선택한 추천 작업명으로 작업 내용 끝의 입력 중인 단어를 바꾸고 선택을 비우는 콜백 함수
+    """
+    term = st.session_state.get('suggestion_choice')
+    if term:
+        st.session_state['work_input'] = replace_trailing_word(st.session_state.get('work_input', ''), term)
+    st.session_state['suggestion_choice'] = None
+
 work_input = st.text_area(
     "오늘 수행할 작업 내용을 자세히 입력해주세요",
+    key="work_input",
     placeholder="예시: 오늘 철탑에서 안테나 재설치 작업이 있어 위험성 평가 안내해줘.",
     height=100,
-    help="작업 장소, 작업 내용, 사용 장비 등을 구체적으로 입력하면 더 정확한 위험성 평가를 받을 수 있습니다."
+    help="작업 장소, 작업 내용, 사용 장비 등을 구체적으로 입력하면 더 정확한 위험성 평가를 받을 수 있습니다. "
+         "마지막 단어를 입력하고 Ctrl+Enter를 누르거나 입력창 밖을 누르면 참조 양식 작업명을 추천합니다. 초성(예: ㅊㅌ)도 됩니다."
+)
+
+# 참조 양식 작업명 추천 (작업 내용 끝의 입력 중인 단어로 찾고, 선택하면 그 단어를 참조 양식의 용어로 바꿈)
+# (st.text_area는 Ctrl+Enter나 포커스 이동 시에만 값을 반영하므로 추천도 그 시점에 갱신됨)
+trailing_word = get_trailing_word(work_input)
+if st.session_state['reference_files'] and selected_files and trailing_word:
+    suggestions = suggest_reference_terms(trailing_word, selected_files)
+    if suggestions:
+        st.pills(
+            f"'{trailing_word}' 추천 작업명 (선택하면 입력 중인 단어를 바꿉니다)",
+            options=suggestions,
+            key="suggestion_choice",
+            on_change=apply_suggestion_to_work_input
+        )
+
+reference_top_k = st.slider(
+    "참조자료에서 사용할 관련 위험요인 행 수 (0 = 전체 사용)",
+    min_value=0,
+    max_value=200,
+    value=REFERENCE_TOP_K,
+    step=5,
+    help="작업 내용과 관련성이 높은 참조 행만 골라 프롬프트에 포함합니다. 값이 작을수록 분석이 빨라집니다."
+)
+
+output_format = st.radio(
+    "출력 형식",
+    options=list(OUTPUT_FORMATS.keys()),
+    format_func=lambda key: OUTPUT_FORMATS[key],
+    horizontal=True,
+    help="구조화 JSON은 응답을 스키마로 검증한 뒤 위험성 평가표를 직접 생성합니다. "
+         "참조 행 번호는 모델이 참조자료의 행 ID만 답하고 표 내용은 참조 양식 원문으로 채우므로 가장 빠릅니다."
+)
+
+col1, col2 = st.columns([2, 1])
+with col1:
+    token_budget = st.number_input(
+        "분석 1회 입력 토큰 예산",
+        min_value=1000,
+        max_value=500000,
+        value=PROMPT_TOKEN_BUDGET,
+        step=1000,
+        help="전송 전 추정한 입력 토큰이 이 값을 넘으면 경고합니다."
+    )
+with col2:
+    auto_reduce = st.checkbox(
+        "예산 초과 시 참조 행 자동 축소",
+        value=True,
+        help=f"참조자료 행 수를 절반씩(최소 {REFERENCE_TOP_K_MIN}행) 줄여 예산에 맞춥니다."
+    )
+
+use_fast_path = st.checkbox(
+    "참조 양식 작업으로 즉시 생성 (API 호출 생략)",
+    value=False,
+    help="작업 내용과 일치하는 참조 양식의 소분류(작업 기준) 후보를 보여줍니다. 작업을 확인(수정)한 뒤 해당 행으로 "
+         "평가표를 바로 만들 수 있으며, 결과 화면에서 AI 분석으로 보강할 수 있습니다."
 )
 
+# 참조 양식 작업 일치 결과 (입력할 때마다 로컬에서 계산)
+fast_path_match = None
+confirmed_tasks = []
+if st.session_state['reference_files'] and work_input.strip() and selected_files:
+    fast_path_match = find_fast_path_match(work_input, selected_files)
+    if use_fast_path and fast_path_match:
+        st.caption(f"⚡ 참조 양식 일치도 {fast_path_match['confidence']:.0%} "
+                   f"(작업 내용 단어 {fast_path_match['query_coverage']:.0%} · 작업 이름 {fast_path_match['name_coverage']:.0%})")
+        if fast_path_match['confidence'] < FAST_PATH_CONFIDENCE:
+            st.caption(f"⚠️ 일치도가 {FAST_PATH_CONFIDENCE:.0%} 미만입니다. 후보 작업이 맞는지 꼭 확인해주세요.")
+        confirmed_tasks = st.multiselect(
+            "즉시 생성에 사용할 참조 양식 작업",
+            options=fast_path_match['task_names'],
+            default=fast_path_match['tasks'],
+            help="작업 내용과 맞지 않는 작업은 빼고, 빠진 작업은 추가해주세요."
+        )
+    elif use_fast_path:
+        st.caption("⚡ 작업 내용과 일치하는 참조 양식 작업이 없습니다.")
+
+# 전송 전 입력 토큰/비용 추정
+if st.session_state['reference_files'] and work_input.strip() and selected_files:
+    estimated_messages, _ = build_risk_prompt(work_input, selected_files, reference_top_k, output_format)
+    estimated_tokens = estimate_messages_tokens(estimated_messages)
+    input_cost = estimate_cost_usd({"prompt_tokens": estimated_tokens}, ANALYSIS_MODEL)
+    st.caption(f"🧮 예상 입력 토큰 약 {estimated_tokens:,} · 예상 입력 비용 약 ${input_cost:.4f}")
+    if estimated_tokens > token_budget:
+        if auto_reduce:
+            st.info(f"📉 입력 토큰 예산({token_budget:,})을 넘어 참조 행 수를 줄여 전송합니다.")
+        else:
+            st.warning(f"⚠️ 예상 입력 토큰이 예산({token_budget:,})을 초과합니다. 참조 행 수를 줄이거나 자동 축소를 켜주세요.")
+
 # 3. 분석 실행 버튼
 if st.session_state['reference_files'] and work_input.strip():
+    # 같은 API 키를 쓰는 다른 사용자의 요청으로 한도 대기 중이면 미리 안내
+    scheduler_status = get_request_scheduler(ANALYSIS_MODEL).snapshot()
+    if scheduler_status["queue_depth"] or scheduler_status["cooldown_seconds"]:
+        st.caption(f"🚦 API 요청 대기 {scheduler_status['queue_depth']}건 · "
+                   f"최근 평균 대기 {scheduler_status['avg_wait_seconds']}초 · 한도 초과 휴지 {scheduler_status['cooldown_seconds']}초")
+    
     if not selected_files:
         st.warning("⚠️ 분석에 사용할 참조 파일을 확인해주세요.")
+    elif confirmed_tasks and st.button("⚡ 확인한 참조 양식 작업으로 즉시 생성", use_container_width=True):
+        result = build_fast_risk_guide(work_input, selected_files, confirm_fast_path_tasks(fast_path_match, confirmed_tasks))
+        st.session_state['analysis_result'] = result
+        st.success(f"⚡ 참조 양식에서 위험성 평가표를 즉시 생성했습니다. ({result['fast_path']['elapsed_ms']}ms)")
     elif st.button("🔍 위험성 평가 분석 시작", type="primary", use_container_width=True):
         if client is None:
             st.error("❌ OpenAI API 키가 설정되지 않았습니다.")
         else:
             try:
                 with st.spinner("AI가 작업 내용을 분석하여 위험성 평가를 수행하고 있습니다..."):
-                    result = analyze_work_risk(work_input, selected_files)
+                    result = analyze_work_risk(work_input, selected_files, top_k=reference_top_k,
+                                               output_format=output_format, token_budget=token_budget,
+                                               auto_reduce=auto_reduce)
                     st.session_state['analysis_result'] = result
                 
                 st.success("✅ 위험성 평가 분석 완료!")
                 
             except Exception as e:
                 st.error(f"❌ 분석 중 오류 발생: {str(e)}")
+                # API가 느리거나 한도 초과여도 일치도가 충분히 높은 작업이 있으면 참조 양식 결과라도 제공
+                if fast_path_match and fast_path_match['confidence'] >= FAST_PATH_CONFIDENCE:
+                    st.session_state['analysis_result'] = build_fast_risk_guide(work_input, selected_files, fast_path_match)
+                    st.warning("⚠️ 대신 참조 양식에서 일치한 작업의 위험요인으로 평가표를 만들었습니다. 내용을 확인해주세요.")
 
 elif not st.session_state['reference_files']:
     st.info(f"📁 먼저 기본 참조 파일 '{DEFAULT_REFERENCE_FILE}'을 준비해주세요.")
@@ -566,6 +1618,69 @@ if st.session_state['analysis_result']:
     st.markdown(f"**사용된 참조 파일**: {', '.join(result.get('used_references', []))}")
     st.caption(f"생성 시간: {result['timestamp']}")
     
+    # 구조화 응답 검증 경고
+    if result.get('validation_warnings'):
+        with st.expander(f"⚠️ 구조화 응답 검증 경고 {len(result['validation_warnings'])}건"):
+            for warning in result['validation_warnings']:
+                st.markdown(f"- {warning}")
+    
+    # 참조자료 축소 효과 표시
+    prompt_stats = result.get('prompt_stats')
+    if prompt_stats and prompt_stats['full_chars']:
+        reduction = 100 * (1 - prompt_stats['selected_chars'] / prompt_stats['full_chars'])
+        st.caption(
+            f"참조자료: {prompt_stats['rows_selected']:,}/{prompt_stats['rows_total']:,}행 사용 · "
+            f"{prompt_stats['full_chars']:,}자 → {prompt_stats['selected_chars']:,}자 ({reduction:.0f}% 축소)"
+        )
+    
+    # 참조 양식 즉시 생성 결과 (AI 분석으로 보강 가능)
+    fast_path = result.get('fast_path')
+    if fast_path:
+        fast_path_caption = (f"⚡ 참조 양식 즉시 생성 · 일치 작업 {len(fast_path['tasks'])}개 · 위험요인 {fast_path['rows']}건 · "
+                             f"일치도 {fast_path['confidence']:.0%}{' (사용자 확인)' if fast_path.get('confirmed') else ''} · "
+                             f"{fast_path['elapsed_ms']}ms")
+        if fast_path['unmatched_words']:
+            fast_path_caption += f" · 일치하지 않은 단어: {', '.join(fast_path['unmatched_words'])}"
+        st.caption(fast_path_caption)
+        can_enrich = client is not None and st.session_state['reference_files'] and selected_files
+        if can_enrich and st.button("🤖 AI 분석으로 보강", key="enrich_fast_path"):
+            try:
+                with st.spinner("AI가 작업 내용을 분석하여 위험성 평가를 보강하고 있습니다..."):
+                    st.session_state['analysis_result'] = analyze_work_risk(
+                        result['work_description'], selected_files, top_k=reference_top_k, output_format=output_format,
+                        token_budget=token_budget, auto_reduce=auto_reduce
+                    )
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ 보강 분석 중 오류 발생: {str(e)}")
+    
+    # 참조 행 ID 확장 결과
+    reference_expansion = result.get('reference_expansion')
+    if reference_expansion:
+        st.caption(
+            f"🔗 참조 행 {reference_expansion['expanded']}건을 양식 원문으로 확장 · "
+            f"참조자료에 없는 새 위험요인 {reference_expansion['novel']}건"
+        )
+    
+    # 토큰 사용량 및 비용 (전송 전 추정치와 함께 표시)
+    usage = result.get('usage')
+    token_estimate = result.get('token_estimate')
+    usage_parts = []
+    if usage:
+        usage_parts.append(f"입력 {usage['prompt_tokens']:,} 토큰 (캐시 {usage['cached_tokens']:,}, "
+                           f"적중률 {usage.get('cached_ratio', 0):.0%}) · 출력 {usage['completion_tokens']:,} 토큰")
+        if usage.get('cost_usd') is not None:
+            usage_parts.append(f"비용 약 ${usage['cost_usd']:.4f}")
+    if token_estimate:
+        usage_parts.append(f"사전 추정 입력 {token_estimate['prompt_tokens']:,} 토큰")
+        if token_estimate.get('reduced'):
+            usage_parts.append(f"예산 초과로 참조 행 {token_estimate['top_k']}개로 축소")
+    schedule = result.get('schedule')
+    if schedule and (schedule['wait_seconds'] or schedule['attempts'] > 1):
+        usage_parts.append(f"API 한도 대기 {schedule['wait_seconds']}초 · 시도 {schedule['attempts']}회")
+    if usage_parts:
+        st.caption("🧾 " + " · ".join(usage_parts))
+    
     # 섹션별 탭 생성
     tab1, tab2, tab3, tab4 = st.tabs([
         "📋 전체 보고서",
@@ -618,7 +1733,7 @@ if st.session_state['analysis_result']:
             
             # 위험성 평가표를 DataFrame으로 추출
             try:
-                risk_df = parse_risk_table_from_markdown(result['full_report'])
+                risk_df = get_risk_table_dataframe(result)
                 if not risk_df.empty:
                     # st.markdown("### 📋 위험성 평가 표 (데이터프레임)")
                     st.dataframe(
@@ -725,6 +1840,12 @@ if st.session_state['analysis_result']:
                 f"0.전체보고서_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
                 full_report_content.encode('utf-8-sig')
             )
+            
+            # 분석 정보 (모델, 참조자료 축소 통계, 토큰 사용량/비용)
+            zip_file.writestr(
+                "분석정보.json",
+                json.dumps(build_result_metadata(result), ensure_ascii=False, indent=2).encode('utf-8')
+            )
         
         zip_buffer.seek(0)
         